@@ -0,0 +1,44 @@
+"""
+Throughput of batch.py paths: pairs/sec with 1 and N workers.
+
+Pairs are drawn from a handful of sources, as in the analytics jobs, so
+BFS tree reuse is part of what gets measured.
+
+Usage: python benchmarks/bench_batch.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import dataset_from_argv, use_degrees
+
+use_degrees()
+
+import batch  # noqa: E402
+import degrees  # noqa: E402
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=100000, movies=40000)
+        degrees.load_data(directory, snapshot=True)
+        rng = random.Random(0)
+        person_ids = list(degrees.graph.person_ids)
+        sources = rng.sample(person_ids, 40)
+        lines = [f"{rng.choice(sources)}\t{rng.choice(person_ids)}" for _ in range(count)]
+
+        print(f"{count} pairs from {len(sources)} sources")
+        for workers in sorted({1, 2, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            batch.run_paths(directory, lines, io.StringIO(), workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"workers={workers:<3} {elapsed:>8.2f}s {count / elapsed:>10.0f} pairs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Compares one-sided BFS with bidirectional BFS on random pairs.
+
+Usage: python benchmarks/bench_bidirectional.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import sys
+import tempfile
+import time
+
+from synthetic import dataset_from_argv, random_pairs, use_degrees
+
+use_degrees()
+
+import degrees  # noqa: E402
+from util import SearchStats  # noqa: E402
+
+
+def run(mode, pairs):
+    stats = SearchStats()
+    lengths = []
+    start = time.perf_counter()
+    for source, target in pairs:
+        path = degrees.shortest_path(source, target, mode=mode, stats=stats)
+        lengths.append(None if path is None else len(path))
+    elapsed = time.perf_counter() - start
+    return stats, elapsed, lengths
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=1500, movies=600)
+        degrees.load_data(directory)
+        pairs = random_pairs(degrees.people, count)
+
+        results = {mode: run(mode, pairs) for mode in ("bfs", "bidirectional")}
+
+    assert results["bfs"][2] == results["bidirectional"][2], "path lengths differ"
+    print(f"{len(degrees.people)} people, {len(degrees.movies)} movies, {count} pairs")
+    print(f"{'mode':<14}{'expanded':>12}{'generated':>14}{'seconds':>10}")
+    for mode, (stats, elapsed, _) in results.items():
+        print(f"{mode:<14}{stats.expanded:>12}{stats.generated:>14}{elapsed:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
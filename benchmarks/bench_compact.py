@@ -0,0 +1,57 @@
+"""
+Reports memory and query time for the dict model and the CompactGraph.
+
+Usage: python benchmarks/bench_compact.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import dataset_from_argv, random_pairs, use_degrees
+
+use_degrees()
+
+import degrees  # noqa: E402
+
+
+def measure(directory, pairs, compact):
+    degrees.people.clear()
+    degrees.movies.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    degrees.load_data(directory, compact=compact)
+    load_s = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    lengths = []
+    for source, target in pairs:
+        path = degrees.shortest_path(source, target, mode="bidirectional")
+        lengths.append(None if path is None else len(path))
+    query_s = time.perf_counter() - start
+    return memory, load_s, query_s, lengths
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=100000, movies=40000)
+        degrees.load_data(directory)
+        pairs = random_pairs(degrees.people, count)
+        results = {
+            "dicts": measure(directory, pairs, compact=False),
+            "compact": measure(directory, pairs, compact=True),
+        }
+
+    assert results["dicts"][3] == results["compact"][3], "path lengths differ"
+    print(f"{count} bidirectional queries")
+    print(f"{'model':<10}{'memory MB':>12}{'load s':>10}{'query s':>10}")
+    for model, (memory, load_s, query_s, _) in results.items():
+        print(f"{model:<10}{memory / 2 ** 20:>12.1f}{load_s:>10.2f}{query_s:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Distance-table queries against one shortest_path call per target.
+
+Usage: python benchmarks/bench_distances.py [directory] [targets]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import random
+import sys
+import tempfile
+import time
+
+from synthetic import dataset_from_argv, use_degrees
+
+use_degrees()
+
+import degrees  # noqa: E402
+import distances  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=100000, movies=40000)
+        degrees.load_data(directory, snapshot=True)
+        graph = degrees.graph
+        rng = random.Random(0)
+        source = graph.person_ids[0]  # the biggest hub in synthetic data
+        targets = rng.sample(list(graph.person_ids), count)
+
+        _, per_query_s = timed(lambda: [degrees.shortest_path(source, t, mode="bidirectional") for t in targets])
+        table, build_s = timed(lambda: distances.table_for(directory, graph, source, cache=True))
+        _, cached_s = timed(lambda: distances.table_for(directory, graph, source, cache=True))
+        _, lookup_s = timed(lambda: [graph.path_ids(table.path(graph.person_index(t))) for t in targets])
+
+    print(f"{count} targets from one source")
+    print(f"shortest_path per target: {per_query_s:.3f}s")
+    print(f"table build (full BFS):   {build_s:.3f}s")
+    print(f"table load from cache:    {cached_s:.3f}s")
+    print(f"table path lookups:       {lookup_s:.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Goal test on pop with Node objects ("bfs") against goal test on
+generation with a flat parent map ("early"), on degrees/small and on a
+synthetic graph.
+
+Usage: python benchmarks/bench_early.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from synthetic import DEGREES_DIR, dataset_from_argv, random_pairs, use_degrees
+
+use_degrees()
+
+import degrees  # noqa: E402
+from util import SearchStats  # noqa: E402
+
+
+def run(mode, pairs, repeat):
+    stats = SearchStats()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for source, target in pairs:
+            degrees.shortest_path(source, target, mode=mode, stats=stats)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return stats, elapsed, peak
+
+
+def report(label, pairs, repeat=1):
+    print(f"{label}: {len(pairs)} pairs x {repeat}")
+    print(f"  {'mode':<7}{'expanded':>10}{'generated':>12}{'seconds':>10}{'peak KB':>10}")
+    for mode in ("bfs", "early"):
+        stats, elapsed, peak = run(mode, pairs, repeat)
+        print(f"  {mode:<7}{stats.expanded:>10}{stats.generated:>12}{elapsed:>10.3f}{peak / 1024:>10.0f}")
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    degrees.load_data(DEGREES_DIR / "small")
+    small_pairs = [(source, target) for source in degrees.people for target in degrees.people]
+    report("small", small_pairs, repeat=20)
+
+    degrees.people.clear()
+    degrees.movies.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=20000, movies=8000)
+        degrees.load_data(directory)
+        report("synthetic", random_pairs(degrees.people, count))
+
+
+if __name__ == "__main__":
+    main()
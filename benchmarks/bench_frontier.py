@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks for the frontier classes in degrees/util.py.
+
+Fills a frontier with N nodes, probes contains_state for every node plus N
+misses, then drains it. The list-based frontier the module used to ship is
+kept here as the baseline.
+
+Usage: python benchmarks/bench_frontier.py [max_size]
+"""
+import sys
+import time
+
+from synthetic import use_degrees
+
+use_degrees()
+
+from util import Node, QueueFrontier, StackFrontier  # noqa: E402
+
+
+class ListStackFrontier():
+    def __init__(self):
+        self.frontier = []
+
+    def add(self, node):
+        self.frontier.append(node)
+
+    def contains_state(self, state):
+        return any(node.state == state for node in self.frontier)
+
+    def empty(self):
+        return len(self.frontier) == 0
+
+    def remove(self):
+        node = self.frontier[-1]
+        self.frontier = self.frontier[:-1]
+        return node
+
+
+class ListQueueFrontier(ListStackFrontier):
+
+    def remove(self):
+        node = self.frontier[0]
+        self.frontier = self.frontier[1:]
+        return node
+
+
+def workload(frontier_class, size):
+    nodes = [Node(state=str(i), parent=None, action=None) for i in range(size)]
+    start = time.perf_counter()
+    frontier = frontier_class()
+    for node in nodes:
+        frontier.add(node)
+    for i in range(size):
+        frontier.contains_state(str(i))
+        frontier.contains_state(str(-i - 1))
+    while not frontier.empty():
+        frontier.remove()
+    return time.perf_counter() - start
+
+
+def main():
+    max_size = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    classes = [
+        ("list stack", ListStackFrontier),
+        ("list queue", ListQueueFrontier),
+        ("stack", StackFrontier),
+        ("queue", QueueFrontier),
+    ]
+    print(f"{'size':>8}" + "".join(f"{name:>14}" for name, _ in classes))
+    size = 500
+    while size <= max_size:
+        timings = [workload(frontier_class, size) for _, frontier_class in classes]
+        print(f"{size:>8}" + "".join(f"{t * 1000:>12.1f}ms" for t in timings))
+        size *= 2
+
+
+if __name__ == "__main__":
+    main()
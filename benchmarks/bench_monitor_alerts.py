@@ -0,0 +1,93 @@
+"""
+Alert delivery under a storm: many sites flip at once, several per chat.
+A fake Bot enforces Telegram-like flood limits (30 messages per second,
+one per second per chat) and answers RetryAfter when they are exceeded.
+
+"inline" sends each alert as it comes, as Notifier used to, losing the
+ones that hit flood control; "queue" is NotificationQueue with token
+buckets, coalescing and retries.
+
+Usage: python benchmarks/bench_monitor_alerts.py [alerts] [chats] [send_ms]
+"""
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+
+from monitor_support import use_package
+
+use_package()
+
+from aiogram.exceptions import TelegramRetryAfter  # noqa: E402
+
+from site_monitor_bot.notifications import NotificationQueue  # noqa: E402
+
+
+class FloodLimitedBot:
+    def __init__(self, send_ms, global_limit=30, chat_interval=1.0):
+        self.delay = send_ms / 1000
+        self.global_limit = global_limit
+        self.chat_interval = chat_interval
+        self.recent = deque()
+        self.last_by_chat = {}
+        self.messages = 0
+        self.alerts = 0
+        self.rejected = 0
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.delay)
+        now = time.monotonic()
+        while self.recent and now - self.recent[0] > 1:
+            self.recent.popleft()
+        if len(self.recent) >= self.global_limit or now - self.last_by_chat.get(chat_id, -10) < self.chat_interval:
+            self.rejected += 1
+            raise TelegramRetryAfter(method=None, message="Too Many Requests", retry_after=1)
+        self.recent.append(now)
+        self.last_by_chat[chat_id] = now
+        self.messages += 1
+        self.alerts += text.count("\n") + 1
+
+
+def storm(alerts, chats):
+    rng = random.Random(1)
+    return [(rng.randrange(chats), f"⚠️ Сайт недоступен: https://site{i}.example") for i in range(alerts)]
+
+
+async def inline(alerts, send_ms):
+    bot = FloodLimitedBot(send_ms)
+    for chat_id, text in alerts:
+        try:
+            await bot.send_message(chat_id, text)
+        except TelegramRetryAfter:
+            pass
+    return bot
+
+
+async def queued(alerts, send_ms):
+    bot = FloodLimitedBot(send_ms)
+    queue = NotificationQueue(bot, global_rate=25, per_chat_rate=1.0, workers=8)
+    queue.start()
+    for chat_id, text in alerts:
+        queue.enqueue(chat_id, text)
+    await queue.close(timeout=600)
+    return bot
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    send_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    alerts = storm(count, chats)
+    print(f"{count} alerts for {chats} chats, {send_ms} ms per send")
+    print(f"{'mode':<8}{'seconds':>9}{'messages':>10}{'alerts':>8}{'lost':>6}{'rejected':>10}{'msg/s':>7}")
+    for label, run in (("inline", inline), ("queue", queued)):
+        start = time.perf_counter()
+        bot = await run(alerts, send_ms)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<8}{elapsed:>9.1f}{bot.messages:>10}{bot.alerts:>8}{count - bot.alerts:>6}"
+              f"{bot.rejected:>10}{bot.messages / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Peak Python memory and time for N concurrent checks of a large page:
+buffered read-then-hash against streaming hashing, uncapped and capped,
+and HEAD. The local server streams the body from one shared chunk, so
+traced allocations are the client's.
+
+Usage: python benchmarks/bench_monitor_body.py [concurrent] [body_mb]
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from monitor_support import local_server, use_package
+
+use_package()
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from site_monitor_bot.monitor import CheckConfig, http_check  # noqa: E402
+
+CHUNK = b"x" * (1024 * 1024)
+
+
+def large_page(megabytes):
+    async def handler(request):
+        response = web.StreamResponse()
+        response.content_length = megabytes * len(CHUNK)
+        await response.prepare(request)
+        if request.method != "HEAD":
+            try:
+                for _ in range(megabytes):
+                    await response.write(CHUNK)
+            except ConnectionError:
+                pass  # capped checks hang up early
+        return response
+    return handler
+
+
+async def run(url, concurrent, config):
+    async with aiohttp.ClientSession() as http:
+        tracemalloc.start()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(http_check(url, http, config=config) for _ in range(concurrent)))
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert all(r.is_up for r in results), results[0].error
+    ttfb = max(r.ttfb_ms for r in results)
+    return peak / 2**20, elapsed, ttfb
+
+
+async def main():
+    concurrent = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    megabytes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    modes = [
+        ("buffered", CheckConfig(stream=False)),
+        ("stream, no cap", CheckConfig(max_body_bytes=None)),
+        ("stream, 1 MiB cap", CheckConfig(max_body_bytes=1024 * 1024)),
+        ("range, 1 MiB", CheckConfig(max_body_bytes=1024 * 1024, range_request=True)),
+        ("HEAD", CheckConfig(method="HEAD")),
+    ]
+    async with local_server({"/big": large_page(megabytes)}) as server:
+        url = str(server.make_url("/big"))
+        print(f"{concurrent} concurrent checks of a {megabytes} MiB page")
+        print(f"{'mode':<20}{'peak MiB':>10}{'seconds':>9}{'max ttfb ms':>13}")
+        for label, config in modes:
+            peak, elapsed, ttfb = await run(url, concurrent, config)
+            print(f"{label:<20}{peak:>10.1f}{elapsed:>9.2f}{ttfb:>13}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
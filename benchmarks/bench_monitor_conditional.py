@@ -0,0 +1,77 @@
+"""
+Bytes transferred and check time with and without conditional requests.
+A local server serves static pages with ETag / Last-Modified; every site
+is checked for several rounds through MonitorService, reloading sites
+from the database between rounds as the schedulers do.
+
+Usage: python benchmarks/bench_monitor_conditional.py [sites] [rounds] [page_kb]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+from monitor_support import local_server, temp_database, use_package
+
+use_package()
+
+from aiohttp import web  # noqa: E402
+
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.monitor import CheckConfig, MonitorService  # noqa: E402
+from site_monitor_bot.repository import SiteRepository  # noqa: E402
+
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+def static_pages(page_kb, sent):
+    body = b"<html>" + b"x" * (page_kb * 1024) + b"</html>"
+
+    async def handler(request):
+        etag = f'"{request.match_info["n"]}"'
+        if request.headers.get("If-None-Match") == etag or request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+            return web.Response(status=304, headers={"ETag": etag})
+        sent[0] += len(body)
+        return web.Response(body=body, headers={"ETag": etag, "Last-Modified": LAST_MODIFIED})
+    return handler
+
+
+async def run(directory, server, sites, rounds, conditional, sent):
+    _, session_factory = await temp_database(directory, f"conditional_{conditional}.db")
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        session.add_all(Site(user_id=1, url=str(server.make_url(f"/page/{i}")), interval_seconds=60) for i in range(sites))
+        await session.commit()
+    service = MonitorService(session_factory, max_concurrent_checks=50, check=CheckConfig(conditional=conditional))
+    sent[0] = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        async with session_factory() as session:
+            batch = await SiteRepository(session).list_all_active()
+        results = await asyncio.gather(*(service.perform_check_and_store(site) for site in batch))
+        assert all(r.is_up for r in results)
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return sent[0], elapsed
+
+
+async def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    page_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    sent = [0]
+    with tempfile.TemporaryDirectory() as tmp:
+        async with local_server({"/page/{n}": static_pages(page_kb, sent)}) as server:
+            print(f"{sites} sites x {rounds} rounds, {page_kb} KiB pages")
+            print(f"{'mode':<14}{'body MiB':>10}{'seconds':>9}")
+            results = {}
+            for label, conditional in (("unconditional", False), ("conditional", True)):
+                results[label] = await run(tmp, server, sites, rounds, conditional, sent)
+                body, elapsed = results[label]
+                print(f"{label:<14}{body / 2**20:>10.1f}{elapsed:>9.2f}")
+            saved = results["unconditional"][0] - results["conditional"][0]
+            print(f"bytes saved: {saved} ({saved / results['unconditional'][0]:.0%})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""
+Mixed read/write load under each database profile: the batched check
+writer commits 200 records every 50 ms while bot-like readers fetch a
+user's sites and a site's recent history in a loop. Reports read and
+commit latency, reads/s, records/s and failed operations ("database is
+locked").
+
+SQLite runs with its defaults (rollback journal, synchronous=FULL) and
+with the tuned DatabaseProfile (WAL, synchronous=NORMAL, mmap, cache,
+busy timeout). Pass a PostgreSQL URL (postgresql+asyncpg://..., needs
+asyncpg) to run the server profile with pooled connections and COPY too.
+
+Usage: python benchmarks/bench_monitor_db_profiles.py [seconds] [postgres_url]
+"""
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from monitor_support import use_package
+
+use_package()
+
+from sqlalchemy import delete, insert  # noqa: E402
+
+from site_monitor_bot.db import Base, CheckRecord, DatabaseProfile, Site, User, create_engine_and_session, init_db  # noqa: E402
+from site_monitor_bot.monitor import CheckResult  # noqa: E402
+from site_monitor_bot.repository import CheckRecordRepository, SiteRepository  # noqa: E402
+from site_monitor_bot.rollups import percentile  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter, PendingCheck  # noqa: E402
+
+USERS = 100
+SITES_PER_USER = 10
+HISTORY = 200
+READERS = 8
+BATCH = 200
+SQLITE_DEFAULTS = DatabaseProfile(journal_mode=None, synchronous=None, mmap_size=None, cache_size_kib=None, busy_timeout_ms=None)
+
+
+async def seed(engine, session_factory):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db(engine)
+    start = datetime.now(timezone.utc) - timedelta(days=1)
+    async with session_factory() as session:
+        await session.execute(insert(User), [{"telegram_user_id": u, "chat_id": u} for u in range(1, USERS + 1)])
+        await session.execute(insert(Site), [
+            {"id": u * SITES_PER_USER + i, "user_id": u, "url": f"https://s{u}-{i}.example", "interval_seconds": 60}
+            for u in range(1, USERS + 1) for i in range(SITES_PER_USER)
+        ])
+        await session.execute(insert(CheckRecord), [
+            {"site_id": u * SITES_PER_USER + i, "checked_at": start + timedelta(seconds=60 * n), "status_code": 200,
+             "response_ms": 50, "is_up": True}
+            for u in range(1, USERS + 1) for i in range(SITES_PER_USER) for n in range(HISTORY)
+        ])
+        await session.commit()
+
+
+async def reader(session_factory, stop, latencies, errors):
+    while not stop.is_set():
+        user = random.randint(1, USERS)
+        site_id = user * SITES_PER_USER + random.randrange(SITES_PER_USER)
+        start = time.perf_counter()
+        try:
+            async with session_factory() as session:
+                await SiteRepository(session).list_sites_by_user(user)
+                await CheckRecordRepository(session).list_recent(site_id, 10)
+        except Exception:
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def writer_loop(writer, stop, latencies, errors):
+    result = CheckResult(status_code=200, response_ms=50, is_up=True, content_hash=None, error=None)
+    while not stop.is_set():
+        now = datetime.now(timezone.utc)
+        batch = [
+            PendingCheck(random.randint(1, USERS) * SITES_PER_USER + random.randrange(SITES_PER_USER), result, now)
+            for _ in range(BATCH)
+        ]
+        start = time.perf_counter()
+        try:
+            await writer.flush(batch)
+        except Exception:
+            errors.append(1)
+        else:
+            latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run(url, profile, seconds):
+    engine, session_factory = create_engine_and_session(url, profile)
+    await seed(engine, session_factory)
+    writer = CheckResultWriter(session_factory)
+    stop = asyncio.Event()
+    reads, writes, read_errors, write_errors = [], [], [], []
+    tasks = [asyncio.create_task(reader(session_factory, stop, reads, read_errors)) for _ in range(READERS)]
+    tasks.append(asyncio.create_task(writer_loop(writer, stop, writes, write_errors)))
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    async with session_factory() as session:
+        await session.execute(delete(CheckRecord))
+        await session.commit()
+    await engine.dispose()
+    reads, writes = sorted(reads), sorted(writes)
+    ms = lambda values, q: percentile(values, q) * 1000 if values else float("nan")  # noqa: E731
+    return (
+        ms(reads, 0.5), ms(reads, 0.99), len(reads) / seconds,
+        ms(writes, 0.5), ms(writes, 0.99), len(writes) * BATCH / seconds,
+        len(read_errors) + len(write_errors),
+    )
+
+
+async def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [
+            ("sqlite default", f"sqlite+aiosqlite:///{tmp}/default.db", SQLITE_DEFAULTS),
+            ("sqlite tuned", f"sqlite+aiosqlite:///{tmp}/tuned.db", DatabaseProfile()),
+        ]
+        if len(sys.argv) > 2:
+            runs.append(("postgres", sys.argv[2], DatabaseProfile()))
+        print(f"{READERS} readers + 1 writer ({BATCH} records / 50 ms) for {seconds:g}s, "
+              f"{USERS * SITES_PER_USER} sites x {HISTORY} records")
+        print(f"{'profile':<16}{'read p50':>10}{'read p99':>10}{'reads/s':>9}"
+              f"{'commit p50':>12}{'commit p99':>12}{'records/s':>11}{'errors':>8}")
+        for label, url, profile in runs:
+            r50, r99, rps, w50, w99, wps, errors = await run(url, profile, seconds)
+            print(f"{label:<16}{r50:>10.1f}{r99:>10.1f}{rps:>9.0f}{w50:>12.1f}{w99:>12.1f}{wps:>11.0f}{errors:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
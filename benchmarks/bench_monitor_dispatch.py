@@ -0,0 +1,110 @@
+"""
+Scheduling overhead of MonitorScheduler (one APScheduler job per site,
+get_site query per firing) against DispatchScheduler (batched claims by
+sites.next_check_at) at 10k and 100k sites. No checks run: the monitor
+service is a stub, so only scheduling and its DB traffic are timed.
+
+Per-firing get_site cost is sampled on 2000 sites and scaled to one full
+interval. "peak/s" is the most checks started within one second.
+
+Usage: python benchmarks/bench_monitor_dispatch.py [sites ...]
+"""
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from sqlalchemy import insert, text  # noqa: E402
+
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.repository import SiteRepository  # noqa: E402
+from site_monitor_bot.scheduler import DispatchScheduler, MonitorScheduler  # noqa: E402
+
+INTERVAL = 60
+SAMPLE = 2000
+
+
+class NullService:
+    async def perform_check_and_store(self, site):
+        pass
+
+
+async def seed(session_factory, sites):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        await session.flush()
+        await session.execute(insert(Site), [
+            {"user_id": 1, "url": f"https://site{i}.example", "interval_seconds": INTERVAL}
+            for i in range(sites)
+        ])
+        await session.commit()
+
+
+async def bench_apscheduler(session_factory, sites):
+    scheduler = MonitorScheduler(session_factory, NullService(), weekly_cron={"day_of_week": "mon", "hour": 9, "minute": 0})
+    start = time.perf_counter()
+    await scheduler.start()
+    setup = time.perf_counter() - start
+    jobs = scheduler.scheduler.get_jobs()
+    peak = max(Counter(int(job.next_run_time.timestamp()) for job in jobs).values())
+    scheduler.scheduler.shutdown(wait=False)
+
+    ids = random.sample(range(1, sites + 1), min(SAMPLE, sites))
+    start = time.perf_counter()
+    for site_id in ids:
+        async with session_factory() as session:
+            await SiteRepository(session).get_site(site_id)
+    per_interval = (time.perf_counter() - start) / len(ids) * sites
+    return setup, per_interval, peak
+
+
+async def bench_dispatcher(session_factory, sites):
+    dispatcher = DispatchScheduler(session_factory, NullService(), batch_size=500, jitter_s=INTERVAL, max_in_flight=sites)
+    now = datetime.now(timezone.utc)
+    starts = Counter()
+    start = time.perf_counter()
+    claimed = 0
+    while claimed < sites:
+        batch = await dispatcher.claim_due(now, dispatcher.batch_size)
+        for site in batch:
+            starts[int(random.uniform(0, min(dispatcher.jitter_s, site.interval_seconds)))] += 1
+        claimed += len(batch)
+    per_interval = time.perf_counter() - start
+    return per_interval, max(starts.values())
+
+
+async def query_plan(session_factory):
+    async with session_factory() as session:
+        rows = await session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM sites WHERE is_active = 1 "
+            "AND (next_check_at IS NULL OR next_check_at <= :now) ORDER BY next_check_at LIMIT 500"
+        ), {"now": datetime.now(timezone.utc)})
+        return [row[-1] for row in rows]
+
+
+async def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'sites':>8}{'scheduler':>12}{'setup s':>10}{'DB s/interval':>15}{'peak/s':>8}")
+        for sites in counts:
+            _, session_factory = await temp_database(tmp, f"aps_{sites}.db")
+            await seed(session_factory, sites)
+            setup, per_interval, peak = await bench_apscheduler(session_factory, sites)
+            print(f"{sites:>8}{'apscheduler':>12}{setup:>10.2f}{per_interval:>15.2f}{peak:>8}")
+
+            _, session_factory = await temp_database(tmp, f"dispatch_{sites}.db")
+            await seed(session_factory, sites)
+            per_interval, peak = await bench_dispatcher(session_factory, sites)
+            print(f"{sites:>8}{'dispatcher':>12}{0:>10.2f}{per_interval:>15.2f}{peak:>8}")
+        print("due-sites query plan:", "; ".join(await query_plan(session_factory)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
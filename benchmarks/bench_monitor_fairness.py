@@ -0,0 +1,117 @@
+"""
+Check lag (finish time minus due time) when a few hosts are slow or stop
+answering: one global semaphore against CheckExecutor (per-host slots,
+most-overdue first, adaptive timeouts). Every round all sites fall due at
+once, as after a dispatcher claim; rounds run back to back so the
+executor's latency and failure history carries over.
+
+Local servers stand in for hosts: one "fast" host answers at once, two
+"slow" ones after 2s and five "hanging" ones never within the 5s base
+timeout. The hanging sites alone outnumber the global slots.
+
+Usage: python benchmarks/bench_monitor_fairness.py [fast_sites] [rounds]
+"""
+import asyncio
+import random
+import sys
+import tempfile
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+from monitor_support import local_server, temp_database, use_package
+
+use_package()
+
+from aiohttp import web  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.executor import CheckExecutor  # noqa: E402
+from site_monitor_bot.monitor import CheckConfig, MonitorService  # noqa: E402
+from site_monitor_bot.repository import SiteRepository  # noqa: E402
+from site_monitor_bot.rollups import percentile  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter  # noqa: E402
+
+CONCURRENCY = 20
+TIMEOUT_S = 5
+# group -> (hosts, sites per host, seconds to answer)
+BAD_HOSTS = {"slow": (2, 5, 2), "hanging": (5, 6, 60)}
+
+
+def answer_after(seconds):
+    async def handler(request):
+        await asyncio.sleep(seconds)
+        return web.Response(text="ok")
+    return handler
+
+
+async def seed(session_factory, urls):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        await session.flush()
+        await session.execute(insert(Site), [
+            {"user_id": 1, "url": url, "interval_seconds": 60} for url in urls
+        ])
+        await session.commit()
+        return await SiteRepository(session).list_all_active()
+
+
+async def run(session_factory, sites, groups, rounds, executor):
+    writer = CheckResultWriter(session_factory)
+    writer.start()
+    service = MonitorService(
+        session_factory,
+        max_concurrent_checks=CONCURRENCY,
+        writer=writer,
+        check=CheckConfig(timeout_s=TIMEOUT_S),
+        executor=executor,
+    )
+    loop = asyncio.get_running_loop()
+    lags = {group: [] for group in set(groups.values())}
+
+    async def check(site, due):
+        await service.perform_check_and_store(site)
+        lags[groups[site.id]].append(int((loop.time() - due) * 1000))
+
+    for _ in range(rounds):
+        now = datetime.now(timezone.utc)
+        for site in sites:
+            site.next_check_at = now
+        due = loop.time()
+        await asyncio.gather(*(check(site, due) for site in sites))
+    await service.close()
+    return lags
+
+
+async def main():
+    fast_sites = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    modes = [
+        ("global semaphore", lambda: None),
+        ("per-host executor", lambda: CheckExecutor(max_concurrent=CONCURRENCY, per_host=2, timeout_s=TIMEOUT_S, min_timeout_s=1)),
+    ]
+    async with AsyncExitStack() as stack:
+        fast = await stack.enter_async_context(local_server({"/": answer_after(0)}))
+        urls = [(str(fast.make_url(f"/?n={i}")), "fast") for i in range(fast_sites)]
+        for group, (hosts, per_host, seconds) in BAD_HOSTS.items():
+            for _ in range(hosts):
+                server = await stack.enter_async_context(local_server({"/": answer_after(seconds)}))
+                urls += [(str(server.make_url(f"/?n={i}")), group) for i in range(per_host)]
+        random.Random(1).shuffle(urls)
+        counts = ", ".join(f"{hosts}x{per_host} {group}" for group, (hosts, per_host, _) in BAD_HOSTS.items())
+        print(f"{fast_sites} fast, {counts} sites; {CONCURRENCY} concurrent checks, {rounds} rounds")
+        print(f"{'mode':<20}{'host':<9}{'p50 lag ms':>12}{'p99 lag ms':>12}{'max lag ms':>12}")
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, (label, make_executor) in enumerate(modes):
+                _, session_factory = await temp_database(tmp, f"fairness_{i}.db")
+                sites = await seed(session_factory, [url for url, _ in urls])
+                groups = {site.id: group for site, (_, group) in zip(sites, urls)}
+                lags = await run(session_factory, sites, groups, rounds, make_executor())
+                for group in ("fast", "slow", "hanging"):
+                    values = sorted(lags[group])
+                    print(f"{label:<20}{group:<9}{percentile(values, 0.5):>12}"
+                          f"{percentile(values, 0.99):>12}{values[-1]:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,189 @@
+"""
+/history queries on a large check_records table under each index layout:
+site_id alone (the original schema), (site_id, checked_at) and the
+current (site_id, checked_at DESC, id DESC) index that init_db upgrades
+to. For each layout prints the EXPLAIN QUERY PLAN and p50/p99 latency of
+the newest page (list_recent), a deep page by OFFSET and the same page by
+keyset (list_page with a cursor). Also times the init_db upgrade.
+
+Rows are loaded with sqlite3 directly, checks every 5 minutes for each
+site; the default 10M rows over 1000 sites is about five weeks of history
+per site and needs a few GB of disk and several minutes.
+
+Usage: python benchmarks/bench_monitor_history.py [rows] [sites] [queries]
+"""
+import asyncio
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from site_monitor_bot.db import CheckRecord, Site, User, init_db  # noqa: E402
+from site_monitor_bot.repository import CheckRecordRepository  # noqa: E402
+from site_monitor_bot.rollups import percentile  # noqa: E402
+
+PAGE = 10
+INTERVAL = timedelta(minutes=5)
+# Indexes on check_records that are not part of a layout
+KEPT = {"ix_check_records_checked_at"}
+LAYOUTS = {
+    "site_id": ["CREATE INDEX ix_check_records_site_id ON check_records (site_id)"],
+    "site_id, checked_at": [
+        "CREATE INDEX ix_check_records_site_id ON check_records (site_id)",
+        "CREATE INDEX ix_check_records_site_checked ON check_records (site_id, checked_at)",
+    ],
+}
+# What the repository runs, for EXPLAIN
+QUERIES = {
+    "recent": "SELECT * FROM check_records WHERE site_id = ? ORDER BY checked_at DESC, id DESC LIMIT 10",
+    "offset": "SELECT * FROM check_records WHERE site_id = ? ORDER BY checked_at DESC, id DESC LIMIT 10 OFFSET ?",
+    "keyset": "SELECT * FROM check_records WHERE site_id = ? AND checked_at <= ? AND (checked_at < ? OR id < ?) "
+              "ORDER BY checked_at DESC, id DESC LIMIT 10",
+}
+
+
+def load(path, rows, sites):
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA synchronous=OFF")
+    for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'check_records'").fetchall():
+        if name not in KEPT and not name.startswith("sqlite_"):
+            connection.execute(f"DROP INDEX {name}")
+    start = datetime(2026, 1, 1)
+    per_site = rows // sites
+    # Interleaved by time like real checks; SQLAlchemy's SQLite DateTime format
+    records = (
+        (site, (start + INTERVAL * n).strftime("%Y-%m-%d %H:%M:%S.%f"), 200, 50, 1)
+        for n in range(per_site) for site in range(1, sites + 1)
+    )
+    connection.executemany(
+        "INSERT INTO check_records (site_id, checked_at, status_code, response_ms, is_up) VALUES (?, ?, ?, ?, ?)", records
+    )
+    connection.commit()
+    connection.execute("ANALYZE")
+    connection.close()
+    return per_site
+
+
+def set_layout(path, statements, drop=True):
+    connection = sqlite3.connect(path)
+    for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'check_records'").fetchall():
+        if drop and name not in KEPT and not name.startswith("sqlite_"):
+            connection.execute(f"DROP INDEX {name}")
+    for statement in statements:
+        connection.execute(statement)
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+
+
+def explain(path, site_id, depth, cursor):
+    connection = sqlite3.connect(path)
+    params = {"recent": (site_id,), "offset": (site_id, depth), "keyset": (site_id, cursor[0], cursor[0], cursor[1])}
+    for name, sql in QUERIES.items():
+        plan = connection.execute("EXPLAIN QUERY PLAN " + sql, params[name]).fetchall()
+        print(f"  {name:<7}" + " | ".join(row[-1] for row in plan))
+    connection.close()
+
+
+async def timed(session_factory, samples, query):
+    latencies = []
+    for sample in samples:
+        start = time.perf_counter()
+        async with session_factory() as session:
+            await query(session, *sample)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000
+
+
+async def recent(session, site_id, depth, cursor):
+    await CheckRecordRepository(session).list_recent(site_id, PAGE)
+
+
+async def offset_page(session, site_id, depth, cursor):
+    stmt = (
+        select(CheckRecord)
+        .where(CheckRecord.site_id == site_id)
+        .order_by(CheckRecord.checked_at.desc(), CheckRecord.id.desc())
+        .limit(PAGE)
+        .offset(depth)
+    )
+    await session.execute(stmt)
+
+
+async def keyset_page(session, site_id, depth, cursor):
+    await CheckRecordRepository(session).list_page(site_id, PAGE, before=cursor)
+
+
+async def cursors(session_factory, site_ids, depth):
+    # (checked_at, id) of the record just above the deep page, as /history's cursor would carry
+    samples = []
+    async with session_factory() as session:
+        for site_id in site_ids:
+            row = (await session.execute(
+                select(CheckRecord.checked_at, CheckRecord.id)
+                .where(CheckRecord.site_id == site_id)
+                .order_by(CheckRecord.checked_at.desc(), CheckRecord.id.desc())
+                .limit(1)
+                .offset(depth - 1)
+            )).one()
+            samples.append((site_id, depth, tuple(row)))
+    return samples
+
+
+async def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    sites = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    queries = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, session_factory = await temp_database(tmp, "history.db")
+        async with session_factory() as session:
+            session.add(User(telegram_user_id=1, chat_id=1))
+            await session.flush()
+            await session.execute(insert(Site), [
+                {"id": i, "user_id": 1, "url": f"https://s{i}.example"} for i in range(1, sites + 1)
+            ])
+            await session.commit()
+        await engine.dispose()
+        path = f"{tmp}/history.db"
+        start = time.perf_counter()
+        per_site = await asyncio.to_thread(load, path, rows, sites)
+        print(f"{per_site * sites} rows, {sites} sites x {per_site} checks, loaded in {time.perf_counter() - start:.0f}s")
+        # A page halfway through each site's history
+        depth = per_site // 2
+        site_ids = [random.randint(1, sites) for _ in range(queries)]
+
+        results = {}
+        for layout in [*LAYOUTS, "upgraded"]:
+            if layout == "upgraded":
+                # From the previous layout, as an existing deployment would
+                start = time.perf_counter()
+                await init_db(engine)
+                print(f"init_db upgrade: {time.perf_counter() - start:.1f}s")
+                await engine.dispose()
+                await asyncio.to_thread(set_layout, path, [], False)
+            else:
+                await engine.dispose()
+                await asyncio.to_thread(set_layout, path, LAYOUTS[layout])
+            samples = await cursors(session_factory, site_ids, depth)
+            print(f"{layout}:")
+            explain(path, *samples[0])
+            results[layout] = [await timed(session_factory, samples, query) for query in (recent, offset_page, keyset_page)]
+
+        print(f"\n{queries} queries per cell, page of {PAGE}, deep page at {depth}, ms p50 / p99")
+        print(f"{'layout':<22}{'recent':>16}{'offset page':>18}{'keyset page':>18}")
+        for layout, cells in results.items():
+            print(f"{layout:<22}" + "".join(f"{f'{p50:.2f} / {p99:.2f}':>{w}}" for (p50, p99), w in zip(cells, (16, 18, 18))))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
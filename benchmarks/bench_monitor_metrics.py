@@ -0,0 +1,88 @@
+"""
+Cost of the check-path instrumentation: checks/s and CPU time per check
+through MonitorService + CheckResultWriter against a local server, with
+metrics off, on (histograms and counters) and on with the aiohttp trace
+hooks. Modes alternate over several rounds and the best round of each is
+kept. CPU time includes the local server, which is the same in every
+mode. Also times one histogram observation and one /metrics render.
+
+Usage: python benchmarks/bench_monitor_metrics.py [checks] [rounds]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+import timeit
+
+from monitor_support import local_server, temp_database, use_package
+
+use_package()
+
+from aiohttp import web  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.metrics import MonitorMetrics  # noqa: E402
+from site_monitor_bot.monitor import MonitorService  # noqa: E402
+from site_monitor_bot.repository import SiteRepository  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter  # noqa: E402
+
+SITES = 100
+
+
+async def page(request):
+    return web.Response(text="ok " * 1000)
+
+
+async def seed(session_factory, url):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        await session.flush()
+        await session.execute(insert(Site), [
+            {"user_id": 1, "url": f"{url}?n={i}", "interval_seconds": 60} for i in range(SITES)
+        ])
+        await session.commit()
+        return await SiteRepository(session).list_all_active()
+
+
+async def run(session_factory, sites, checks, metrics):
+    writer = CheckResultWriter(session_factory, metrics=metrics)
+    writer.start()
+    service = MonitorService(session_factory, max_concurrent_checks=20, writer=writer, metrics=metrics)
+    wall, cpu = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(service.perform_check_and_store(sites[i % len(sites)]) for i in range(checks)))
+    await writer.close()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    await service.close()
+    return checks / wall, cpu / checks * 1e6
+
+
+async def main():
+    checks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    modes = {"off": None, "on": MonitorMetrics(), "on+trace": MonitorMetrics(http_trace=True)}
+    best = {mode: (0.0, float("inf")) for mode in modes}
+    with tempfile.TemporaryDirectory() as tmp:
+        _, session_factory = await temp_database(tmp)
+        async with local_server({"/": page}) as server:
+            sites = await seed(session_factory, str(server.make_url("/")))
+            for _ in range(rounds):
+                for mode in best:
+                    rate, cpu_us = await run(session_factory, sites, checks, modes[mode])
+                    best[mode] = (max(best[mode][0], rate), min(best[mode][1], cpu_us))
+
+    print(f"{checks} checks x {rounds} rounds, best round per mode")
+    print(f"{'metrics':<10}{'checks/s':>10}{'CPU us/check':>14}")
+    for mode, (rate, cpu_us) in best.items():
+        print(f"{mode:<10}{rate:>10.0f}{cpu_us:>14.0f}")
+    for mode in ("on", "on+trace"):
+        print(f"CPU overhead per check, {mode}: {(best[mode][1] / best['off'][1] - 1) * 100:+.1f}%")
+
+    metrics = modes["on"]
+    observe = timeit.timeit(lambda: metrics.check_duration.observe(0.05), number=100_000) / 100_000
+    render = timeit.timeit(metrics.registry.render, number=100) / 100
+    print(f"histogram observe: {observe * 1e9:.0f} ns, /metrics render: {render * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
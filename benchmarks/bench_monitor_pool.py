@@ -0,0 +1,59 @@
+"""
+Checks/sec against a local aiohttp server: a new ClientSession per check
+(how the scheduler used to run) against MonitorService's pooled session.
+
+Usage: python benchmarks/bench_monitor_pool.py [checks] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+from monitor_support import local_server, use_package
+
+use_package()
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+from site_monitor_bot.monitor import HttpPoolConfig, create_http_session, http_check  # noqa: E402
+
+
+async def run(url, checks, concurrency, pooled):
+    semaphore = asyncio.Semaphore(concurrency)
+    session = create_http_session(HttpPoolConfig(limit=concurrency, limit_per_host=concurrency)) if pooled else None
+
+    async def one():
+        async with semaphore:
+            if pooled:
+                return await http_check(url, session)
+            async with aiohttp.ClientSession() as fresh:
+                return await http_check(url, fresh)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(checks)))
+    elapsed = time.perf_counter() - start
+    if session is not None:
+        await session.close()
+    assert all(r.is_up for r in results)
+    mean_ms = sum(r.response_ms for r in results) / len(results)
+    return checks / elapsed, mean_ms
+
+
+async def main():
+    checks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    async def page(request):
+        return web.Response(text="x" * 2048)
+
+    async with local_server({"/": page}) as server:
+        url = str(server.make_url("/"))
+        print(f"{checks} checks, concurrency {concurrency}")
+        print(f"{'client':<16}{'checks/s':>10}{'mean response_ms':>18}")
+        for label, pooled in (("session/check", False), ("pooled", True)):
+            rate, mean_ms = await run(url, checks, concurrency, pooled)
+            print(f"{label:<16}{rate:>10.0f}{mean_ms:>18.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
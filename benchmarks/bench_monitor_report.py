@@ -0,0 +1,120 @@
+"""
+Weekly report generation on a seeded database: a naive per-user, per-site
+loop (one records query per site, stats in Python, sequential sends)
+against Notifier.send_weekly_report (batched users, grouped aggregate
+queries, concurrent sends). The fake bot takes `send_ms` per message and
+the rate limit is lifted so the numbers show query and send overlap.
+
+Usage: python benchmarks/bench_monitor_report.py [sites] [sites_per_user] [send_ms]
+"""
+import asyncio
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from sqlalchemy import insert, select  # noqa: E402
+
+from site_monitor_bot.db import CheckRecord, Site, User  # noqa: E402
+from site_monitor_bot.notifications import Notifier  # noqa: E402
+from site_monitor_bot.rollups import percentile  # noqa: E402
+
+NOW = datetime(2026, 3, 9, tzinfo=timezone.utc)
+CHECKS = 7 * 24  # hourly for a week
+
+
+class FakeBot:
+    def __init__(self, send_ms):
+        self.delay = send_ms / 1000
+        self.sent = 0
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.delay)
+        self.sent += 1
+
+
+async def seed(session_factory, sites, per_user):
+    rng = random.Random(1)
+    users = sites // per_user
+    async with session_factory() as session:
+        await session.execute(insert(User), [{"telegram_user_id": u, "chat_id": u} for u in range(1, users + 1)])
+        await session.execute(insert(Site), [
+            {"user_id": i % users + 1, "url": f"https://site{i}.example", "interval_seconds": 3600}
+            for i in range(sites)
+        ])
+        await session.commit()
+    start = NOW - timedelta(days=7)
+    for first in range(1, sites + 1, 500):
+        rows = []
+        for site_id in range(first, min(first + 500, sites + 1)):
+            down_until = -1
+            for i in range(CHECKS):
+                if i > down_until and rng.random() < 0.01:
+                    down_until = i + rng.randint(0, 5)
+                up = i > down_until
+                rows.append({
+                    "site_id": site_id,
+                    "checked_at": start + timedelta(hours=i),
+                    "status_code": 200 if up else None,
+                    "response_ms": int(rng.lognormvariate(4.5, 0.5)),
+                    "is_up": up,
+                })
+        async with session_factory() as session:
+            await session.execute(insert(CheckRecord), rows)
+            await session.commit()
+
+
+async def naive_report(session_factory, bot):
+    since = NOW - timedelta(days=7)
+    async with session_factory() as session:
+        users = (await session.execute(select(User))).scalars().all()
+    for user in users:
+        lines = []
+        async with session_factory() as session:
+            sites = (await session.execute(select(Site).where(Site.user_id == user.telegram_user_id))).scalars().all()
+            for site in sites:
+                records = (await session.execute(
+                    select(CheckRecord).where(CheckRecord.site_id == site.id, CheckRecord.checked_at >= since)
+                    .order_by(CheckRecord.checked_at)
+                )).scalars().all()
+                latencies = sorted(r.response_ms for r in records if r.is_up)
+                incidents, previous = 0, True
+                for record in records:
+                    incidents += previous and not record.is_up
+                    previous = record.is_up
+                lines.append(f"{site.url} {len(latencies) / len(records):.2%} p95={percentile(latencies, 0.95)} incidents={incidents}")
+        if lines:
+            await bot.send_message(user.chat_id, "\n".join(lines))
+
+
+async def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    send_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    with tempfile.TemporaryDirectory() as tmp:
+        _, session_factory = await temp_database(tmp, "report.db")
+        start = time.perf_counter()
+        await seed(session_factory, sites, per_user)
+        print(f"seeded {sites} sites x {CHECKS} checks, {sites // per_user} users in {time.perf_counter() - start:.1f}s")
+        print(f"{'report':<12}{'seconds':>9}{'messages':>10}")
+
+        bot = FakeBot(send_ms)
+        start = time.perf_counter()
+        await naive_report(session_factory, bot)
+        print(f"{'naive':<12}{time.perf_counter() - start:>9.1f}{bot.sent:>10}")
+
+        bot = FakeBot(send_ms)
+        notifier = Notifier(bot, session_factory, messages_per_second=10_000, max_concurrent_sends=20)
+        start = time.perf_counter()
+        await notifier.send_weekly_report(now=NOW)
+        print(f"{'batched':<12}{time.perf_counter() - start:>9.1f}{bot.sent:>10}")
+        print(f"at Telegram's ~25 msg/s the send phase alone needs {bot.sent / 25:.0f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+"""
+Table size and reporting query time on a synthetic year of check records,
+before and after compaction into hourly/daily rollups with raw retention.
+
+The raw query aggregates check_records per site; the rollup query does
+the same over daily check_rollups rows.
+
+Usage: python benchmarks/bench_monitor_rollups.py [sites] [interval_minutes] [retention_days]
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from sqlalchemy import func, insert, select, text  # noqa: E402
+
+from site_monitor_bot import rollups  # noqa: E402
+from site_monitor_bot.db import CheckRecord, CheckRollup, Site, User  # noqa: E402
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+async def seed(session_factory, sites, interval_minutes):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        session.add_all(Site(user_id=1, url=f"https://site{i}.example", interval_seconds=interval_minutes * 60) for i in range(sites))
+        await session.commit()
+    rng = random.Random(1)
+    start = NOW - timedelta(days=365)
+    checks = 365 * 24 * 60 // interval_minutes
+    for site_id in range(1, sites + 1):
+        rows = []
+        for i in range(checks):
+            up = rng.random() > 0.01
+            rows.append({
+                "site_id": site_id,
+                "checked_at": start + timedelta(minutes=i * interval_minutes),
+                "status_code": 200 if up else None,
+                "response_ms": int(rng.lognormvariate(4.5, 0.5)),
+                "is_up": up,
+                "error": None if up else "timeout",
+            })
+        async with session_factory() as session:
+            await session.execute(insert(CheckRecord), rows)
+            await session.commit()
+
+
+async def raw_report(session_factory, since):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(CheckRecord.site_id, func.count(), func.sum(CheckRecord.is_up), func.max(CheckRecord.response_ms))
+            .where(CheckRecord.checked_at >= since)
+            .group_by(CheckRecord.site_id)
+        )
+        return result.all()
+
+
+async def rollup_report(session_factory, since):
+    async with session_factory() as session:
+        result = await session.execute(
+            select(CheckRollup.site_id, func.sum(CheckRollup.checks), func.sum(CheckRollup.up_checks), func.max(CheckRollup.max_ms))
+            .where(CheckRollup.period == rollups.DAY, CheckRollup.bucket_start >= since, CheckRollup.bucket_start < NOW)
+            .group_by(CheckRollup.site_id)
+        )
+        return result.all()
+
+
+async def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def sizes(engine, path):
+    async with engine.connect() as conn:
+        raw = await conn.scalar(select(func.count()).select_from(CheckRecord))
+        rolled = await conn.scalar(select(func.count()).select_from(CheckRollup))
+    return raw, rolled, os.path.getsize(path) / 2**20
+
+
+async def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    retention = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, session_factory = await temp_database(tmp, "rollups.db")
+        path = os.path.join(tmp, "rollups.db")
+        start = time.perf_counter()
+        await seed(session_factory, sites, interval)
+        print(f"seeded a year for {sites} sites every {interval} min in {time.perf_counter() - start:.1f}s")
+
+        month, year = NOW - timedelta(days=30), NOW - timedelta(days=365)
+        raw_count, _, size = await sizes(engine, path)
+        raw_month = await timed(raw_report, session_factory, month)
+        raw_year = await timed(raw_report, session_factory, year)
+
+        start = time.perf_counter()
+        stats = await rollups.compact(session_factory, now=NOW, retention_days=retention)
+        compaction = time.perf_counter() - start
+        async with engine.connect() as conn:
+            await conn.execute(text("VACUUM"))
+        kept, rolled, compact_size = await sizes(engine, path)
+        rollup_month = await timed(rollup_report, session_factory, month)
+        rollup_year = await timed(rollup_report, session_factory, year)
+
+        print(f"compaction: {compaction:.1f}s, {stats['rollups']} rollups, {stats['pruned']} raw rows pruned")
+        print(f"{'':<10}{'raw rows':>10}{'rollups':>9}{'db MiB':>8}{'30d query ms':>14}{'365d query ms':>15}")
+        print(f"{'before':<10}{raw_count:>10}{0:>9}{size:>8.1f}{raw_month * 1000:>14.1f}{raw_year * 1000:>15.1f}")
+        print(f"{'after':<10}{kept:>10}{rolled:>9}{compact_size:>8.1f}{rollup_month * 1000:>14.1f}{rollup_year * 1000:>15.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Checks per second with 1..N sharded worker processes. Every worker runs
+ShardCoordinator + DispatchScheduler + MonitorService against one SQLite
+database; all sites are due every second, so the workers stay saturated
+and the rate is their capacity. Pages are large enough that hashing and
+parsing cost real CPU. The local server runs in this process and takes
+CPU too, so scaling flattens out one core short of the machine's count.
+
+Usage: python benchmarks/bench_monitor_shards.py [max_workers] [sites] [seconds]
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from monitor_support import local_server, temp_database, use_package
+
+use_package()
+
+from aiohttp import web  # noqa: E402
+from sqlalchemy import delete, func, insert, select  # noqa: E402
+
+from site_monitor_bot.db import CheckRecord, Site, User, create_engine_and_session  # noqa: E402
+from site_monitor_bot.monitor import CheckConfig, MonitorService  # noqa: E402
+from site_monitor_bot.scheduler import DispatchScheduler  # noqa: E402
+from site_monitor_bot.sharding import ShardCoordinator  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter  # noqa: E402
+
+PAGE = b"<html>" + b"x" * (256 * 1024) + b"</html>"
+SHARDS = 32
+LEASE_S = 3.0
+WARMUP_S = 3.0
+
+
+async def page(request):
+    return web.Response(body=PAGE, content_type="text/html")
+
+
+async def seed(session_factory, url, sites):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        await session.flush()
+        await session.execute(insert(Site), [
+            {"user_id": 1, "url": f"{url}?n={i}", "interval_seconds": 1} for i in range(sites)
+        ])
+        await session.commit()
+
+
+async def work(database_url, seconds):
+    from loguru import logger
+    logger.remove()
+    _, session_factory = create_engine_and_session(database_url)
+    writer = CheckResultWriter(session_factory)
+    writer.start()
+    service = MonitorService(session_factory, max_concurrent_checks=50, writer=writer, check=CheckConfig(max_body_bytes=None))
+    coordinator = ShardCoordinator(session_factory, SHARDS, lease_s=LEASE_S)
+    dispatcher = DispatchScheduler(session_factory, service, poll_interval_s=0.2, jitter_s=0, max_in_flight=200, shards=coordinator)
+    await coordinator.start()
+    await dispatcher.start()
+    await asyncio.sleep(seconds)
+    await dispatcher.stop()
+    await coordinator.stop()
+    await service.close()
+
+
+def worker_process(database_url, seconds):
+    asyncio.run(work(database_url, seconds))
+
+
+async def run(session_factory, database_url, workers, seconds):
+    async with session_factory() as session:
+        await session.execute(delete(CheckRecord))
+        await session.commit()
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=worker_process, args=(database_url, WARMUP_S + seconds)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # Measure once the shards have settled between the workers
+    start = datetime.now(timezone.utc) + timedelta(seconds=WARMUP_S)
+    # Keep serving pages while the workers run
+    while any(process.is_alive() for process in processes):
+        await asyncio.sleep(0.2)
+    end = start + timedelta(seconds=seconds)
+    async with session_factory() as session:
+        checks = await session.scalar(
+            select(func.count()).select_from(CheckRecord).where(CheckRecord.checked_at >= start, CheckRecord.checked_at < end)
+        )
+    return checks / seconds
+
+
+async def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    sites = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    with tempfile.TemporaryDirectory() as tmp:
+        _, session_factory = await temp_database(tmp, "shards.db")
+        database_url = f"sqlite+aiosqlite:///{tmp}/shards.db"
+        async with local_server({"/": page}) as server:
+            await seed(session_factory, str(server.make_url("/")), sites)
+            print(f"{sites} sites due every second, {SHARDS} shards, {len(PAGE) // 1024} KiB pages, {os.cpu_count()} CPU(s)")
+            print(f"{'workers':>8}{'checks/s':>10}{'speedup':>9}")
+            base = None
+            for workers in range(1, max_workers + 1):
+                rate = await run(session_factory, database_url, workers, seconds)
+                base = base or rate
+                print(f"{workers:>8}{rate:>10.0f}{rate / base:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+/list and /history latency while check results are being written: the bot
+handlers run against SQLite with and without ViewCache while a background
+task stores results through the batched writer at a fixed rate.
+
+Users poll with a skewed popularity (a few active users send most
+commands), which is where a read-through cache pays off.
+
+Usage: python benchmarks/bench_monitor_views.py [users] [commands] [results_per_s]
+"""
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from aiogram import Dispatcher  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from site_monitor_bot.bot import register_handlers  # noqa: E402
+from site_monitor_bot.cache import ViewCache  # noqa: E402
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.monitor import CheckResult, MonitorService  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter  # noqa: E402
+
+SITES_PER_USER = 5
+
+
+class FakeMessage:
+    def __init__(self, text, user_id):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=user_id)
+
+    async def reply(self, text):
+        pass
+
+
+async def seed(session_factory, users):
+    async with session_factory() as session:
+        await session.execute(insert(User), [{"telegram_user_id": u, "chat_id": u} for u in range(1, users + 1)])
+        await session.execute(insert(Site), [
+            {"user_id": i // SITES_PER_USER + 1, "url": f"https://site{i}.example", "interval_seconds": 60}
+            for i in range(users * SITES_PER_USER)
+        ])
+        await session.commit()
+
+
+async def write_results(service, sites, rate, stop):
+    rng = random.Random(2)
+    result = CheckResult(status_code=200, response_ms=50, is_up=True, content_hash=None, error=None)
+    while not stop.is_set():
+        for _ in range(max(1, rate // 20)):
+            await service.store_result(rng.randrange(1, sites + 1), result)
+        await asyncio.sleep(0.05)
+
+
+async def run(directory, users, commands, rate, cached):
+    _, session_factory = await temp_database(directory, f"views_{cached}.db")
+    await seed(session_factory, users)
+    cache = ViewCache(ttl_s=30) if cached else None
+    dp = Dispatcher()
+    register_handlers(dp, session_factory, cache)
+    handlers = {h.callback.__name__: h.callback for h in dp.message.handlers}
+
+    writer = CheckResultWriter(session_factory)
+    service = MonitorService(session_factory, writer=writer, on_stored=cache.invalidate_sites if cache else None)
+    writer.start()
+    stop = asyncio.Event()
+    load = asyncio.create_task(write_results(service, users * SITES_PER_USER, rate, stop))
+
+    rng = random.Random(1)
+    latencies = []
+    semaphore = asyncio.Semaphore(20)
+
+    async def one():
+        user_id = min(users, int(rng.paretovariate(1.2)))
+        if rng.random() < 0.6:
+            handler, text = handlers["on_list"], "/list"
+        else:
+            site_id = (user_id - 1) * SITES_PER_USER + rng.randrange(SITES_PER_USER) + 1
+            handler, text = handlers["on_history"], f"/history {site_id}"
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(FakeMessage(text, user_id))
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0.002)
+
+    await asyncio.gather(*(one() for _ in range(commands)))
+    stop.set()
+    await load
+    await service.close()
+    latencies.sort()
+    return latencies, cache.stats() if cache else None
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{users} users, {commands} commands, {rate} results/s written meanwhile")
+        print(f"{'cache':<7}{'p50 ms':>8}{'p99 ms':>8}{'list hit':>10}{'history hit':>13}")
+        for cached in (False, True):
+            latencies, stats = await run(tmp, users, commands, rate, cached)
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99)] * 1000
+            hits = (f"{stats['list']['hit_rate']:>10.0%}{stats['history']['hit_rate']:>13.0%}" if stats else f"{'-':>10}{'-':>13}")
+            print(f"{'on' if cached else 'off':<7}{p50:>8.2f}{p99:>8.2f}{hits}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
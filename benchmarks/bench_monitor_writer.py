@@ -0,0 +1,74 @@
+"""
+Records/sec for storing check results on SQLite: a session and commit per
+check (MonitorService without a writer) against CheckResultWriter.
+
+Usage: python benchmarks/bench_monitor_writer.py [records] [sites]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+
+from monitor_support import temp_database, use_package
+
+use_package()
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from site_monitor_bot.db import Site, User  # noqa: E402
+from site_monitor_bot.monitor import CheckResult, MonitorService  # noqa: E402
+from site_monitor_bot.writer import CheckResultWriter  # noqa: E402
+
+
+async def seed(session_factory, sites):
+    async with session_factory() as session:
+        session.add(User(telegram_user_id=1, chat_id=1))
+        session.add_all(Site(user_id=1, url=f"https://site{i}.example", interval_seconds=60) for i in range(sites))
+        await session.commit()
+
+
+async def store_all(service, records, sites, concurrency):
+    result = CheckResult(status_code=200, response_ms=12, is_up=True, content_hash=None, error=None)
+    semaphore = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def store(i):
+        nonlocal failed
+        async with semaphore:
+            try:
+                await service.store_result(i % sites + 1, result)
+            except OperationalError:
+                # "database is locked": the writer lock timed out
+                failed += 1
+
+    await asyncio.gather(*(store(i) for i in range(records)))
+    return failed
+
+
+async def run(directory, records, sites, batched, concurrency):
+    _, session_factory = await temp_database(directory, f"writer_{batched}_{concurrency}.db")
+    await seed(session_factory, sites)
+    writer = CheckResultWriter(session_factory) if batched else None
+    service = MonitorService(session_factory, writer=writer)
+    if writer is not None:
+        writer.start()
+    start = time.perf_counter()
+    failed = await store_all(service, records, sites, concurrency)
+    await service.close()
+    return (records - failed) / (time.perf_counter() - start), failed
+
+
+async def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    sites = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{records} results over {sites} sites")
+        print(f"{'writer':<18}{'concurrency':>12}{'records/s':>11}{'lost':>7}")
+        for label, batched in (("commit per check", False), ("batched writer", True)):
+            for concurrency in (1, 10, 50):
+                rate, failed = await run(tmp, records, sites, batched, concurrency)
+                print(f"{label:<18}{concurrency:>12}{rate:>11.0f}{failed:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""
+Lookup latency of the NameIndex: exact, prefix and fuzzy queries.
+
+Builds an index over N generated names (default 1,000,000, roughly the
+size of the full IMDb name list) and times random queries against it.
+Fuzzy queries drop one letter; it also counts how often the name they
+came from is the best fuzzy match.
+
+Usage: python benchmarks/bench_names.py [names]
+"""
+import random
+import statistics
+import sys
+import time
+
+from synthetic import use_degrees
+
+use_degrees()
+
+from name_index import NameIndex  # noqa: E402
+
+SYLLABLES = ["an", "ber", "cal", "do", "el", "fi", "gor", "ha", "is", "jo", "ka", "li",
+             "mar", "na", "o", "pe", "qui", "ro", "sa", "ta", "u", "vi", "wen", "ya", "zo"]
+
+
+def make_name(rng):
+    def word():
+        return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+    return f"{word()} {word()}"
+
+
+def timed_us(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng = random.Random(0)
+    people = {
+        str(i): {"name": make_name(rng), "birth": "", "movies": set()}
+        for i in range(count)
+    }
+
+    start = time.perf_counter()
+    index = NameIndex.from_people(people)
+    sorted_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.build_trigrams()
+    trigram_s = time.perf_counter() - start
+    print(f"{count} names: sorted keys {sorted_s:.1f}s, trigram postings {trigram_s:.1f}s")
+
+    names = [people[str(rng.randrange(count))]["name"] for _ in range(1000)]
+    typos = [name[:3] + name[4:] for name in names[:200]]
+    print(f"{'query':<8}{'p50 us':>10}{'p99 us':>10}")
+    for label, fn, queries in (
+        ("exact", index.exact, names),
+        ("prefix", index.prefix, [name[:5] for name in names]),
+        ("fuzzy", index.fuzzy, typos),
+    ):
+        p50, p99 = timed_us(fn, queries)
+        print(f"{label:<8}{p50:>10.1f}{p99:>10.1f}")
+
+    found = sum(
+        people[index.fuzzy(typo, 1)[0][1]]["name"] == name
+        for typo, name in zip(typos, names)
+    )
+    print(f"fuzzy finds the name first for {found} of {len(typos)} typos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Expansion cost of eager neighbor sets against the lazy iter_neighbors.
+
+The eager variant materializes neighbors_for_person for every expanded
+person, as BFS used to; the lazy one skips self-edges and already-seen
+people before building a pair. SearchStats counts the pairs each variant
+hands to the search, which is the per-query allocation count.
+
+Usage: python benchmarks/bench_neighbors.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import sys
+import tempfile
+import time
+
+from synthetic import dataset_from_argv, random_pairs, use_degrees
+
+use_degrees()
+
+import degrees  # noqa: E402
+from util import SearchStats  # noqa: E402
+
+
+def eager_neighbors(person_id, seen, stats):
+    neighbors = degrees.neighbors_for_person(person_id)
+    kept = [(movie_id, star_id) for movie_id, star_id in neighbors if star_id not in seen]
+    if stats is not None:
+        # The search counts the kept pairs itself; add the discarded ones
+        stats.scanned += len(neighbors)
+        stats.generated += len(neighbors) - len(kept)
+    return kept
+
+
+def run(neighbors, pairs):
+    stats = SearchStats()
+    start = time.perf_counter()
+    for source, target in pairs:
+        degrees.breadth_first_path(source, target, stats, neighbors)
+    return stats, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=20000, movies=8000)
+        degrees.load_data(directory)
+        pairs = random_pairs(degrees.people, count)
+        eager = run(eager_neighbors, pairs)
+        lazy = run(degrees.iter_neighbors, pairs)
+
+    print(f"{count} one-sided BFS queries")
+    print(f"{'variant':<8}{'expanded':>10}{'scanned':>12}{'pairs built':>14}{'seconds':>10}")
+    for name, (stats, elapsed) in (("eager", eager), ("lazy", lazy)):
+        print(f"{name:<8}{stats.expanded:>10}{stats.scanned:>12}{stats.generated:>14}{elapsed:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Latency of the degrees query server: reloading per query (what running
+degrees.py each time costs) against a warm server, cold and cached.
+
+Usage: python benchmarks/bench_server.py [directory] [pairs]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from synthetic import DEGREES_DIR, dataset_from_argv, random_pairs, use_degrees
+
+use_degrees()
+
+import server  # noqa: E402
+
+RELOAD = """
+import sys
+import degrees
+degrees.load_data(sys.argv[1])
+degrees.shortest_path(sys.argv[2], sys.argv[3], mode="bidirectional")
+"""
+
+
+def request_ms(base, source, target):
+    start = time.perf_counter()
+    with urllib.request.urlopen(f"{base}/path?source={source}&target={target}") as response:
+        json.loads(response.read())
+    return (time.perf_counter() - start) * 1000
+
+
+def summary(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    print(f"{label:<22}{statistics.median(samples):>10.2f}{p95:>10.2f}")
+
+
+def main():
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=100000, movies=40000)
+        httpd = server.make_server(directory, port=0)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{httpd.server_address[1]}"
+        pairs = random_pairs(server.degrees.graph.person_ids, count)
+
+        reload_ms = []
+        for source, target in pairs[:3]:
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", RELOAD, str(directory), source, target], cwd=DEGREES_DIR, check=True)
+            reload_ms.append((time.perf_counter() - start) * 1000)
+        miss_ms = [request_ms(base, source, target) for source, target in pairs]
+        hit_ms = [request_ms(base, source, target) for source, target in pairs]
+        with urllib.request.urlopen(f"{base}/stats") as response:
+            stats = json.loads(response.read())["cache"]
+        httpd.shutdown()
+        httpd.server_close()
+
+    print(f"{'':<22}{'p50 ms':>10}{'p95 ms':>10}")
+    summary("reload per query", reload_ms)
+    summary("server, cache miss", miss_ms)
+    summary("server, cache hit", hit_ms)
+    print(f"cache: {stats['hits']} hits, {stats['misses']} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Cold-start time: loading from CSV against memory-mapping a snapshot.
+
+Each variant runs in a fresh interpreter that loads the data and answers
+one query, so the numbers include imports and first-touch page faults.
+
+Usage: python benchmarks/bench_snapshot.py [directory]
+Without a directory a synthetic dataset is generated in a temp dir.
+"""
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic import DEGREES_DIR, dataset_from_argv, use_degrees
+
+use_degrees()
+
+import snapshot  # noqa: E402
+
+QUERY = """
+import sys
+import degrees
+degrees.load_data(sys.argv[1], compact=sys.argv[2] == "compact", snapshot=sys.argv[2] == "snapshot")
+degrees.person_info("100001")
+"""
+
+
+def cold_start(directory, variant, runs=3):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", QUERY, str(directory), variant], cwd=DEGREES_DIR, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = dataset_from_argv(tmp, people=200000, movies=80000)
+        start = time.perf_counter()
+        snapshot.build(directory)
+        build_s = time.perf_counter() - start
+
+        print(f"snapshot build: {build_s:.2f}s (one-off)")
+        print(f"{'variant':<10}{'cold start s':>14}")
+        for variant in ("dicts", "compact", "snapshot"):
+            print(f"{variant:<10}{cold_start(directory, variant):>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Shared helpers for the site_monitor_bot benchmarks.
+"""
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def use_package():
+    """
+    Makes site_monitor_bot importable when a benchmark runs as a script.
+    """
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+
+
+@asynccontextmanager
+async def local_server(routes):
+    """
+    Runs an aiohttp app with `routes` ({path: handler}) on a free local
+    port and yields the server; use server.make_url(path) for URLs.
+    """
+    from aiohttp import web
+    from aiohttp.test_utils import TestServer
+
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_route("*", path, handler)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield server
+    finally:
+        await server.close()
+
+
+async def temp_database(directory, name="bench.db"):
+    """
+    Creates a fresh SQLite database under `directory`.
+    Returns (engine, session_factory).
+    """
+    from site_monitor_bot.db import create_engine_and_session, init_db
+
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{directory}/{name}")
+    await init_db(engine)
+    return engine, session_factory
@@ -0,0 +1,78 @@
+"""
+Synthetic IMDb-style datasets for the degrees benchmarks.
+
+Writes people.csv, movies.csv and stars.csv in the same layout as
+degrees/small. Casting is skewed so a few "hub" actors appear in many
+movies, which is what makes frontiers explode on the real large dataset.
+"""
+import csv
+import os
+import random
+import sys
+from itertools import accumulate
+from pathlib import Path
+
+DEGREES_DIR = Path(__file__).resolve().parent.parent / "degrees"
+
+
+def use_degrees():
+    """
+    Makes the script-style degrees modules importable from a benchmark.
+    """
+    if str(DEGREES_DIR) not in sys.path:
+        sys.path.insert(0, str(DEGREES_DIR))
+
+
+def write_dataset(directory, people=20000, movies=8000, cast_size=6, seed=0):
+    """
+    Writes a synthetic dataset into `directory` and returns its path.
+    """
+    rng = random.Random(seed)
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    person_ids = [str(100000 + i) for i in range(people)]
+    movie_ids = [str(5000000 + i) for i in range(movies)]
+    # Zipf-like weights: low ranks are hubs
+    cum_weights = list(accumulate(1.0 / (rank + 1) ** 0.8 for rank in range(people)))
+
+    with open(directory / "people.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "birth"])
+        for i, person_id in enumerate(person_ids):
+            birth = str(1920 + rng.randrange(85)) if rng.random() < 0.8 else ""
+            writer.writerow([person_id, f"Person {i % (people // 2 or 1)}", birth])
+
+    with open(directory / "movies.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "title", "year"])
+        for i, movie_id in enumerate(movie_ids):
+            writer.writerow([movie_id, f"Movie {i}", str(1930 + rng.randrange(90))])
+
+    with open(directory / "stars.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["person_id", "movie_id"])
+        for movie_id in movie_ids:
+            cast = set(rng.choices(person_ids, cum_weights=cum_weights, k=cast_size))
+            for person_id in cast:
+                writer.writerow([person_id, movie_id])
+
+    return directory
+
+
+def random_pairs(person_ids, count, seed=0):
+    """
+    Returns `count` random (source, target) pairs drawn from `person_ids`.
+    """
+    rng = random.Random(seed)
+    person_ids = sorted(person_ids)
+    return [(rng.choice(person_ids), rng.choice(person_ids)) for _ in range(count)]
+
+
+def dataset_from_argv(default_dir, **kwargs):
+    """
+    Uses the directory given on the command line, or builds a synthetic one.
+    """
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        return Path(sys.argv[1])
+    return write_dataset(default_dir, **kwargs)
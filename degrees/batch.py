@@ -0,0 +1,216 @@
+"""
+Batch queries over a loaded degrees graph.
+
+Usage: python batch.py paths [directory] [pairs] [--workers N] [--ambiguous POLICY]
+       python batch.py distances [directory] source [--targets FILE] [--cache] [--ambiguous POLICY]
+
+`pairs` is a file (or "-" / omitted for stdin) with one "source<TAB>target"
+pair per line; a comma works as the separator when there is no tab. Each
+side may be a person_id or a name; names shared by several people are
+settled by --ambiguous ("error" by default, or "most_movies"). Results
+stream to stdout as JSON lines.
+
+Pairs are grouped by source so one BFS tree answers every pair with the
+same source. With --workers, distinct sources are spread over a process
+pool; every worker memory-maps the same snapshot file, so the graph is
+shared through the page cache instead of being copied per worker.
+
+`distances` runs one full BFS from a source (see distances.py) and prints
+either a path per target or, without --targets, the distance histogram.
+"""
+import argparse
+import json
+import sys
+from multiprocessing import Pool
+
+import degrees
+import distances
+import snapshot as graph_snapshot
+
+
+def read_pairs(lines):
+    """
+    Yields (source, target) tokens from input lines, skipping blanks and
+    lines starting with '#'.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        separator = "\t" if "\t" in line else ","
+        source, _, target = line.partition(separator)
+        yield source.strip(), target.strip()
+
+
+def resolve(token, policy="error"):
+    """
+    Resolves a person_id or name to a person_id without prompting, using
+    an ambiguity policy of person_id_for_name other than "prompt".
+
+    Returns (person_id, error); exactly one of them is None.
+    """
+    if degrees.graph.person_index(token) is not None:
+        return token, None
+    try:
+        person_id = degrees.person_id_for_name(token, policy)
+    except ValueError as e:
+        return None, str(e)
+    if person_id is None:
+        return None, "not found"
+    return person_id, None
+
+
+def group_by_source(pairs, policy="error"):
+    """
+    Resolves pairs and groups them by source person_id.
+
+    Returns (groups, errors): groups maps source_id to a list of
+    (source, target, target_id) in input order; errors are finished result
+    records for pairs that could not be resolved.
+    """
+    groups = {}
+    errors = []
+    for source, target in pairs:
+        source_id, source_error = resolve(source, policy)
+        target_id, target_error = resolve(target, policy)
+        if source_error or target_error:
+            errors.append({
+                "source": source,
+                "target": target,
+                "error": f"source {source_error}" if source_error else f"target {target_error}",
+            })
+            continue
+        groups.setdefault(source_id, []).append((source, target, target_id))
+    return groups, errors
+
+
+def paths_from_source(task):
+    """
+    Answers every pair of one source group with a single BFS tree.
+    """
+    source_id, pairs = task
+    graph = degrees.graph
+    source = graph.person_index(source_id)
+    targets = {graph.person_index(target_id) for _, _, target_id in pairs}
+    parents = degrees.shortest_path_tree(source, targets, neighbors=graph.iter_neighbors)
+
+    results = []
+    for source_token, target_token, target_id in pairs:
+        path = graph.path_ids(degrees.path_from_tree(parents, graph.person_index(target_id)))
+        results.append({
+            "source": source_token,
+            "target": target_token,
+            "source_id": source_id,
+            "target_id": target_id,
+            "degrees": None if path is None else len(path),
+            "path": path,
+        })
+    return results
+
+
+def _init_worker(path):
+    degrees.graph = graph_snapshot.load(path)
+
+
+def run_paths(directory, lines, out, workers=1, policy="error"):
+    """
+    Answers all pairs read from `lines`, writing JSON lines to `out`.
+    """
+    degrees.load_data(directory, snapshot=True)
+    groups, errors = group_by_source(read_pairs(lines), policy)
+    for record in errors:
+        out.write(json.dumps(record) + "\n")
+
+    tasks = list(groups.items())
+    if workers > 1 and len(tasks) > 1:
+        path = graph_snapshot.snapshot_path(directory)
+        with Pool(workers, initializer=_init_worker, initargs=(path,)) as pool:
+            _write_results(pool.imap_unordered(paths_from_source, tasks), out)
+    else:
+        _write_results(map(paths_from_source, tasks), out)
+
+
+def _write_results(groups, out):
+    for results in groups:
+        for record in results:
+            out.write(json.dumps(record) + "\n")
+        out.flush()
+
+
+def run_distances(directory, source, out, targets=None, cache=False, policy="error"):
+    """
+    Writes distances from one source as JSON lines: a record per target
+    token, or a single histogram record when `targets` is None.
+    """
+    degrees.load_data(directory, snapshot=True)
+    graph = degrees.graph
+    source_id, error = resolve(source, policy)
+    if error:
+        out.write(json.dumps({"source": source, "error": f"source {error}"}) + "\n")
+        return
+    table = distances.table_for(directory, graph, source_id, cache=cache)
+
+    if targets is None:
+        histogram = table.histogram()
+        out.write(json.dumps({
+            "source": source,
+            "source_id": source_id,
+            "reachable": sum(histogram.values()),
+            "histogram": {str(d): histogram[d] for d in sorted(histogram)},
+        }) + "\n")
+        return
+
+    for target in targets:
+        target = target.strip()
+        if not target:
+            continue
+        target_id, error = resolve(target, policy)
+        if error:
+            record = {"target": target, "error": f"target {error}"}
+        else:
+            path = graph.path_ids(table.path(graph.person_index(target_id)))
+            record = {
+                "target": target,
+                "target_id": target_id,
+                "degrees": None if path is None else len(path),
+                "path": path,
+            }
+        out.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch degrees queries")
+    commands = parser.add_subparsers(dest="command", required=True)
+    paths = commands.add_parser("paths", help="shortest paths for (source, target) pairs as JSON lines")
+    paths.add_argument("directory", nargs="?", default="large")
+    paths.add_argument("pairs", nargs="?", default="-", help="pairs file, or - for stdin")
+    paths.add_argument("--workers", type=int, default=1, help="processes to spread distinct sources over")
+    paths.add_argument("--ambiguous", choices=("error", "most_movies"), default="error",
+                       help="how to settle names shared by several people")
+    dist = commands.add_parser("distances", help="distances from one source to everyone")
+    dist.add_argument("directory", nargs="?", default="large")
+    dist.add_argument("source", help="person_id or name")
+    dist.add_argument("--targets", help="file with one target per line, or - for stdin")
+    dist.add_argument("--cache", action="store_true", help="reuse/store the table under the data directory")
+    dist.add_argument("--ambiguous", choices=("error", "most_movies"), default="error",
+                      help="how to settle names shared by several people")
+    args = parser.parse_args()
+
+    if args.command == "paths":
+        if args.pairs == "-":
+            run_paths(args.directory, sys.stdin, sys.stdout, args.workers, args.ambiguous)
+        else:
+            with open(args.pairs, encoding="utf-8") as f:
+                run_paths(args.directory, f, sys.stdout, args.workers, args.ambiguous)
+    elif args.command == "distances":
+        if args.targets is None:
+            run_distances(args.directory, args.source, sys.stdout, cache=args.cache, policy=args.ambiguous)
+        elif args.targets == "-":
+            run_distances(args.directory, args.source, sys.stdout, sys.stdin, args.cache, args.ambiguous)
+        else:
+            with open(args.targets, encoding="utf-8") as f:
+                run_distances(args.directory, args.source, sys.stdout, f, args.cache, args.ambiguous)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
+import argparse
 import csv
 import sys
+from collections import deque
 
-from util import Node, StackFrontier, QueueFrontier
-
-# Maps names to a set of corresponding person_ids
-names = {}
+import snapshot as graph_snapshot
+from graph import CompactGraph
+from name_index import NameIndex
+from util import Node, QueueFrontier
 
 # Maps person_ids to a dictionary of: name, birth, movies (a set of movie_ids)
 people = {}
@@ -12,11 +14,39 @@ people = {}
 # Maps movie_ids to a dictionary of: title, year, stars (a set of person_ids)
 movies = {}
 
+# CompactGraph replacing the three dicts above, when loaded compact
+graph = None
+
+# NameIndex over whichever model is loaded, for non-interactive lookups
+name_index = None
+
+# Ways person_id_for_name can settle a name shared by several people
+AMBIGUITY_POLICIES = ("prompt", "most_movies", "none", "error")
 
-def load_data(directory):
+
+def load_data(directory, compact=False, snapshot=False):
     """
     Load data from CSV files into memory.
+
+    With `compact`, builds an integer-indexed CompactGraph instead of
+    filling `people` and `movies`. With `snapshot`, memory-maps the
+    directory's binary snapshot, rebuilding it if the CSVs changed.
+
+    Also builds `name_index`. Its trigram postings for fuzzy search are
+    built on the first fuzzy lookup, so exact lookups do not pay for them;
+    the query server builds them before it starts serving.
     """
+    global graph, name_index
+    if snapshot:
+        graph = graph_snapshot.load_or_build(directory)
+        name_index = NameIndex.from_graph(graph)
+        return
+    if compact:
+        graph = CompactGraph.from_csv(directory)
+        name_index = NameIndex.from_graph(graph)
+        return
+    graph = None
+
     # Load people
     with open(f"{directory}/people.csv", encoding="utf-8") as f:
         reader = csv.DictReader(f)
@@ -26,10 +56,6 @@ def load_data(directory):
                 "birth": row["birth"],
                 "movies": set()
             }
-            if row["name"].lower() not in names:
-                names[row["name"].lower()] = {row["id"]}
-            else:
-                names[row["name"].lower()].add(row["id"])
 
     # Load movies
     with open(f"{directory}/movies.csv", encoding="utf-8") as f:
@@ -51,15 +77,20 @@ def load_data(directory):
             except KeyError:
                 pass
 
+    name_index = NameIndex.from_people(people)
+
 
 def main():
-    if len(sys.argv) > 2:
-        sys.exit("Usage: python degrees.py [directory]")
-    directory = sys.argv[1] if len(sys.argv) == 2 else "large"
+    parser = argparse.ArgumentParser(usage="python degrees.py [directory] [--compact | --snapshot]")
+    parser.add_argument("directory", nargs="?", default="large")
+    storage = parser.add_mutually_exclusive_group()
+    storage.add_argument("--compact", action="store_true", help="use the integer-indexed graph")
+    storage.add_argument("--snapshot", action="store_true", help="mmap the binary snapshot, building it if stale")
+    args = parser.parse_args()
 
     # Load data from files into memory
     print("Loading data...")
-    load_data(directory)
+    load_data(args.directory, compact=args.compact, snapshot=args.snapshot)
     print("Data loaded.")
 
     source = person_id_for_name(input("Name: "))
@@ -78,19 +109,44 @@ def main():
         print(f"{degrees} degrees of separation.")
         path = [(None, source)] + path
         for i in range(degrees):
-            person1 = people[path[i][1]]["name"]
-            person2 = people[path[i + 1][1]]["name"]
-            movie = movies[path[i + 1][0]]["title"]
+            person1 = person_info(path[i][1])["name"]
+            person2 = person_info(path[i + 1][1])["name"]
+            movie = movie_info(path[i + 1][0])["title"]
             print(f"{i + 1}: {person1} and {person2} starred in {movie}")
 
 
-def shortest_path(source, target):
+def shortest_path(source, target, mode="bfs", stats=None):
     """
     Returns the shortest list of (movie_id, person_id) pairs
     that connect the source to the target.
 
     If no possible path, returns None.
+
+    `mode` selects the search: "bfs" (one-sided, from the source),
+    "early" (one-sided, goal tested on generation, flat parent map) or
+    "bidirectional" (grows frontiers from both ends). Pass a SearchStats
+    as `stats` to count expanded, scanned and generated neighbors.
     """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"unknown search mode: {mode}")
+    if graph is None:
+        return SEARCH_MODES[mode](source, target, stats, iter_neighbors)
+
+    # Search over dense indices, then map the path back to ids
+    source, target = graph.person_index(source), graph.person_index(target)
+    if source is None or target is None:
+        return None
+    return graph.path_ids(SEARCH_MODES[mode](source, target, stats, graph.iter_neighbors))
+
+
+def breadth_first_path(source, target, stats=None, neighbors=None):
+    """
+    One-sided BFS from source, testing for the goal when a node is popped.
+
+    `neighbors(person, seen, stats)` yields (movie, person) pairs for people
+    not in `seen` and defaults to iter_neighbors.
+    """
+    neighbors = neighbors or iter_neighbors
 
     # Breadth-first search (BFS)
     # Each node.state stores a person_id.
@@ -98,8 +154,8 @@ def shortest_path(source, target):
     start = Node(state=source, parent=None, action=None)  # action will hold movie_id leading to this actor
     frontier.add(start)
 
-    # Set of explored person_ids to avoid revisiting
-    explored = set()
+    # Set of person_ids explored or waiting in the frontier
+    reached = {source}
 
     while not frontier.empty():
         node = frontier.remove()
@@ -114,31 +170,197 @@ def shortest_path(source, target):
             path.reverse()
             return path
 
-        # Mark this actor as explored
-        explored.add(node.state)
+        if stats is not None:
+            stats.expanded += 1
+
+        # Add neighbors; iter_neighbors skips anyone already reached
+        for movie_id, person_id in neighbors(node.state, reached, stats):
+            if stats is not None:
+                stats.generated += 1
+            reached.add(person_id)
+            child = Node(state=person_id, parent=node, action=movie_id)
+            frontier.add(child)
+
+    # No connection found
+    return None
+
+
+def early_goal_path(source, target, stats=None, neighbors=None):
+    """
+    One-sided BFS that tests for the goal when a person is generated, not
+    when they are popped, so it stops a whole layer earlier than
+    breadth_first_path. Keeps a flat parent map (person -> (movie, parent))
+    instead of linked Node objects.
+    """
+    neighbors = neighbors or iter_neighbors
+    if source == target:
+        return []
 
-        # Add neighbors
-        for movie_id, person_id in neighbors_for_person(node.state):
-            if person_id not in explored and not frontier.contains_state(person_id):
-                child = Node(state=person_id, parent=node, action=movie_id)
-                frontier.add(child)
+    parents = {source: None}
+    queue = deque([source])
+    while queue:
+        person = queue.popleft()
+        if stats is not None:
+            stats.expanded += 1
+        for movie, neighbor in neighbors(person, parents, stats):
+            if stats is not None:
+                stats.generated += 1
+            parents[neighbor] = (movie, person)
+            if neighbor == target:
+                return path_from_tree(parents, target)
+            queue.append(neighbor)
 
     # No connection found
     return None
 
 
-def person_id_for_name(name):
+def bidirectional_path(source, target, stats=None, neighbors=None):
+    """
+    Bidirectional BFS between source and target.
+
+    Keeps a parent map per side (person_id -> (movie_id, person_id) one step
+    closer to that side's root) and always expands the smaller frontier one
+    full layer at a time. Returns the same path format as shortest_path.
+    """
+    neighbors = neighbors or iter_neighbors
+    if source == target:
+        return []
+
+    forward = {source: None}
+    backward = {target: None}
+    forward_layer = [source]
+    backward_layer = [target]
+
+    while forward_layer and backward_layer:
+        if len(forward_layer) <= len(backward_layer):
+            forward_layer, meeting = _expand_layer(forward_layer, forward, backward, stats, neighbors)
+        else:
+            backward_layer, meeting = _expand_layer(backward_layer, backward, forward, stats, neighbors)
+        if meeting is not None:
+            return _join_paths(meeting, forward, backward)
+
+    # One side ran out of people: not connected
+    return None
+
+
+def _expand_layer(layer, parents, other_parents, stats, neighbors):
+    """
+    Expands every person in `layer`, recording parents for newly seen people.
+
+    Returns the next layer and the first person already reached by the other
+    side (or None). With both sides grown layer by layer, the first meeting
+    point found is on a shortest path.
+    """
+    next_layer = []
+    for person_id in layer:
+        if stats is not None:
+            stats.expanded += 1
+        for movie_id, neighbor in neighbors(person_id, parents, stats):
+            if stats is not None:
+                stats.generated += 1
+            parents[neighbor] = (movie_id, person_id)
+            if neighbor in other_parents:
+                return next_layer, neighbor
+            next_layer.append(neighbor)
+    return next_layer, None
+
+
+def _join_paths(meeting, forward, backward):
+    """
+    Joins the two parent maps at `meeting` into a source -> target path.
+    """
+    path = []
+    person_id = meeting
+    while forward[person_id] is not None:
+        movie_id, parent = forward[person_id]
+        path.append((movie_id, person_id))
+        person_id = parent
+    path.reverse()
+
+    person_id = meeting
+    while backward[person_id] is not None:
+        movie_id, child = backward[person_id]
+        path.append((movie_id, child))
+        person_id = child
+    return path
+
+
+def shortest_path_tree(source, targets=None, stats=None, neighbors=None):
+    """
+    BFS from source that records a parent map for every person reached:
+    person -> (movie, parent), with None for the source itself.
+
+    Stops once every person in `targets` has been reached; explores the
+    whole component when `targets` is None. Use path_from_tree to read
+    shortest paths to any reached person.
+    """
+    neighbors = neighbors or iter_neighbors
+    parents = {source: None}
+    remaining = None if targets is None else set(targets) - {source}
+    layer = [source]
+    while layer and (remaining is None or remaining):
+        next_layer = []
+        for person in layer:
+            if stats is not None:
+                stats.expanded += 1
+            for movie, neighbor in neighbors(person, parents, stats):
+                if stats is not None:
+                    stats.generated += 1
+                parents[neighbor] = (movie, person)
+                next_layer.append(neighbor)
+                if remaining is not None:
+                    remaining.discard(neighbor)
+        layer = next_layer
+    return parents
+
+
+def path_from_tree(parents, target):
+    """
+    Returns the (movie, person) path to target from a shortest_path_tree
+    parent map, or None if the target was not reached.
+    """
+    if target not in parents:
+        return None
+    path = []
+    while parents[target] is not None:
+        movie, parent = parents[target]
+        path.append((movie, target))
+        target = parent
+    path.reverse()
+    return path
+
+
+SEARCH_MODES = {
+    "bfs": breadth_first_path,
+    "early": early_goal_path,
+    "bidirectional": bidirectional_path,
+}
+
+
+def person_id_for_name(name, policy="prompt"):
     """
     Returns the IMDB id for a person's name,
     resolving ambiguities as needed.
+
+    `policy` decides between people sharing the name: "prompt" asks on
+    stdin, "most_movies" picks whoever starred in the most movies, "none"
+    returns None and "error" raises ValueError listing the candidates.
     """
-    person_ids = list(names.get(name.lower(), set()))
+    if policy not in AMBIGUITY_POLICIES:
+        raise ValueError(f"unknown ambiguity policy: {policy}")
+    person_ids = name_index.exact(name)
     if len(person_ids) == 0:
         return None
+    elif len(person_ids) > 1 and policy == "most_movies":
+        return max(person_ids, key=lambda person_id: (name_index.movie_count(person_id), person_id))
+    elif len(person_ids) > 1 and policy == "none":
+        return None
+    elif len(person_ids) > 1 and policy == "error":
+        raise ValueError(f"ambiguous name '{name}': {', '.join(sorted(person_ids))}")
     elif len(person_ids) > 1:
         print(f"Which '{name}'?")
         for person_id in person_ids:
-            person = people[person_id]
+            person = person_info(person_id)
             name = person["name"]
             birth = person["birth"]
             print(f"ID: {person_id}, Name: {name}, Birth: {birth}")
@@ -153,11 +375,67 @@ def person_id_for_name(name):
         return person_ids[0]
 
 
+def person_info(person_id):
+    """
+    Returns a dict with the person's name and birth.
+    """
+    if graph is not None:
+        return graph.person(person_id)
+    return people[person_id]
+
+
+def movie_info(movie_id):
+    """
+    Returns a dict with the movie's title and year.
+    """
+    if graph is not None:
+        return graph.movie(movie_id)
+    return movies[movie_id]
+
+
+def iter_neighbors(person_id, seen=(), stats=None):
+    """
+    Lazily yields (movie_id, person_id) pairs for people who starred with
+    a given person, skipping the person themself and anyone in `seen`.
+
+    `seen` is checked as each co-star comes up, so people a caller adds to
+    it mid-iteration are skipped too. With `stats`, counts every co-star
+    entry looked at in stats.scanned.
+    """
+    if graph is not None:
+        movie_ids, person_ids = graph.movie_ids, graph.person_ids
+        seen_index = _IndexView(seen)
+        for movie, person in graph.iter_neighbors(graph.person_index(person_id), seen_index, stats):
+            yield movie_ids[movie], person_ids[person]
+        return
+    for movie_id in people[person_id]["movies"]:
+        stars = movies[movie_id]["stars"]
+        if stats is not None:
+            stats.scanned += len(stars)
+        for star_id in stars:
+            if star_id != person_id and star_id not in seen:
+                yield movie_id, star_id
+
+
+class _IndexView():
+    """
+    Membership in a set of person_ids, tested with graph indices.
+    """
+
+    def __init__(self, seen):
+        self.seen = seen
+
+    def __contains__(self, person):
+        return graph.person_ids[person] in self.seen
+
+
 def neighbors_for_person(person_id):
     """
     Returns (movie_id, person_id) pairs for people
     who starred with a given person.
     """
+    if graph is not None:
+        return graph.neighbors_for_person(person_id)
     movie_ids = people[person_id]["movies"]
     neighbors = set()
     for movie_id in movie_ids:
@@ -0,0 +1,161 @@
+"""
+Single-source distance tables ("Bacon numbers") over a CompactGraph.
+
+One full BFS from a source fills three flat arrays indexed by person:
+distance (-1 when unreachable), and the parent person and movie one step
+closer to the source. Any target's path is then read back in O(path
+length). Tables can be cached on disk per source, keyed to the data the
+snapshot was built from, so repeated queries skip the traversal.
+"""
+import os
+import struct
+from array import array
+from collections import Counter
+
+import snapshot as graph_snapshot
+
+MAGIC = b"DEGDIST\0"
+VERSION = 1
+CACHE_DIR = "distances"
+
+_HEADER = struct.Struct("<8sIiI")
+
+
+class DistanceTable():
+    def __init__(self, source, distance, parent_person, parent_movie):
+        self.source = source
+        self.distance = distance
+        self.parent_person = parent_person
+        self.parent_movie = parent_movie
+
+    def degrees(self, target):
+        """
+        Returns the number of degrees from the source to target, or None.
+        """
+        d = self.distance[target]
+        return None if d < 0 else d
+
+    def path(self, target):
+        """
+        Returns the (movie, person) index path from the source to target,
+        or None if target is unreachable.
+        """
+        if self.distance[target] < 0:
+            return None
+        path = []
+        while target != self.source:
+            path.append((self.parent_movie[target], target))
+            target = self.parent_person[target]
+        path.reverse()
+        return path
+
+    def histogram(self):
+        """
+        Returns a Counter of degrees -> number of people at that distance.
+        """
+        return Counter(d for d in self.distance if d >= 0)
+
+
+def build(graph, source):
+    """
+    Runs a full BFS from the person index `source` and returns its table.
+    """
+    count = len(graph.person_ids)
+    distance = array("i", [-1]) * count
+    parent_person = array("i", [-1]) * count
+    parent_movie = array("i", [-1]) * count
+
+    person_offsets = graph.person_offsets
+    person_movies = graph.person_movies
+    movie_offsets = graph.movie_offsets
+    movie_stars = graph.movie_stars
+
+    # The queue is a flat array read with a moving head
+    queue = array("i", [source])
+    distance[source] = 0
+    head = 0
+    while head < len(queue):
+        person = queue[head]
+        head += 1
+        next_distance = distance[person] + 1
+        for i in range(person_offsets[person], person_offsets[person + 1]):
+            movie = person_movies[i]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                neighbor = movie_stars[j]
+                if distance[neighbor] < 0:
+                    distance[neighbor] = next_distance
+                    parent_person[neighbor] = person
+                    parent_movie[neighbor] = movie
+                    queue.append(neighbor)
+    return DistanceTable(source, distance, parent_person, parent_movie)
+
+
+def fingerprint(directory):
+    """
+    Identifies the graph a cached table was computed from: a hash of the
+    CSV digests in the snapshot's table of contents, which changes only when
+    the data does.
+    """
+    return graph_snapshot.content_key(graph_snapshot.snapshot_path(directory))
+
+
+def cache_path(directory, source_id):
+    return os.path.join(directory, CACHE_DIR, f"{source_id}.dist")
+
+
+def save(table, path, graph_fingerprint):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    key = graph_fingerprint.encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, table.source, len(key)))
+        f.write(key)
+        table.distance.tofile(f)
+        table.parent_person.tofile(f)
+        table.parent_movie.tofile(f)
+    os.replace(tmp_path, path)
+
+
+def load(path, graph_fingerprint, count):
+    """
+    Loads a cached table for a graph of `count` people, or returns None if
+    the file is missing or was computed from a different graph.
+    """
+    try:
+        with open(path, "rb") as f:
+            magic, version, source, key_length = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            if f.read(key_length).decode("utf-8") != graph_fingerprint:
+                return None
+            arrays = []
+            for _ in range(3):
+                values = array("i")
+                values.fromfile(f, count)
+                arrays.append(values)
+    except (OSError, EOFError, struct.error, UnicodeDecodeError):
+        return None
+    return DistanceTable(source, *arrays)
+
+
+def table_for(directory, graph, source_id, cache=False):
+    """
+    Returns the distance table for person_id `source_id`.
+
+    With `cache`, reuses a table stored under the data directory when it
+    matches the current snapshot, and stores a freshly built one otherwise.
+    `graph` must be the snapshot graph for `directory` when caching.
+    """
+    source = graph.person_index(source_id)
+    if source is None:
+        raise KeyError(source_id)
+    if not cache:
+        return build(graph, source)
+
+    path = cache_path(directory, source_id)
+    key = fingerprint(directory)
+    table = load(path, key, len(graph.person_ids))
+    if table is None:
+        table = build(graph, source)
+        save(table, path, key)
+    return table
@@ -0,0 +1,205 @@
+import csv
+from array import array
+from bisect import bisect_left
+
+
+class CompactGraph():
+    """
+    Integer-indexed movie/star graph.
+
+    People and movies are interned to dense ints (their position in the
+    id-sorted tables), and adjacency is stored CSR-style: for person `p`,
+    `person_movies[person_offsets[p]:person_offsets[p + 1]]` are the indices
+    of their movies, and likewise `movie_stars` / `movie_offsets` for movies.
+    """
+
+    def __init__(self, person_ids, person_names, person_births,
+                 movie_ids, movie_titles, movie_years,
+                 person_offsets, person_movies, movie_offsets, movie_stars,
+                 name_order):
+        self.person_ids = person_ids
+        self.person_names = person_names
+        self.person_births = person_births
+        self.movie_ids = movie_ids
+        self.movie_titles = movie_titles
+        self.movie_years = movie_years
+        self.person_offsets = person_offsets
+        self.person_movies = person_movies
+        self.movie_offsets = movie_offsets
+        self.movie_stars = movie_stars
+        # Person indices ordered by lowercase name, for name lookups
+        self.name_order = name_order
+        # mmap backing the buffers when loaded from a snapshot
+        self.snapshot = None
+
+    @classmethod
+    def from_csv(cls, directory):
+        """
+        Builds a graph from people.csv, movies.csv and stars.csv.
+        """
+        with open(f"{directory}/people.csv", encoding="utf-8") as f:
+            people = [(row["id"], row["name"], row["birth"]) for row in csv.DictReader(f)]
+        with open(f"{directory}/movies.csv", encoding="utf-8") as f:
+            movies = [(row["id"], row["title"], row["year"]) for row in csv.DictReader(f)]
+        people.sort()
+        movies.sort()
+        person_index = {row[0]: i for i, row in enumerate(people)}
+        movie_index = {row[0]: i for i, row in enumerate(movies)}
+
+        # Deduplicated (person, movie) edges, as the dict model keeps sets
+        edges = set()
+        with open(f"{directory}/stars.csv", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    edges.add((person_index[row["person_id"]], movie_index[row["movie_id"]]))
+                except KeyError:
+                    pass
+
+        person_offsets, person_movies = _csr(len(people), sorted(edges))
+        movie_offsets, movie_stars = _csr(len(movies), sorted((m, p) for p, m in edges))
+
+        person_names = [row[1] for row in people]
+        name_order = array("i", sorted(range(len(people)), key=lambda i: person_names[i].lower()))
+
+        return cls(
+            person_ids=[row[0] for row in people],
+            person_names=person_names,
+            person_births=[row[2] for row in people],
+            movie_ids=[row[0] for row in movies],
+            movie_titles=[row[1] for row in movies],
+            movie_years=[row[2] for row in movies],
+            person_offsets=person_offsets,
+            person_movies=person_movies,
+            movie_offsets=movie_offsets,
+            movie_stars=movie_stars,
+            name_order=name_order,
+        )
+
+    def person_index(self, person_id):
+        """
+        Returns the dense index for a person_id, or None if unknown.
+        """
+        return _find(self.person_ids, person_id)
+
+    def movie_index(self, movie_id):
+        """
+        Returns the dense index for a movie_id, or None if unknown.
+        """
+        return _find(self.movie_ids, movie_id)
+
+    def neighbors(self, person):
+        """
+        Yields (movie, person) index pairs for people who starred with
+        `person`, including `person` themself, like neighbors_for_person.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for i in range(person_offsets[person], person_offsets[person + 1]):
+            movie = person_movies[i]
+            for j in range(movie_offsets[movie], movie_offsets[movie + 1]):
+                yield movie, movie_stars[j]
+
+    def iter_neighbors(self, person, seen=(), stats=None):
+        """
+        Yields (movie, person) index pairs for co-stars of `person`, skipping
+        `person` themself and anyone in `seen` before a pair is built.
+        With `stats`, counts every co-star entry looked at in stats.scanned.
+        """
+        person_offsets = self.person_offsets
+        person_movies = self.person_movies
+        movie_offsets = self.movie_offsets
+        movie_stars = self.movie_stars
+        for i in range(person_offsets[person], person_offsets[person + 1]):
+            movie = person_movies[i]
+            start, end = movie_offsets[movie], movie_offsets[movie + 1]
+            if stats is not None:
+                stats.scanned += end - start
+            for j in range(start, end):
+                star = movie_stars[j]
+                if star != person and star not in seen:
+                    yield movie, star
+
+    def neighbors_for_person(self, person_id):
+        """
+        Returns (movie_id, person_id) pairs, matching the dict model.
+        """
+        return {
+            (self.movie_ids[movie], self.person_ids[person])
+            for movie, person in self.neighbors(self.person_index(person_id))
+        }
+
+    def path_ids(self, path):
+        """
+        Converts a path of (movie, person) indices back to string ids.
+        """
+        if path is None:
+            return None
+        return [(self.movie_ids[movie], self.person_ids[person]) for movie, person in path]
+
+    def person_ids_for_name(self, name):
+        """
+        Returns the person_ids whose name matches `name`, case-insensitively.
+        """
+        keys = NameKeys(self)
+        key = name.lower()
+        i = bisect_left(keys, key)
+        person_ids = []
+        while i < len(keys) and keys[i] == key:
+            person_ids.append(self.person_ids[self.name_order[i]])
+            i += 1
+        return person_ids
+
+    def person(self, person_id):
+        """
+        Returns the name and birth of a person as a dict, or None.
+        """
+        i = self.person_index(person_id)
+        if i is None:
+            return None
+        return {"name": self.person_names[i], "birth": self.person_births[i]}
+
+    def movie(self, movie_id):
+        """
+        Returns the title and year of a movie as a dict, or None.
+        """
+        i = self.movie_index(movie_id)
+        if i is None:
+            return None
+        return {"title": self.movie_titles[i], "year": self.movie_years[i]}
+
+
+class NameKeys():
+    """
+    Lowercase names in name_order, as a sequence bisect can search.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.name_order)
+
+    def __getitem__(self, i):
+        return self.graph.person_names[self.graph.name_order[i]].lower()
+
+
+def _find(sorted_ids, item_id):
+    i = bisect_left(sorted_ids, item_id)
+    if i < len(sorted_ids) and sorted_ids[i] == item_id:
+        return i
+    return None
+
+
+def _csr(count, pairs):
+    """
+    Builds (offsets, indices) arrays from (row, column) pairs sorted by row.
+    """
+    offsets = array("i", bytes(4 * (count + 1)))
+    indices = array("i", (column for _, column in pairs))
+    for row, _ in pairs:
+        offsets[row + 1] += 1
+    for row in range(count):
+        offsets[row + 1] += offsets[row]
+    return offsets, indices
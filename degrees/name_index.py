@@ -0,0 +1,239 @@
+"""
+Name index for non-interactive person lookups.
+
+Names are kept as a sorted sequence of lowercase keys (one per person),
+so exact and prefix lookups are a binary search. Fuzzy search uses a
+positional trigram index over the distinct keys, ranked by trigram
+similarity. Candidates come back ranked with their birth year and movie
+count.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+
+from graph import NameKeys
+
+# Fuzzy candidates come from the query's rarest trigrams only. A typo
+# breaks at most three trigrams, and a broken one is rarely found at that
+# position in a name, so it has no posting and is not picked.
+CANDIDATE_TRIGRAMS = 3
+# A typo shifts the trigrams after it by one position and changes the
+# name's trigram count by about one; postings are looked up that far off
+SLACK = 1
+# Names scored per fuzzy lookup, at least; twice the limit above that
+SCORED = 20
+
+
+class NameIndex():
+    def __init__(self, keys, person_ids, movie_count, person_info):
+        """
+        `keys` is a sorted sequence of lowercase names and `person_ids` the
+        matching person_ids. `movie_count` and `person_info` map a
+        person_id to its number of movies and to a dict with name and birth.
+        """
+        self.keys = keys
+        self.person_ids = person_ids
+        self.movie_count = movie_count
+        self.person_info = person_info
+        self.trigrams = None
+        self.starts = None
+        self.sizes = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_people(cls, people):
+        """
+        Builds an index over the dict model's `people`.
+        """
+        entries = sorted((person["name"].lower(), person_id) for person_id, person in people.items())
+        return cls(
+            keys=[key for key, _ in entries],
+            person_ids=[person_id for _, person_id in entries],
+            movie_count=lambda person_id: len(people[person_id]["movies"]),
+            person_info=lambda person_id: people[person_id],
+        )
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds an index over a CompactGraph, reusing its name_order.
+        """
+        def movie_count(person_id):
+            i = graph.person_index(person_id)
+            return graph.person_offsets[i + 1] - graph.person_offsets[i]
+
+        return cls(
+            keys=NameKeys(graph),
+            person_ids=_GraphIds(graph),
+            movie_count=movie_count,
+            person_info=graph.person,
+        )
+
+    def exact(self, name):
+        """
+        Returns the person_ids whose name equals `name`, case-insensitively.
+        """
+        key = name.lower()
+        i = bisect_left(self.keys, key)
+        person_ids = []
+        while i < len(self.keys) and self.keys[i] == key:
+            person_ids.append(self.person_ids[i])
+            i += 1
+        return person_ids
+
+    def prefix(self, prefix, limit=10):
+        """
+        Returns up to `limit` person_ids whose name starts with `prefix`.
+        """
+        key = prefix.lower()
+        i = bisect_left(self.keys, key)
+        person_ids = []
+        while i < len(self.keys) and len(person_ids) < limit and self.keys[i].startswith(key):
+            person_ids.append(self.person_ids[i])
+            i += 1
+        return person_ids
+
+    def fuzzy(self, query, limit=10):
+        """
+        Returns up to `limit` (score, person_id) pairs for names sharing
+        trigrams with `query`, best first. Scores are Jaccard similarity.
+
+        Only names of about the query's length that have its rarest
+        trigrams at about the same positions are scored: first those with
+        all of them, then those missing one.
+        """
+        self.build_trigrams()
+        key = query.lower()
+        grams = _trigrams(key)
+        padded = _padded(key)
+        counts = range(len(grams) - SLACK, len(grams) + SLACK + 1)
+        postings = []
+        for i in range(len(padded) - 2):
+            gram = padded[i:i + 3]
+            found = [
+                posting
+                for position in range(i - SLACK, i + SLACK + 1)
+                for count in counts
+                if (posting := self.trigrams.get((gram, position, count))) is not None
+            ]
+            if found:
+                postings.append((sum(map(len, found)), found))
+        postings.sort(key=lambda item: item[0])
+
+        sets = []
+        for _, found in postings[:CANDIDATE_TRIGRAMS]:
+            distincts = set()
+            for posting in found:
+                distincts.update(posting)
+            sets.append(distincts)
+        wanted = max(limit * 2, SCORED)
+        candidates = list(set.intersection(*sets)) if sets else []
+        if len(candidates) < wanted and len(sets) > 1:
+            missing_one = set().union(*(set.intersection(*sets[:i], *sets[i + 1:]) for i in range(len(sets))))
+            candidates += list(missing_one.difference(candidates))[:wanted - len(candidates)]
+
+        scored = []
+        for distinct in candidates[:wanted]:
+            # Every trigram of a name is a substring of its padded key
+            padded_key = _padded(self.keys[self.starts[distinct]])
+            shared = sum(gram in padded_key for gram in grams)
+            scored.append((shared / (len(grams) + self.sizes[distinct] - shared), distinct))
+        scored.sort(key=lambda item: -item[0])
+
+        results = []
+        for score, distinct in scored:
+            for i in range(self.starts[distinct], self.starts[distinct + 1]):
+                results.append((score, self.person_ids[i]))
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    def search(self, query, limit=10):
+        """
+        Returns ranked candidates for `query`: exact matches, then prefix
+        matches, then fuzzy matches; ties go to people with more movies.
+        Each candidate is a dict with person_id, name, birth, movies,
+        match and score.
+        """
+        found = {}
+        for person_id in self.exact(query):
+            found[person_id] = ("exact", 1.0)
+        for person_id in self.prefix(query, limit):
+            found.setdefault(person_id, ("prefix", 1.0))
+        if len(found) < limit:
+            for score, person_id in self.fuzzy(query, limit):
+                found.setdefault(person_id, ("fuzzy", score))
+
+        rank = {"exact": 0, "prefix": 1, "fuzzy": 2}
+        candidates = [self.candidate(person_id, match, score) for person_id, (match, score) in found.items()]
+        candidates.sort(key=lambda c: (rank[c["match"]], -c["score"], -c["movies"]))
+        return candidates[:limit]
+
+    def candidate(self, person_id, match=None, score=None):
+        info = self.person_info(person_id)
+        return {
+            "person_id": person_id,
+            "name": info["name"],
+            "birth": info["birth"],
+            "movies": self.movie_count(person_id),
+            "match": match,
+            "score": score,
+        }
+
+    def build_trigrams(self):
+        """
+        Builds the trigram postings over distinct names, once. Postings
+        are keyed by trigram, its position in the padded name and the
+        name's number of distinct trigrams.
+        """
+        with self.lock:
+            if self.trigrams is not None:
+                return
+            starts = array("i")
+            sizes = array("H")
+            postings = {}
+            previous = None
+            for i in range(len(self.keys)):
+                key = self.keys[i]
+                if key == previous:
+                    continue
+                previous = key
+                distinct = len(starts)
+                starts.append(i)
+                padded = _padded(key)
+                count = len(_trigrams(key))
+                sizes.append(min(count, 0xFFFF))
+                for position in range(len(padded) - 2):
+                    posting_key = (padded[position:position + 3], position, count)
+                    posting = postings.get(posting_key)
+                    if posting is None:
+                        posting = postings[posting_key] = array("i")
+                    posting.append(distinct)
+            starts.append(len(self.keys))
+            self.starts = starts
+            self.sizes = sizes
+            self.trigrams = postings
+
+
+class _GraphIds():
+    """
+    person_ids in name_order, parallel to NameKeys.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __len__(self):
+        return len(self.graph.name_order)
+
+    def __getitem__(self, i):
+        return self.graph.person_ids[self.graph.name_order[i]]
+
+
+def _padded(key):
+    return f"  {key} "
+
+
+def _trigrams(key):
+    padded = _padded(key)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
@@ -0,0 +1,205 @@
+"""
+Long-running HTTP query server for degrees.
+
+Loads the graph once and answers requests from a thread per connection:
+
+    GET /path?source=...&target=...[&mode=bidirectional][&ambiguous=error]
+    GET /resolve?name=...[&limit=10]
+    GET /stats
+
+`source` and `target` may be person_ids or names; `ambiguous` is
+"error" or "most_movies". /resolve returns ranked exact, prefix and fuzzy
+candidates from the name index. Path results are kept in an LRU cache
+keyed by (source_id, target_id, mode); /stats reports its hit and miss
+counters.
+
+Usage: python server.py [directory] [--host HOST] [--port PORT]
+                        [--cache-size N] [--compact]
+"""
+import argparse
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import degrees
+from batch import resolve
+
+
+class LRUCache():
+    """
+    Thread-safe least-recently-used cache with hit/miss counters.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """
+        Returns (found, value) and records a hit or a miss.
+        """
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return True, self.items[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def find_path(cache, source_id, target_id, mode):
+    key = (source_id, target_id, mode)
+    found, path = cache.get(key)
+    if not found:
+        path = degrees.shortest_path(source_id, target_id, mode=mode)
+        cache.put(key, path)
+    return path
+
+
+def describe_path(source_id, path):
+    """
+    Adds names and titles to a (movie_id, person_id) path.
+    """
+    steps = []
+    previous = source_id
+    for movie_id, person_id in path:
+        steps.append({
+            "movie_id": movie_id,
+            "title": degrees.movie_info(movie_id)["title"],
+            "from_id": previous,
+            "from": degrees.person_info(previous)["name"],
+            "to_id": person_id,
+            "to": degrees.person_info(person_id)["name"],
+        })
+        previous = person_id
+    return steps
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        routes = {"/path": self.handle_path, "/resolve": self.handle_resolve, "/stats": self.handle_stats}
+        route = routes.get(url.path)
+        if route is None:
+            self.send_json(404, {"error": "not found"})
+            return
+        try:
+            route(params)
+        except KeyError as e:
+            self.send_json(400, {"error": f"missing parameter: {e.args[0]}"})
+        except ValueError as e:
+            self.send_json(400, {"error": str(e)})
+
+    def handle_path(self, params):
+        source, target = params["source"], params["target"]
+        mode = params.get("mode", "bidirectional")
+        if mode not in degrees.SEARCH_MODES:
+            raise ValueError(f"unknown search mode: {mode}")
+        policy = params.get("ambiguous", "error")
+        if policy not in ("error", "most_movies"):
+            raise ValueError(f"unknown ambiguity policy: {policy}")
+        source_id, error = resolve(source, policy)
+        if error:
+            self.send_json(404, {"error": f"source {error}"})
+            return
+        target_id, error = resolve(target, policy)
+        if error:
+            self.send_json(404, {"error": f"target {error}"})
+            return
+
+        path = find_path(self.server.cache, source_id, target_id, mode)
+        self.send_json(200, {
+            "source_id": source_id,
+            "target_id": target_id,
+            "degrees": None if path is None else len(path),
+            "path": None if path is None else describe_path(source_id, path),
+        })
+
+    def handle_resolve(self, params):
+        name = params["name"]
+        limit = int(params.get("limit", 10))
+        candidates = degrees.name_index.search(name, limit)
+        if degrees.graph.person_index(name) is not None:
+            candidates.insert(0, degrees.name_index.candidate(name, "id", 1.0))
+        self.send_json(200, {"name": name, "candidates": candidates[:limit]})
+
+    def handle_stats(self, params):
+        self.send_json(200, {"cache": self.server.cache.stats()})
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(directory, host="127.0.0.1", port=8000, cache_size=4096, compact=False, verbose=False):
+    """
+    Loads the graph for `directory` and the fuzzy name postings and
+    returns a server ready to serve_forever(). Uses the mmap snapshot
+    unless `compact` is set.
+    """
+    degrees.load_data(directory, compact=compact, snapshot=not compact)
+    # Before serving: built on the first fuzzy lookup instead, it would hold
+    # up every /resolve for as long as the build takes
+    degrees.name_index.build_trigrams()
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.cache = LRUCache(cache_size)
+    server.verbose = verbose
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve degrees queries over HTTP")
+    parser.add_argument("directory", nargs="?", default="large")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-size", type=int, default=4096, help="path results kept in the LRU cache")
+    parser.add_argument("--compact", action="store_true", help="build the graph in memory instead of using the snapshot")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    print("Loading data...")
+    server = make_server(args.directory, args.host, args.port, args.cache_size, args.compact, args.verbose)
+    print(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
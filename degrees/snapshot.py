@@ -0,0 +1,248 @@
+"""
+Binary snapshots of a CompactGraph.
+
+A snapshot is a single file: a fixed header (magic, format version, length
+of a JSON table of contents), the table of contents, then 8-byte aligned
+sections. Int sections are raw array('i') bytes; string tables are an
+array('q') of offsets followed by a UTF-8 blob. Loading mmaps the file and
+casts the sections in place, so nothing is parsed up front.
+
+Usage: python snapshot.py [directory]
+"""
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+from array import array
+
+from graph import CompactGraph
+
+MAGIC = b"DEGSNAP\0"
+VERSION = 1
+SNAPSHOT_NAME = "graph.snapshot"
+SOURCES = ("people.csv", "movies.csv", "stars.csv")
+
+_HEADER = struct.Struct("<8sII")
+_INT_SECTIONS = ("person_offsets", "person_movies", "movie_offsets", "movie_stars", "name_order")
+_STRING_SECTIONS = ("person_ids", "person_names", "person_births", "movie_ids", "movie_titles", "movie_years")
+
+
+class StringTable():
+    """
+    Read-only sequence of strings decoded on access from a snapshot blob.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("string table index out of range")
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+def snapshot_path(directory):
+    return os.path.join(directory, SNAPSHOT_NAME)
+
+
+def build(directory, path=None):
+    """
+    Compiles the CSVs in `directory` into a snapshot file and returns its path.
+    """
+    path = path or snapshot_path(directory)
+    sources = source_state(directory, with_hash=True)
+    graph = CompactGraph.from_csv(directory)
+
+    sections = []
+    for name in _INT_SECTIONS:
+        sections.append((name, "i", _as_array("i", getattr(graph, name)).tobytes()))
+    for name in _STRING_SECTIONS:
+        offsets, blob = _encode_strings(getattr(graph, name))
+        sections.append((name + ".offsets", "q", offsets.tobytes()))
+        sections.append((name + ".blob", "B", blob))
+
+    toc = {"sources": sources, "sections": []}
+    position = 0
+    for name, typecode, data in sections:
+        toc["sections"].append({"name": name, "type": typecode, "offset": position, "size": len(data)})
+        position += _aligned(len(data))
+    toc_bytes = json.dumps(toc).encode("utf-8")
+    data_start = _aligned(_HEADER.size + len(toc_bytes))
+
+    # Write to a temp file and rename, so readers never see a partial file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(toc_bytes)))
+        f.write(toc_bytes)
+        f.write(bytes(data_start - _HEADER.size - len(toc_bytes)))
+        for _, _, data in sections:
+            f.write(data)
+            f.write(bytes(_aligned(len(data)) - len(data)))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load(path):
+    """
+    Memory-maps a snapshot and returns a CompactGraph backed by it.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    toc = _read_toc(mm)
+    data_start = _aligned(_HEADER.size + _toc_length(mm))
+    buffer = memoryview(mm)
+
+    views = {}
+    for section in toc["sections"]:
+        start = data_start + section["offset"]
+        views[section["name"]] = buffer[start:start + section["size"]].cast(section["type"])
+
+    fields = {name: views[name] for name in _INT_SECTIONS}
+    for name in _STRING_SECTIONS:
+        fields[name] = StringTable(views[name + ".offsets"], views[name + ".blob"])
+    graph = CompactGraph(**fields)
+    graph.snapshot = mm
+    return graph
+
+
+def is_fresh(directory, path=None):
+    """
+    Checks whether the snapshot still matches the CSVs in `directory`.
+
+    Size or format mismatches are stale. When only the mtime differs, the
+    file hash decides, so touching a CSV does not force a rebuild; the new
+    mtimes are then written back so the next check skips the hash.
+    """
+    path = path or snapshot_path(directory)
+    try:
+        toc, toc_length = _read_toc_file(path)
+    except (OSError, ValueError, struct.error):
+        return False
+
+    stored = toc["sources"]
+    current = source_state(directory)
+    touched = False
+    for name in SOURCES:
+        if current[name]["size"] != stored[name]["size"]:
+            return False
+        if current[name]["mtime_ns"] != stored[name]["mtime_ns"]:
+            if _file_hash(os.path.join(directory, name)) != stored[name]["sha256"]:
+                return False
+            stored[name]["mtime_ns"] = current[name]["mtime_ns"]
+            touched = True
+    if touched:
+        _rewrite_toc(path, toc, toc_length)
+    return True
+
+
+def content_key(path):
+    """
+    Identifies the graph in a snapshot by the digests of the CSVs it was
+    built from, so it stays the same when only the mtimes are rewritten or
+    the snapshot is rebuilt from unchanged data.
+    """
+    toc, _ = _read_toc_file(path)
+    digests = ":".join(toc["sources"][name]["sha256"] for name in SOURCES)
+    return f"{VERSION}:{hashlib.sha256(digests.encode('utf-8')).hexdigest()}"
+
+
+def _rewrite_toc(path, toc, toc_length):
+    # Into a copy that then replaces the snapshot, as build does: graphs
+    # still mapping the old file keep reading it unchanged. The sections
+    # are copied as they are after the new table of contents.
+    toc_bytes = json.dumps(toc).encode("utf-8")
+    data_start = _aligned(_HEADER.size + len(toc_bytes))
+    tmp_path = path + ".tmp"
+    try:
+        with open(path, "rb") as src, open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(toc_bytes)))
+            f.write(toc_bytes)
+            f.write(bytes(data_start - _HEADER.size - len(toc_bytes)))
+            src.seek(_aligned(_HEADER.size + toc_length))
+            shutil.copyfileobj(src, f, 1 << 20)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_or_build(directory, path=None):
+    """
+    Loads the snapshot for `directory`, rebuilding it first if stale.
+    """
+    path = path or snapshot_path(directory)
+    if not is_fresh(directory, path):
+        build(directory, path)
+    return load(path)
+
+
+def source_state(directory, with_hash=False):
+    state = {}
+    for name in SOURCES:
+        file_path = os.path.join(directory, name)
+        stat = os.stat(file_path)
+        state[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if with_hash:
+            state[name]["sha256"] = _file_hash(file_path)
+    return state
+
+
+def _file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_toc_file(path):
+    with open(path, "rb") as f:
+        magic, version, toc_length = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} degrees snapshot: {path}")
+        return json.loads(f.read(toc_length)), toc_length
+
+
+def _read_toc(mm):
+    magic, version, toc_length = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError("not a degrees snapshot")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version: {version}")
+    return json.loads(mm[_HEADER.size:_HEADER.size + toc_length])
+
+
+def _toc_length(mm):
+    return _HEADER.unpack_from(mm, 0)[2]
+
+
+def _encode_strings(strings):
+    offsets = array("q", [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def _as_array(typecode, values):
+    return values if isinstance(values, array) else array(typecode, values)
+
+
+def _aligned(size):
+    return (size + 7) & ~7
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python snapshot.py [directory]")
+    print(f"Wrote {build(sys.argv[1] if len(sys.argv) == 2 else 'large')}")
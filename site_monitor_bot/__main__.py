@@ -1,6 +1,9 @@
 import asyncio
+import sys
+
 from .main import run
 
 
 if __name__ == "__main__":
-    asyncio.run(run())
+    # Optional role argument: all (default), bot or worker
+    asyncio.run(run(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+from typing import Callable
+
 from aiogram import Bot, Dispatcher
 from aiogram.filters import Command
 from aiogram.types import Message
@@ -12,6 +15,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from .repository import UserRepository, SiteRepository, CheckRecordRepository
+from .cache import ViewCache
+from .utils import as_utc
 
 
 def format_site_line(site) -> str:
@@ -24,7 +29,34 @@ def format_site_line(site) -> str:
     return " | ".join(parts)
 
 
-def register_handlers(dp: Dispatcher, session_factory):
+def encode_cursor(record) -> str:
+    # Position after `record` in a newest-first history, for /history paging
+    return f"{as_utc(record.checked_at):%Y%m%d%H%M%S%f}-{record.id}"
+
+
+def decode_cursor(token: str) -> tuple[datetime, int]:
+    stamp, record_id = token.split("-")
+    return datetime.strptime(stamp, "%Y%m%d%H%M%S%f").replace(tzinfo=timezone.utc), int(record_id)
+
+
+def register_handlers(
+    dp: Dispatcher,
+    session_factory,
+    cache: ViewCache | None = None,
+    on_site_removed: Callable[[int], None] | None = None,
+    on_chat_stored: Callable[[int, int], None] | None = None,
+):
+    async def load_sites(user_id: int):
+        async with session_factory() as session:  # type: AsyncSession
+            return await SiteRepository(session).list_sites_by_user(user_id)
+
+    async def load_history(user_id: int, site_id: int, limit: int, before: tuple[datetime, int] | None = None):
+        async with session_factory() as session:  # type: AsyncSession
+            site = await SiteRepository(session).get_site(site_id, user_id=user_id)
+            if not site:
+                return None, []
+            return site, await CheckRecordRepository(session).list_page(site_id, limit, before)
+
     @dp.message(Command("start"))
     async def on_start(message: Message, bot: Bot):
         async with session_factory() as session:  # type: AsyncSession
@@ -33,6 +65,8 @@ def register_handlers(dp: Dispatcher, session_factory):
                 chat_id=message.chat.id,
             )
             await session.commit()
+        if on_chat_stored is not None:
+            on_chat_stored(message.from_user.id, message.chat.id)
         text = (
             "Привет! Я бот для мониторинга сайтов.\n\n"
             "Команды:\n"
@@ -40,7 +74,7 @@ def register_handlers(dp: Dispatcher, session_factory):
             "/list – список сайтов\n"
             "/remove <id> – удалить сайт\n"
             "/setinterval <id> <sec> – интервал\n"
-            "/history <id> [limit] – последние проверки\n"
+            "/history <id> [limit] [cursor] – последние проверки\n"
         )
         await message.answer(text)
 
@@ -62,12 +96,19 @@ def register_handlers(dp: Dispatcher, session_factory):
             user = await user_repo.upsert_user(message.from_user.id, message.chat.id)
             site = await site_repo.add_site(user.telegram_user_id, url, interval)
             await session.commit()
+        if on_chat_stored is not None:
+            on_chat_stored(message.from_user.id, message.chat.id)
+        if cache is not None:
+            cache.invalidate_user(message.from_user.id, site.id)
         await message.reply(f"Добавлен сайт [{site.id}]: {site.url} с интервалом {interval}s")
 
     @dp.message(Command("list"))
     async def on_list(message: Message):
-        async with session_factory() as session:  # type: AsyncSession
-            sites = await SiteRepository(session).list_sites_by_user(message.from_user.id)
+        user_id = message.from_user.id
+        if cache is not None:
+            sites = await cache.user_sites(user_id, lambda: load_sites(user_id))
+        else:
+            sites = await load_sites(user_id)
         if not sites:
             await message.reply("У вас нет сайтов. Добавьте через /add <url> [interval_s]")
             return
@@ -88,6 +129,10 @@ def register_handlers(dp: Dispatcher, session_factory):
         async with session_factory() as session:  # type: AsyncSession
             count = await SiteRepository(session).remove_site(site_id, user_id=message.from_user.id)
             await session.commit()
+        if count and cache is not None:
+            cache.forget_site(site_id, message.from_user.id)
+        if count and on_site_removed is not None:
+            on_site_removed(site_id)
         if count:
             await message.reply(f"Сайт {site_id} удален")
         else:
@@ -108,6 +153,8 @@ def register_handlers(dp: Dispatcher, session_factory):
         async with session_factory() as session:  # type: AsyncSession
             updated = await SiteRepository(session).update_interval(site_id, seconds, user_id=message.from_user.id)
             await session.commit()
+        if updated and cache is not None:
+            cache.invalidate_user(message.from_user.id, site_id)
         if updated:
             await message.reply(f"Интервал сайта {site_id} обновлен на {seconds} сек")
         else:
@@ -117,7 +164,7 @@ def register_handlers(dp: Dispatcher, session_factory):
     async def on_history(message: Message):
         args = message.text.split()[1:]
         if not args:
-            await message.reply("Формат: /history <id> [limit]")
+            await message.reply("Формат: /history <id> [limit] [cursor]")
             return
         try:
             site_id = int(args[0])
@@ -125,12 +172,22 @@ def register_handlers(dp: Dispatcher, session_factory):
         except ValueError:
             await message.reply("ID и limit должны быть числами")
             return
-        async with session_factory() as session:  # type: AsyncSession
-            site = await SiteRepository(session).get_site(site_id, user_id=message.from_user.id)
-            if not site:
-                await message.reply("Сайт не найден")
-                return
-            records = await CheckRecordRepository(session).list_recent(site_id, limit)
+        token = args[2] if len(args) > 2 else None
+        try:
+            before = decode_cursor(token) if token else None
+        except ValueError:
+            await message.reply("Неверный курсор")
+            return
+        user_id = message.from_user.id
+        if cache is not None:
+            site, records = await cache.site_history(
+                user_id, site_id, limit, lambda: load_history(user_id, site_id, limit, before), before=token
+            )
+        else:
+            site, records = await load_history(user_id, site_id, limit, before)
+        if not site:
+            await message.reply("Сайт не найден")
+            return
         if not records:
             await message.reply("Нет записей")
             return
@@ -138,4 +195,6 @@ def register_handlers(dp: Dispatcher, session_factory):
             f"{r.checked_at:%Y-%m-%d %H:%M} | up={r.is_up} | code={r.status_code} | {r.response_ms}ms"
             for r in records
         ]
+        if len(records) == limit:
+            lines.append(f"Дальше: /history {site_id} {limit} {encode_cursor(records[-1])}")
         await message.reply("\n".join(lines))
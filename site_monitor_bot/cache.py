@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable
+
+
+class TTLCache:
+    # LRU cache whose entries also expire `ttl_s` seconds after being stored.
+    # `on_remove(key, value)` runs for every entry that expires, is evicted
+    # or is popped.
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        on_remove: Callable[[Hashable, Any], None] | None = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self.on_remove = on_remove
+        self.items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self.items.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > self.clock():
+                self.items.move_to_end(key)
+                self.hits += 1
+                return True, value
+            del self.items[key]
+            self._removed(key, value)
+        self.misses += 1
+        return False, None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.items[key] = (self.clock() + self.ttl_s, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.maxsize:
+            evicted, (_, value) = self.items.popitem(last=False)
+            self.evictions += 1
+            self._removed(evicted, value)
+
+    def pop(self, key: Hashable) -> None:
+        entry = self.items.pop(key, None)
+        if entry is not None:
+            self.invalidations += 1
+            self._removed(key, entry[1])
+
+    def _removed(self, key: Hashable, value: Any) -> None:
+        if self.on_remove is not None:
+            self.on_remove(key, value)
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self.items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class ViewCache:
+    # Read-through cache for the bot's /list and /history replies. Bot
+    # commands drop the user's list and the site's histories; stored check
+    # results drop both for their sites. Histories are indexed by site so
+    # an invalidation never scans the cache. The indexes only cover views
+    # still in the cache: they are pruned as views expire or are evicted.
+    def __init__(self, maxsize: int = 10000, ttl_s: float = 30.0):
+        self.sites = TTLCache(maxsize, ttl_s, on_remove=self._sites_removed)
+        self.history = TTLCache(maxsize, ttl_s, on_remove=self._history_removed)
+        self.history_keys: dict[int, set[tuple]] = {}
+        # site_id -> user_id for sites that appear in cached views
+        self.owners: dict[int, int] = {}
+        # Kept while a load is running and bumped by invalidations meanwhile;
+        # a load that raced one is not stored
+        self.versions: dict[tuple[str, int], int] = {}
+        self.loads: dict[tuple[str, int], int] = {}
+
+    async def user_sites(self, user_id: int, load: Callable[[], Awaitable[list]]) -> list:
+        found, sites = self.sites.get(user_id)
+        if not found:
+            version = self._start_load(("user", user_id))
+            try:
+                sites = await load()
+            finally:
+                fresh = self._end_load(("user", user_id), version)
+            if fresh:
+                for site in sites:
+                    self.owners[site.id] = user_id
+                self.sites.put(user_id, sites)
+        return sites
+
+    async def site_history(
+        self, user_id: int, site_id: int, limit: int, load: Callable[[], Awaitable[tuple]], before: Hashable = None
+    ) -> tuple:
+        # `load` returns (site or None, records); `before` is the page cursor
+        key = (site_id, user_id, limit, before)
+        found, view = self.history.get(key)
+        if not found:
+            version = self._start_load(("site", site_id))
+            try:
+                view = await load()
+            finally:
+                fresh = self._end_load(("site", site_id), version)
+            if fresh:
+                if view[0] is not None:
+                    self.owners[site_id] = user_id
+                self.history.put(key, view)
+                self.history_keys.setdefault(site_id, set()).add(key)
+        return view
+
+    def invalidate_user(self, user_id: int, site_id: int | None = None) -> None:
+        self._drop_sites(user_id)
+        if site_id is not None:
+            self._drop_history(site_id)
+
+    def invalidate_sites(self, site_ids: Iterable[int]) -> None:
+        for site_id in site_ids:
+            self._drop_history(site_id)
+            user_id = self.owners.get(site_id)
+            if user_id is not None:
+                self._drop_sites(user_id)
+
+    def forget_site(self, site_id: int, user_id: int) -> None:
+        self.owners.pop(site_id, None)
+        self.invalidate_user(user_id, site_id)
+
+    def _start_load(self, key: tuple[str, int]) -> int:
+        self.loads[key] = self.loads.get(key, 0) + 1
+        return self.versions.setdefault(key, 0)
+
+    def _end_load(self, key: tuple[str, int], version: int) -> bool:
+        # Whether no invalidation ran during the load
+        fresh = self.versions[key] == version
+        self.loads[key] -= 1
+        if not self.loads[key]:
+            del self.loads[key]
+            del self.versions[key]
+        return fresh
+
+    def _bump(self, key: tuple[str, int]) -> None:
+        if key in self.versions:
+            self.versions[key] += 1
+
+    def _drop_sites(self, user_id: int) -> None:
+        self._bump(("user", user_id))
+        self.sites.pop(user_id)
+
+    def _drop_history(self, site_id: int) -> None:
+        self._bump(("site", site_id))
+        for key in list(self.history_keys.get(site_id, ())):
+            self.history.pop(key)
+
+    def _sites_removed(self, user_id: int, sites: list) -> None:
+        for site in sites:
+            self._release_owner(site.id, user_id)
+
+    def _history_removed(self, key: tuple, view: tuple) -> None:
+        site_id, user_id = key[0], key[1]
+        keys = self.history_keys.get(site_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.history_keys[site_id]
+        self._release_owner(site_id, user_id)
+
+    def _release_owner(self, site_id: int, user_id: int) -> None:
+        # Once no cached view refers to the site
+        if site_id in self.history_keys or user_id in self.sites.items:
+            return
+        if self.owners.get(site_id) == user_id:
+            del self.owners[site_id]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {"list": self.sites.stats(), "history": self.history.stats()}
@@ -7,10 +7,51 @@ class Settings:
     telegram_bot_token: str
     admin_user_id: int | None
     database_url: str
+    sqlite_journal_mode: str | None
+    sqlite_synchronous: str | None
+    sqlite_mmap_mb: int
+    sqlite_cache_mb: int
+    sqlite_busy_timeout_ms: int
+    db_pool_size: int
+    db_max_overflow: int
+    db_copy_records: bool
     max_concurrent_checks: int
     weekly_report_hour: int
     weekly_report_minute: int
     weekly_report_day_of_week: str
+    http_pool_limit: int
+    http_pool_limit_per_host: int
+    http_dns_cache_ttl: int
+    http_keepalive_timeout: float
+    check_write_batch_size: int
+    check_write_flush_ms: int
+    check_write_max_pending: int
+    check_stream: bool
+    check_max_body_bytes: int | None
+    check_method: str
+    check_range_request: bool
+    check_conditional: bool
+    check_per_host_limit: int
+    check_min_timeout_seconds: float
+    check_failing_timeout_seconds: float
+    raw_retention_days: int
+    notify_messages_per_second: float
+    notify_per_chat_per_second: float
+    notify_workers: int
+    alert_failure_threshold: int
+    view_cache_size: int
+    view_cache_ttl_seconds: float
+    scheduler_mode: str
+    dispatch_batch_size: int
+    dispatch_poll_seconds: float
+    dispatch_jitter_seconds: float
+    process_role: str
+    worker_processes: int
+    shard_count: int
+    shard_lease_seconds: float
+    metrics_host: str
+    metrics_port: int
+    metrics_http_trace: bool
 
 
 def load_settings() -> Settings:
@@ -18,8 +59,49 @@ def load_settings() -> Settings:
         telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN", ""),
         admin_user_id=int(os.getenv("ADMIN_USER_ID", "0")) or None,
         database_url=os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./data/monitor.db"),
+        sqlite_journal_mode=os.getenv("SQLITE_JOURNAL_MODE", "WAL") or None,
+        sqlite_synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL") or None,
+        sqlite_mmap_mb=int(os.getenv("SQLITE_MMAP_MB", "256")),
+        sqlite_cache_mb=int(os.getenv("SQLITE_CACHE_MB", "64")),
+        sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        db_pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
+        db_max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        db_copy_records=os.getenv("DB_COPY_RECORDS", "1") == "1",
         max_concurrent_checks=int(os.getenv("MAX_CONCURRENT_CHECKS", "10")),
         weekly_report_hour=int(os.getenv("WEEKLY_REPORT_HOUR", "9")),
         weekly_report_minute=int(os.getenv("WEEKLY_REPORT_MINUTE", "0")),
         weekly_report_day_of_week=os.getenv("WEEKLY_REPORT_DAY_OF_WEEK", "mon"),
+        http_pool_limit=int(os.getenv("HTTP_POOL_LIMIT", "100")),
+        http_pool_limit_per_host=int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10")),
+        http_dns_cache_ttl=int(os.getenv("HTTP_DNS_CACHE_TTL", "300")),
+        http_keepalive_timeout=float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30")),
+        check_write_batch_size=int(os.getenv("CHECK_WRITE_BATCH_SIZE", "200")),
+        check_write_flush_ms=int(os.getenv("CHECK_WRITE_FLUSH_MS", "500")),
+        check_write_max_pending=int(os.getenv("CHECK_WRITE_MAX_PENDING", "5000")),
+        check_stream=os.getenv("CHECK_STREAM", "1") == "1",
+        check_max_body_bytes=int(os.getenv("CHECK_MAX_BODY_BYTES", "1048576")) or None,
+        check_method=os.getenv("CHECK_METHOD", "GET").upper(),
+        check_range_request=os.getenv("CHECK_RANGE_REQUEST", "0") == "1",
+        check_conditional=os.getenv("CHECK_CONDITIONAL", "1") == "1",
+        check_per_host_limit=int(os.getenv("CHECK_PER_HOST_LIMIT", "2")),
+        check_min_timeout_seconds=float(os.getenv("CHECK_MIN_TIMEOUT_SECONDS", "5")),
+        check_failing_timeout_seconds=float(os.getenv("CHECK_FAILING_TIMEOUT_SECONDS", "3")),
+        raw_retention_days=int(os.getenv("RAW_RETENTION_DAYS", "30")),
+        notify_messages_per_second=float(os.getenv("NOTIFY_MESSAGES_PER_SECOND", "25")),
+        notify_per_chat_per_second=float(os.getenv("NOTIFY_PER_CHAT_PER_SECOND", "1")),
+        notify_workers=int(os.getenv("NOTIFY_WORKERS", "8")),
+        alert_failure_threshold=int(os.getenv("ALERT_FAILURE_THRESHOLD", "2")),
+        view_cache_size=int(os.getenv("VIEW_CACHE_SIZE", "10000")),
+        view_cache_ttl_seconds=float(os.getenv("VIEW_CACHE_TTL_SECONDS", "30")),
+        scheduler_mode=os.getenv("SCHEDULER_MODE", "apscheduler"),
+        dispatch_batch_size=int(os.getenv("DISPATCH_BATCH_SIZE", "500")),
+        dispatch_poll_seconds=float(os.getenv("DISPATCH_POLL_SECONDS", "1")),
+        dispatch_jitter_seconds=float(os.getenv("DISPATCH_JITTER_SECONDS", "5")),
+        process_role=os.getenv("PROCESS_ROLE", "all"),
+        worker_processes=int(os.getenv("WORKER_PROCESSES", "0")),
+        shard_count=int(os.getenv("SHARD_COUNT", "16")),
+        shard_lease_seconds=float(os.getenv("SHARD_LEASE_SECONDS", "30")),
+        metrics_host=os.getenv("METRICS_HOST", "127.0.0.1"),
+        metrics_port=int(os.getenv("METRICS_PORT", "9108")),
+        metrics_http_trace=os.getenv("METRICS_HTTP_TRACE", "0") == "1",
     )
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import Integer, String, Boolean, DateTime, ForeignKey
-from sqlalchemy import select, func
+from sqlalchemy import Integer, Float, String, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy import inspect, insert, text, event
+from sqlalchemy.engine import make_url
 from typing import Optional
+from dataclasses import dataclass
 import hashlib
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 class Base(DeclarativeBase):
@@ -24,6 +27,10 @@ class User(Base):
 
 class Site(Base):
     __tablename__ = "sites"
+    __table_args__ = (
+        # Dispatcher scheduler: active sites by due time
+        Index("ix_sites_active_next_check", "is_active", "next_check_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.telegram_user_id"), index=True)
@@ -35,6 +42,9 @@ class Site(Base):
     last_content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     last_checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     next_check_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # HTTP validators from the last response, sent back as conditional request headers
+    etag: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
+    last_modified: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
 
     user: Mapped[User] = relationship("User", back_populates="sites")
     records: Mapped[list[CheckRecord]] = relationship("CheckRecord", back_populates="site", cascade="all, delete-orphan")
@@ -44,10 +54,15 @@ class CheckRecord(Base):
     __tablename__ = "check_records"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    site_id: Mapped[int] = mapped_column(ForeignKey("sites.id"), index=True)
-    checked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=func.now())
+    site_id: Mapped[int] = mapped_column(ForeignKey("sites.id"))
+    # Indexed for compaction and pruning, which work by time range. Set in
+    # Python rather than by the database so every row is stored in the same
+    # format (SQLite's CURRENT_TIMESTAMP drops microseconds); keyset
+    # comparisons on checked_at rely on it.
+    checked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
     status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     response_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    ttfb_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     is_up: Mapped[bool] = mapped_column(Boolean, default=False)
     content_hash: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     error: Mapped[Optional[str]] = mapped_column(String(512), nullable=True)
@@ -55,15 +70,190 @@ class CheckRecord(Base):
     site: Mapped[Site] = relationship("Site", back_populates="records")
 
 
-def create_engine_and_session(database_url: str):
-    engine = create_async_engine(database_url, echo=False, future=True)
+# Per-site history newest first: /history pages (keyset on checked_at, id),
+# reports and time ranges. Also serves lookups by site_id alone.
+Index("ix_check_records_site_checked_desc", CheckRecord.site_id, CheckRecord.checked_at.desc(), CheckRecord.id.desc())
+
+# Indexes that earlier versions created and that are now covered by the one above
+OBSOLETE_INDEXES = {
+    "check_records": ("ix_check_records_site_id", "ix_check_records_site_checked"),
+}
+
+# Earlier versions let SQLite fill checked_at with CURRENT_TIMESTAMP, stored
+# without fractional seconds; that sorts below the same second written as
+# "... .000000", so a keyset cursor on such a row matches the row itself.
+# Those rows are rewritten once, when the upgrade creates the keyset index.
+LEGACY_TIMESTAMPS = {"ix_check_records_site_checked_desc": ("check_records", "checked_at")}
+
+
+class CheckRollup(Base):
+    # Per-site aggregates of check_records for one hour or one day (see rollups.py)
+    __tablename__ = "check_rollups"
+    __table_args__ = (
+        Index("ix_check_rollups_site_period_bucket", "site_id", "period", "bucket_start", unique=True),
+        Index("ix_check_rollups_period_bucket", "period", "bucket_start"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    site_id: Mapped[int] = mapped_column(ForeignKey("sites.id", ondelete="CASCADE"))
+    period: Mapped[str] = mapped_column(String(8))  # "hour" or "day"
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    checks: Mapped[int] = mapped_column(Integer, default=0)
+    up_checks: Mapped[int] = mapped_column(Integer, default=0)
+    error_count: Mapped[int] = mapped_column(Integer, default=0)
+    # Latency of successful checks
+    total_ms: Mapped[int] = mapped_column(Integer, default=0)
+    p50_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    p95_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    max_ms: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Outages, so reports can join buckets: down-going checks, the longest
+    # outage that ended inside the bucket, whether the first check was down,
+    # the first up check, and the start of an outage open at the last check.
+    # NULL on rows written before these columns existed.
+    incidents: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    longest_outage_s: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    starts_down: Mapped[Optional[bool]] = mapped_column(Boolean, nullable=True)
+    first_up_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    down_since: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class ShardLease(Base):
+    # Which worker process checks the sites with id % shard_count == shard (see sharding.py)
+    __tablename__ = "shard_leases"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    owner: Mapped[Optional[str]] = mapped_column(String(128), nullable=True)
+    expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
+class Worker(Base):
+    # Heartbeats of live worker processes; shards are split evenly between them
+    __tablename__ = "workers"
+
+    worker_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    seen_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+class PendingAlert(Base):
+    # Alerts raised by worker processes; the bot process sends them, so the
+    # Telegram rate limits hold for the bot as a whole (see notifications.py)
+    __tablename__ = "pending_alerts"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(Integer)
+    text: Mapped[str] = mapped_column(String(4096))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class DatabaseProfile:
+    # SQLite: WAL lets the bot read while check results are committed;
+    # synchronous=NORMAL is durable across app crashes under WAL (only an
+    # OS crash can lose the last commits). None leaves a pragma at SQLite's
+    # default, so DatabaseProfile(journal_mode=None, ...) is the old setup.
+    journal_mode: Optional[str] = "WAL"
+    synchronous: Optional[str] = "NORMAL"
+    mmap_size: Optional[int] = 256 * 1024 * 1024
+    cache_size_kib: Optional[int] = 64 * 1024
+    busy_timeout_ms: Optional[int] = 5000
+    # Server databases (PostgreSQL): connection pool per process
+    pool_size: int = 10
+    max_overflow: int = 20
+    pool_recycle_s: int = 1800
+    # Write check records with COPY on PostgreSQL + asyncpg
+    copy_records: bool = True
+
+    def sqlite_pragmas(self) -> list[str]:
+        pragmas = {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "mmap_size": self.mmap_size,
+            # Negative cache_size is in KiB rather than pages
+            "cache_size": -self.cache_size_kib if self.cache_size_kib else None,
+            "busy_timeout": self.busy_timeout_ms,
+        }
+        return [f"PRAGMA {name}={value}" for name, value in pragmas.items() if value is not None]
+
+
+def create_engine_and_session(database_url: str, profile: Optional[DatabaseProfile] = None):
+    profile = profile or DatabaseProfile()
+    options = {"execution_options": {"copy_records": profile.copy_records}}
+    is_sqlite = make_url(database_url).get_backend_name() == "sqlite"
+    if not is_sqlite:
+        options.update({
+            "pool_size": profile.pool_size,
+            "max_overflow": profile.max_overflow,
+            "pool_recycle": profile.pool_recycle_s,
+            "pool_pre_ping": True,
+        })
+    engine = create_async_engine(database_url, echo=False, future=True, **options)
+    if is_sqlite:
+        pragmas = profile.sqlite_pragmas()
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+
     session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
     return engine, session_factory
 
 
+async def insert_check_records(session: AsyncSession, records: list[dict]) -> None:
+    # COPY on PostgreSQL + asyncpg, otherwise an executemany INSERT
+    # (multi-row VALUES batches where the driver supports them)
+    connection = await session.connection()
+    copy = connection.sync_connection.get_execution_options().get("copy_records")
+    if copy and connection.dialect.driver == "asyncpg":
+        columns = list(records[0])
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            CheckRecord.__tablename__, records=[tuple(record[c] for c in columns) for record in records], columns=columns
+        )
+        return
+    await session.execute(insert(CheckRecord), records)
+
+
 async def init_db(engine) -> None:
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips existing tables, so add columns and indexes they are missing
+        await conn.run_sync(_upgrade_existing_tables)
+
+
+def _upgrade_existing_tables(sync_conn) -> None:
+    # Only nullable columns can be added this way; anything else needs a real migration
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                # Can take a while on a large table; runs once
+                logger.info(f"Creating index {index.name} on {table.name}")
+                if index.name in LEGACY_TIMESTAMPS and sync_conn.dialect.name == "sqlite":
+                    _rewrite_legacy_timestamps(sync_conn, *LEGACY_TIMESTAMPS[index.name])
+                index.create(sync_conn)
+        for name in OBSOLETE_INDEXES.get(table.name, ()):
+            if name in indexes:
+                logger.info(f"Dropping index {name} on {table.name}")
+                sync_conn.execute(text(f"DROP INDEX {name}"))
+
+
+def _rewrite_legacy_timestamps(sync_conn, table: str, column: str) -> None:
+    # "YYYY-MM-DD HH:MM:SS" -> "YYYY-MM-DD HH:MM:SS.000000", the format SQLAlchemy writes
+    result = sync_conn.execute(text(
+        f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+    ))
+    if result.rowcount:
+        logger.info(f"Rewrote {result.rowcount} legacy {table}.{column} values")
 
 
 def hash_content(content: bytes) -> str:
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import time
+from bisect import insort
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+from yarl import URL
+
+from .utils import as_utc
+
+if TYPE_CHECKING:
+    from .monitor import CheckResult
+
+
+def origin(url: str) -> str:
+    try:
+        return str(URL(url).origin())
+    except ValueError:
+        return url
+
+
+class CheckExecutor:
+    # Hands out check slots under a global cap and a per-origin cap, so a
+    # slow host can only ever hold `per_host` of them. Waiting checks are
+    # granted most-overdue first, skipping any whose host is at its cap.
+    # Timeouts adapt to each site's recent latency; a host whose last
+    # `failing_after` checks got no response is cut to one slot and a
+    # short timeout until it answers again.
+    def __init__(
+        self,
+        max_concurrent: int = 10,
+        per_host: int = 2,
+        timeout_s: float = 15.0,
+        min_timeout_s: float = 5.0,
+        latency_factor: float = 10.0,
+        failing_after: int = 3,
+        failing_timeout_s: float = 3.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.per_host = per_host
+        self.timeout_s = timeout_s
+        self.min_timeout_s = min_timeout_s
+        self.latency_factor = latency_factor
+        self.failing_after = failing_after
+        self.failing_timeout_s = failing_timeout_s
+        self.in_flight = 0
+        self.host_in_flight: dict[str, int] = {}
+        self.host_failures: dict[str, int] = {}
+        # Smoothed latency (ms) of successful checks per site
+        self.latency_ms: dict[int, float] = {}
+        self.waiters: list[tuple[float, int, str, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    def host_limit(self, host: str) -> int:
+        return 1 if self.is_failing(host) else self.per_host
+
+    def is_failing(self, host: str) -> bool:
+        return self.host_failures.get(host, 0) >= self.failing_after
+
+    def timeout_for(self, site_id: int, host: str) -> float:
+        timeout = self.timeout_s
+        latency = self.latency_ms.get(site_id)
+        if latency is not None:
+            timeout = min(timeout, max(self.min_timeout_s, latency / 1000 * self.latency_factor))
+        if self.is_failing(host):
+            timeout = min(timeout, self.failing_timeout_s)
+        return timeout
+
+    @asynccontextmanager
+    async def slot(self, site_id: int, url: str, due: Optional[datetime] = None) -> AsyncIterator[float]:
+        # Yields the timeout to use for this check
+        loop = asyncio.get_running_loop()
+        host = origin(url)
+        # Checks without a due time count as due now
+        due_ts = as_utc(due).timestamp() if due is not None else time.time()
+        entry = (due_ts, next(self._seq), host, loop.create_future())
+        insort(self.waiters, entry)
+        self._grant()
+        try:
+            await entry[3]
+        except asyncio.CancelledError:
+            if entry[3].done() and not entry[3].cancelled():
+                self._release(host)
+            else:
+                self.waiters.remove(entry)
+            raise
+        try:
+            yield self.timeout_for(site_id, host)
+        finally:
+            self._release(host)
+
+    def record(self, site_id: int, url: str, result: CheckResult) -> None:
+        host = origin(url)
+        if result.status_code is None:
+            self.host_failures[host] = self.host_failures.get(host, 0) + 1
+            return
+        # Any response means the host is reachable again
+        if self.host_failures.pop(host, None) is not None:
+            self._grant()
+        if result.is_up and result.response_ms is not None:
+            previous = self.latency_ms.get(site_id)
+            self.latency_ms[site_id] = result.response_ms if previous is None else 0.7 * previous + 0.3 * result.response_ms
+
+    def _grant(self) -> None:
+        i = 0
+        while i < len(self.waiters) and self.in_flight < self.max_concurrent:
+            _, _, host, future = self.waiters[i]
+            if self.host_in_flight.get(host, 0) < self.host_limit(host):
+                del self.waiters[i]
+                self.in_flight += 1
+                self.host_in_flight[host] = self.host_in_flight.get(host, 0) + 1
+                future.set_result(None)
+            else:
+                i += 1
+
+    def _release(self, host: str) -> None:
+        self.in_flight -= 1
+        count = self.host_in_flight[host] - 1
+        if count:
+            self.host_in_flight[host] = count
+        else:
+            del self.host_in_flight[host]
+        self._grant()
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import asyncio
 import os
+import signal
+import sys
 from pathlib import Path
 
 from aiogram import Bot, Dispatcher
@@ -11,34 +13,195 @@ from dotenv import load_dotenv
 
 from .config import load_settings
 from .logging_config import configure_logging
-from .db import create_engine_and_session, init_db
-from .monitor import MonitorService
-from .scheduler import MonitorScheduler
+from .db import DatabaseProfile, create_engine_and_session, init_db
+from .monitor import MonitorService, HttpPoolConfig, CheckConfig, TransitionDetector
+from .scheduler import MonitorScheduler, DispatchScheduler
 from .bot import register_handlers
-from .notifications import Notifier
+from .notifications import AlertOutbox, Notifier
+from .writer import CheckResultWriter
+from .cache import ViewCache
+from .executor import CheckExecutor
+from .sharding import ShardCoordinator
+from .metrics import MetricsServer, MonitorMetrics
 
+ROLES = ("all", "bot", "worker")
 
-async def run():
+
+def build_monitor_service(
+    settings,
+    session_factory,
+    notifier: Notifier | AlertOutbox,
+    view_cache: ViewCache | None = None,
+    metrics: MonitorMetrics | None = None,
+) -> MonitorService:
+    writer = CheckResultWriter(
+        session_factory,
+        batch_size=settings.check_write_batch_size,
+        flush_interval_ms=settings.check_write_flush_ms,
+        max_pending=settings.check_write_max_pending,
+        metrics=metrics,
+    )
+    writer.start()
+    return MonitorService(
+        session_factory,
+        max_concurrent_checks=settings.max_concurrent_checks,
+        http_pool=HttpPoolConfig(
+            limit=settings.http_pool_limit,
+            limit_per_host=settings.http_pool_limit_per_host,
+            dns_cache_ttl=settings.http_dns_cache_ttl,
+            keepalive_timeout=settings.http_keepalive_timeout,
+        ),
+        writer=writer,
+        check=CheckConfig(
+            stream=settings.check_stream,
+            max_body_bytes=settings.check_max_body_bytes,
+            method=settings.check_method,
+            range_request=settings.check_range_request,
+            conditional=settings.check_conditional,
+        ),
+        transitions=TransitionDetector(settings.alert_failure_threshold),
+        on_transition=notifier.on_transition,
+        on_stored=view_cache.invalidate_sites if view_cache is not None else None,
+        executor=CheckExecutor(
+            max_concurrent=settings.max_concurrent_checks,
+            per_host=settings.check_per_host_limit,
+            min_timeout_s=settings.check_min_timeout_seconds,
+            failing_timeout_s=settings.check_failing_timeout_seconds,
+        ) if settings.check_per_host_limit > 0 else None,
+        metrics=metrics,
+    )
+
+
+def build_notifier(settings, bot: Bot, session_factory) -> Notifier:
+    notifier = Notifier(
+        bot,
+        session_factory,
+        messages_per_second=settings.notify_messages_per_second,
+        per_chat_per_second=settings.notify_per_chat_per_second,
+        alert_workers=settings.notify_workers,
+    )
+    # Worker processes leave their alerts in the database for this process
+    notifier.start(relay_interval_s=1.0)
+    return notifier
+
+
+async def start_metrics(settings, metrics: MonitorMetrics | None) -> MetricsServer | None:
+    if metrics is None:
+        return None
+    server = MetricsServer(metrics.registry, settings.metrics_host, settings.metrics_port)
+    try:
+        await server.start()
+    except OSError as e:
+        # E.g. a worker started on its own with the bot's METRICS_PORT;
+        # checks matter more than their metrics
+        logger.warning(f"Metrics disabled, cannot listen on {settings.metrics_host}:{settings.metrics_port}: {e}")
+        await server.stop()
+        return None
+    return server
+
+
+def export_stats(
+    metrics: MonitorMetrics | None,
+    monitor_service: MonitorService | None = None,
+    dispatcher: DispatchScheduler | None = None,
+    notifier: Notifier | None = None,
+    view_cache: ViewCache | None = None,
+) -> None:
+    # Components that already keep counts are read at scrape time
+    if metrics is None:
+        return
+    gauge = metrics.registry.gauge
+    if monitor_service is not None and monitor_service.writer is not None:
+        writer = monitor_service.writer
+        gauge("monitor_write_queue", "Check results waiting to be written", lambda: writer.queue.qsize())
+    if monitor_service is not None and monitor_service.executor is not None:
+        executor = monitor_service.executor
+        gauge("monitor_checks_in_flight", "Checks holding an executor slot", lambda: executor.in_flight)
+        gauge("monitor_checks_waiting", "Checks waiting for an executor slot", lambda: len(executor.waiters))
+    if dispatcher is not None:
+        gauge("monitor_dispatched_in_flight", "Claimed checks not finished yet", lambda: len(dispatcher.in_flight))
+    if notifier is not None:
+        queue = notifier.queue
+        gauge("notify_pending_alerts", "Alerts waiting to be sent", lambda: sum(len(texts) for texts in queue.pending.values()))
+        gauge(
+            "notify_alerts_total",
+            "Alert messages by outcome",
+            lambda: {("queued",): queue.alerts, ("sent",): queue.sent, ("retried",): queue.retries, ("dropped",): queue.dropped},
+            labels=("outcome",),
+            kind="counter",
+        )
+    if view_cache is not None:
+        gauge(
+            "view_cache_requests_total",
+            "Bot view cache lookups",
+            lambda: {
+                (view, result): stats[result + "s"]
+                for view, stats in view_cache.stats().items()
+                for result in ("hit", "miss")
+            },
+            labels=("view", "result"),
+            kind="counter",
+        )
+
+
+async def run(role: str | None = None):
+    # Roles: "all" runs everything in this process; "bot" runs polling,
+    # reports and compaction; "worker" checks the shards it leases
     load_dotenv()
     configure_logging()
     settings = load_settings()
-
-    if not settings.telegram_bot_token:
-        raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
+    role = role or settings.process_role
+    if role not in ROLES:
+        raise RuntimeError(f"Unknown process role {role!r}, expected one of {', '.join(ROLES)}")
 
     # Ensure data dir exists for sqlite
     data_dir = Path("data")
     data_dir.mkdir(parents=True, exist_ok=True)
 
-    engine, session_factory = create_engine_and_session(settings.database_url)
+    engine, session_factory = create_engine_and_session(
+        settings.database_url,
+        DatabaseProfile(
+            journal_mode=settings.sqlite_journal_mode,
+            synchronous=settings.sqlite_synchronous,
+            mmap_size=settings.sqlite_mmap_mb * 1024 * 1024 or None,
+            cache_size_kib=settings.sqlite_cache_mb * 1024 or None,
+            busy_timeout_ms=settings.sqlite_busy_timeout_ms or None,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            copy_records=settings.db_copy_records,
+        ),
+    )
     await init_db(engine)
 
+    if role == "worker":
+        # Workers do not talk to Telegram: alerts go through the database
+        await run_worker(settings, session_factory)
+        return
+
+    if not settings.telegram_bot_token:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
     bot = Bot(settings.telegram_bot_token, parse_mode="HTML")
+
     dp = Dispatcher()
 
-    register_handlers(dp, session_factory)
+    view_cache = None
+    if settings.view_cache_size > 0:
+        view_cache = ViewCache(settings.view_cache_size, settings.view_cache_ttl_seconds)
+
+    notifier = build_notifier(settings, bot, session_factory)
+    metrics = MonitorMetrics(http_trace=settings.metrics_http_trace) if settings.metrics_port else None
 
-    monitor_service = MonitorService(session_factory, max_concurrent_checks=settings.max_concurrent_checks)
+    monitor_service = None
+    if role == "all":
+        monitor_service = build_monitor_service(settings, session_factory, notifier, view_cache, metrics)
+        await monitor_service.warm_transitions()
+    register_handlers(
+        dp,
+        session_factory,
+        view_cache,
+        monitor_service.forget_site if monitor_service is not None else None,
+        notifier.set_chat,
+    )
     scheduler = MonitorScheduler(
         session_factory,
         monitor_service,
@@ -47,10 +210,35 @@ async def run():
             "hour": settings.weekly_report_hour,
             "minute": settings.weekly_report_minute,
         },
+        schedule_sites=role == "all" and settings.scheduler_mode != "dispatcher",
+        retention_days=settings.raw_retention_days,
+        metrics=metrics,
     )
     await scheduler.start()
 
-    notifier = Notifier(bot, session_factory)
+    dispatcher = None
+    if role == "all" and settings.scheduler_mode == "dispatcher":
+        dispatcher = DispatchScheduler(
+            session_factory,
+            monitor_service,
+            batch_size=settings.dispatch_batch_size,
+            poll_interval_s=settings.dispatch_poll_seconds,
+            jitter_s=settings.dispatch_jitter_seconds,
+            max_in_flight=settings.max_concurrent_checks * 10,
+            metrics=metrics,
+        )
+        await dispatcher.start()
+    export_stats(metrics, monitor_service, dispatcher, notifier, view_cache)
+    metrics_server = await start_metrics(settings, metrics)
+
+    workers = []
+    if role == "bot":
+        # Check results are written by other processes, so cached views
+        # only expire by TTL here
+        workers = [
+            await spawn_worker(settings.metrics_port + i + 1 if settings.metrics_port else 0)
+            for i in range(settings.worker_processes)
+        ]
 
     # Wire weekly report to notifier
     from apscheduler.triggers.cron import CronTrigger
@@ -62,4 +250,84 @@ async def run():
     )
 
     logger.info("Bot is starting polling...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        scheduler.scheduler.shutdown(wait=False)
+        if dispatcher is not None:
+            await dispatcher.stop()
+        if monitor_service is not None:
+            await monitor_service.close()
+        await stop_workers(workers)
+        await notifier.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if view_cache is not None:
+            logger.info(f"View cache stats: {view_cache.stats()}")
+
+
+async def run_worker(settings, session_factory) -> None:
+    outbox = AlertOutbox(session_factory)
+    outbox.start()
+    metrics = MonitorMetrics(http_trace=settings.metrics_http_trace) if settings.metrics_port else None
+    monitor_service = build_monitor_service(settings, session_factory, outbox, metrics=metrics)
+    coordinator = ShardCoordinator(session_factory, settings.shard_count, lease_s=settings.shard_lease_seconds)
+    # Load the last known state of sites in shards taken over from another worker
+    coordinator.on_gain = lambda shards: monitor_service.warm_transitions(shards, coordinator.shard_count)
+    dispatcher = DispatchScheduler(
+        session_factory,
+        monitor_service,
+        batch_size=settings.dispatch_batch_size,
+        poll_interval_s=settings.dispatch_poll_seconds,
+        jitter_s=settings.dispatch_jitter_seconds,
+        max_in_flight=settings.max_concurrent_checks * 10,
+        shards=coordinator,
+        metrics=metrics,
+    )
+    export_stats(metrics, monitor_service, dispatcher)
+    metrics_server = await start_metrics(settings, metrics)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    async def prune_sites():
+        # /remove runs in the bot process, so removed sites are noticed here
+        while True:
+            await asyncio.sleep(settings.shard_lease_seconds)
+            try:
+                await monitor_service.prune_sites(coordinator.current(), coordinator.shard_count)
+            except Exception as e:
+                logger.error(f"Pruning site state failed: {e}")
+
+    logger.info(f"Worker {coordinator.worker_id} is starting...")
+    await coordinator.start()
+    await dispatcher.start()
+    pruner = asyncio.create_task(prune_sites())
+    try:
+        await stop.wait()
+    finally:
+        pruner.cancel()
+        await dispatcher.stop()
+        # Releases the leases so the other workers take the shards over at once
+        await coordinator.stop()
+        await monitor_service.close()
+        await outbox.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+
+
+async def spawn_worker(metrics_port: int = 0) -> asyncio.subprocess.Process:
+    env = dict(os.environ, METRICS_PORT=str(metrics_port))
+    return await asyncio.create_subprocess_exec(sys.executable, "-m", "site_monitor_bot", "worker", env=env)
+
+
+async def stop_workers(workers: list[asyncio.subprocess.Process], timeout: float = 30.0) -> None:
+    for process in workers:
+        if process.returncode is None:
+            process.terminate()
+    for process in workers:
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
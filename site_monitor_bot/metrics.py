@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from types import SimpleNamespace
+from typing import Callable, Iterable, Optional
+
+import aiohttp
+from aiohttp import web
+from loguru import logger
+
+# Seconds; covers a fast local check up to the default 15s timeout
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+# Lag of a check behind its due time
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    # Plain attribute increments on the event loop thread: no locks needed
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.values: dict[tuple, float] = {} if labels else {(): 0.0}
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...] = LATENCY_BUCKETS, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.label_names = labels
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                bucket_labels = _labels(self.label_names, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total:g}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+class Gauge:
+    # Read from `read` at scrape time, so nothing is tracked on the hot path;
+    # `read` returns a number or {label values: number}
+    def __init__(self, name: str, help: str, read: Callable, labels: tuple[str, ...] = (), kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label_names = labels
+        self.kind = kind
+
+    def samples(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        value = self.read()
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        for labels, item in items:
+            yield f"{self.name}{_labels(self.label_names, labels)} {item:g}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, read: Callable, labels: tuple[str, ...] = (), kind: str = "gauge") -> Gauge:
+        return self.add(Gauge(name, help, read, labels, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                logger.error(f"Metric {metric.name} failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+class MonitorMetrics:
+    # Everything the check pipeline records; components take it as an
+    # optional argument and skip recording when it is None. aiohttp trace
+    # hooks (DNS and connect timings) cost more than everything else
+    # together, so they are opt-in.
+    def __init__(self, registry: Optional[Registry] = None, http_trace: bool = False):
+        self.registry = registry or Registry()
+        self.http_trace = http_trace
+        add = self.registry.add
+        self.checks = add(Counter("monitor_checks_total", "Completed checks by outcome", ("outcome",)))
+        self.queue_wait = add(Histogram("monitor_check_queue_wait_seconds", "Time a check waited for a concurrency slot"))
+        self.check_duration = add(Histogram("monitor_check_duration_seconds", "HTTP check time, including the body"))
+        self.lag = add(Histogram("monitor_check_lag_seconds", "Check start behind the site's due time", LAG_BUCKETS))
+        self.http_phase = add(Histogram("monitor_http_phase_seconds", "HTTP timings: ttfb, plus dns and connect when traced", labels=("phase",)))
+        self.db_commit = add(Histogram("monitor_db_commit_seconds", "Time to write and commit check results", labels=("path",)))
+        self.db_batch = add(Counter("monitor_db_records_total", "Check records written"))
+        self.skipped = add(Counter("monitor_jobs_skipped_total", "Checks or jobs that did not run", ("reason",)))
+
+    def trace_configs(self) -> Optional[list[aiohttp.TraceConfig]]:
+        return [http_trace_config(self.http_phase)] if self.http_trace else None
+
+
+def http_trace_config(histogram: Histogram) -> aiohttp.TraceConfig:
+    # Only fire when aiohttp resolves a host or opens a connection; TTFB
+    # comes from the check result, which measures it anyway
+    async def on_dns_start(session, ctx: SimpleNamespace, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def on_dns_end(session, ctx, params):
+        histogram.observe(time.perf_counter() - ctx.dns_start, "dns")
+
+    async def on_connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def on_connect_end(session, ctx, params):
+        histogram.observe(time.perf_counter() - ctx.connect_start, "connect")
+
+    trace = aiohttp.TraceConfig()
+    trace.on_dns_resolvehost_start.append(on_dns_start)
+    trace.on_dns_resolvehost_end.append(on_dns_end)
+    trace.on_connection_create_start.append(on_connect_start)
+    trace.on_connection_create_end.append(on_connect_end)
+    return trace
+
+
+class MetricsServer:
+    # Serves the registry as Prometheus text on GET /metrics
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9100):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
@@ -1,16 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
+import time
 from contextlib import asynccontextmanager
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import datetime, timezone
-from typing import Optional, Callable, Awaitable
+from typing import Optional, Callable, Awaitable, Iterable
 
 import aiohttp
 from loguru import logger
 
 from .db import hash_content, Site
-from .repository import CheckRecordRepository
+from .executor import CheckExecutor
+from .metrics import MonitorMetrics
+from .repository import CheckRecordRepository, SiteRepository
+from .writer import CheckResultWriter
 
 
 @dataclass
@@ -20,57 +25,335 @@ class CheckResult:
     is_up: bool
     content_hash: Optional[str]
     error: Optional[str]
+    # Time until response headers arrived; response_ms includes the body
+    ttfb_ms: Optional[int] = None
+    bytes_read: Optional[int] = None
+    # Validators for the next conditional request; 304 means the body is unchanged
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    not_modified: bool = False
 
 
-async def http_check(url: str, session: aiohttp.ClientSession, timeout_s: int = 15) -> CheckResult:
-    start = asyncio.get_event_loop().time()
+@dataclass
+class CheckConfig:
+    # stream=False keeps the old behaviour: read the whole body, then hash it
+    stream: bool = True
+    max_body_bytes: Optional[int] = 1024 * 1024
+    chunk_size: int = 64 * 1024
+    method: str = "GET"  # or "HEAD": no body, no content hash
+    range_request: bool = False  # ask for only the first max_body_bytes
+    conditional: bool = True  # send If-None-Match / If-Modified-Since when known
+    timeout_s: float = 15
+
+
+async def http_check(
+    url: str,
+    session: aiohttp.ClientSession,
+    timeout_s: int = 15,
+    config: Optional[CheckConfig] = None,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+) -> CheckResult:
+    if config is None:
+        config = CheckConfig(stream=False, timeout_s=timeout_s)
+    loop = asyncio.get_event_loop()
+    start = loop.time()
+    headers = {}
+    if config.range_request and config.max_body_bytes:
+        headers["Range"] = f"bytes=0-{config.max_body_bytes - 1}"
+    if config.conditional:
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
     try:
-        async with session.get(url, timeout=timeout_s) as resp:
-            body = await resp.read()
-            duration_ms = int((asyncio.get_event_loop().time() - start) * 1000)
+        async with session.request(config.method, url, timeout=config.timeout_s, headers=headers) as resp:
+            ttfb_ms = int((loop.time() - start) * 1000)
             status = resp.status
-            content = hash_content(body) if status == 200 else None
-            return CheckResult(status_code=status, response_ms=duration_ms, is_up=200 <= status < 400, content_hash=content, error=None)
+            if config.method == "HEAD":
+                content, size = None, 0
+            elif config.stream:
+                content, size = await _hash_stream(resp, config.max_body_bytes, config.chunk_size)
+            else:
+                body = await resp.read()
+                content, size = hash_content(body), len(body)
+            duration_ms = int((loop.time() - start) * 1000)
+            if status not in (200, 206):
+                content = None
+            # A 304 need not repeat the validators; keep the ones we sent.
+            # Validators are only kept together with the hash they vouch
+            # for, otherwise a later 304 would leave the site without one.
+            if status == 304:
+                etag = resp.headers.get("ETag", etag)
+                last_modified = resp.headers.get("Last-Modified", last_modified)
+            elif content is not None:
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+            else:
+                etag = last_modified = None
+            return CheckResult(
+                status_code=status,
+                response_ms=duration_ms,
+                is_up=200 <= status < 400,
+                content_hash=content,
+                error=None,
+                ttfb_ms=ttfb_ms,
+                bytes_read=size,
+                etag=etag,
+                last_modified=last_modified,
+                not_modified=status == 304,
+            )
     except Exception as e:  # network/timeout/etc
-        duration_ms = int((asyncio.get_event_loop().time() - start) * 1000)
-        return CheckResult(status_code=None, response_ms=duration_ms, is_up=False, content_hash=None, error=str(e))
+        duration_ms = int((loop.time() - start) * 1000)
+        return CheckResult(
+            status_code=None,
+            response_ms=duration_ms,
+            is_up=False,
+            content_hash=None,
+            error=str(e),
+        )
+
+
+async def _hash_stream(resp: aiohttp.ClientResponse, max_bytes: Optional[int], chunk_size: int) -> tuple[str, int]:
+    # Only one chunk is held at a time; stops reading at max_bytes, which
+    # closes the connection instead of returning it to the pool
+    digest = hashlib.sha256()
+    size = 0
+    async for chunk in resp.content.iter_chunked(chunk_size):
+        if max_bytes is not None and size + len(chunk) >= max_bytes:
+            digest.update(chunk[:max_bytes - size])
+            size = max_bytes
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@dataclass
+class HttpPoolConfig:
+    limit: int = 100
+    limit_per_host: int = 10
+    dns_cache_ttl: int = 300
+    keepalive_timeout: float = 30.0
+
+
+def create_http_session(config: HttpPoolConfig, trace_configs: Optional[list[aiohttp.TraceConfig]] = None) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=config.limit,
+        limit_per_host=config.limit_per_host,
+        ttl_dns_cache=config.dns_cache_ttl,
+        use_dns_cache=True,
+        keepalive_timeout=config.keepalive_timeout,
+    )
+    return aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+
+
+DOWN = "down"
+RECOVERY = "recovery"
+
+
+class TransitionDetector:
+    # Last known up/down state per site, kept in memory so a check never
+    # has to read the previous state back. A site is only reported down
+    # after `failure_threshold` failed checks in a row.
+    def __init__(self, failure_threshold: int = 1):
+        self.failure_threshold = failure_threshold
+        self.is_up: dict[int, bool] = {}
+        self.failures: dict[int, int] = {}
+
+    def warm(self, sites: list[Site]) -> None:
+        for site in sites:
+            if site.last_checked_at is None:
+                continue
+            up = site.last_status_code is not None and 200 <= site.last_status_code < 400
+            self.is_up[site.id] = up
+            self.failures[site.id] = 0 if up else self.failure_threshold
+
+    def forget(self, site_id: int) -> None:
+        self.is_up.pop(site_id, None)
+        self.failures.pop(site_id, None)
+
+    def observe(self, site_id: int, result: CheckResult) -> Optional[str]:
+        # Returns DOWN or RECOVERY when the confirmed state flips, else None
+        was_up = self.is_up.get(site_id)
+        if result.is_up:
+            self.failures[site_id] = 0
+            self.is_up[site_id] = True
+            return RECOVERY if was_up is False else None
+        failures = self.failures.get(site_id, 0) + 1
+        self.failures[site_id] = failures
+        if failures < self.failure_threshold or was_up is False:
+            return None
+        # A site first seen failing counts as going down too
+        self.is_up[site_id] = False
+        return DOWN
 
 
 class MonitorService:
-    def __init__(self, session_factory, max_concurrent_checks: int = 10):
+    def __init__(
+        self,
+        session_factory,
+        max_concurrent_checks: int = 10,
+        http_pool: Optional[HttpPoolConfig] = None,
+        writer: Optional[CheckResultWriter] = None,
+        check: Optional[CheckConfig] = None,
+        transitions: Optional[TransitionDetector] = None,
+        on_transition: Optional[Callable[[Site, str, CheckResult], Awaitable[None]]] = None,
+        on_stored: Optional[Callable[[list[int]], None]] = None,
+        executor: Optional[CheckExecutor] = None,
+        metrics: Optional[MonitorMetrics] = None,
+    ):
         self.session_factory = session_factory
         self.semaphore = asyncio.Semaphore(max_concurrent_checks)
+        # Per-host slots and adaptive timeouts; without one every check
+        # shares the global semaphore
+        self.executor = executor
+        self.metrics = metrics
+        self.http_pool = http_pool or HttpPoolConfig()
+        self._http_session: Optional[aiohttp.ClientSession] = None
+        # When set, results go through the batched writer instead of a commit per check
+        self.writer = writer
+        self.check = check or CheckConfig()
+        self.transitions = transitions
+        self.on_transition = on_transition
+        # Called with site ids once their results are committed; with a
+        # writer that happens when it flushes
+        self.on_stored = on_stored
+        if writer is not None and on_stored is not None:
+            writer.on_flush = on_stored
+
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running event loop
+        if self._http_session is None or self._http_session.closed:
+            traces = self.metrics.trace_configs() if self.metrics is not None else None
+            self._http_session = create_http_session(self.http_pool, traces)
+        return self._http_session
 
-    async def perform_check_and_store(self, site: Site, http_session: aiohttp.ClientSession) -> CheckResult:
-        async with self.semaphore:
-            result = await http_check(site.url, http_session)
+    async def close(self) -> None:
+        if self.writer is not None:
+            await self.writer.close()
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+
+    async def perform_check_and_store(self, site: Site, http_session: Optional[aiohttp.ClientSession] = None) -> CheckResult:
+        queued = time.perf_counter()
+        # A 304 reuses the stored hash, so without one ask for the full body
+        etag, last_modified = (site.etag, site.last_modified) if site.last_content_hash is not None else (None, None)
+        if self.executor is None:
+            async with self.semaphore:
+                started = self._record_start(queued)
+                result = await http_check(
+                    site.url,
+                    http_session or self.http_session,
+                    config=self.check,
+                    etag=etag,
+                    last_modified=last_modified,
+                )
+        else:
+            # Ordered by when the check fell due, so the most overdue go first
+            async with self.executor.slot(site.id, site.url, site.next_check_at) as timeout_s:
+                started = self._record_start(queued)
+                result = await http_check(
+                    site.url,
+                    http_session or self.http_session,
+                    config=replace(self.check, timeout_s=timeout_s),
+                    etag=etag,
+                    last_modified=last_modified,
+                )
+                self.executor.record(site.id, site.url, result)
+        if self.metrics is not None:
+            self.metrics.check_duration.observe(time.perf_counter() - started)
+            if result.ttfb_ms is not None:
+                self.metrics.http_phase.observe(result.ttfb_ms / 1000, "ttfb")
+            self.metrics.checks.inc("up" if result.is_up else "down" if result.status_code is not None else "error")
+        if result.not_modified:
+            # "Up, unchanged": the body we hashed last time is still current
+            result.content_hash = site.last_content_hash
+        await self.store_result(site.id, result)
+        if self.transitions is not None:
+            event = self.transitions.observe(site.id, result)
+            if event is not None and self.on_transition is not None:
+                try:
+                    await self.on_transition(site, event, result)
+                except Exception as e:
+                    logger.error(f"Transition handler failed for site {site.id}: {e}")
+        return result
+
+    def _record_start(self, queued: float) -> float:
+        started = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.queue_wait.observe(started - queued)
+        return started
+
+    async def warm_transitions(self, shards: Optional[Iterable[int]] = None, shard_count: int = 1) -> None:
+        # One read of all active sites at startup replaces a read per check;
+        # a sharded worker warms the shards it takes over
+        if self.transitions is None:
+            return
+        async with self.session_factory() as session:
+            sites = await SiteRepository(session).list_all_active(shards, shard_count)
+        self.transitions.warm(sites)
+
+    def forget_site(self, site_id: int) -> None:
+        # Per-site state of a removed or deactivated site; a reused id starts fresh
+        if self.transitions is not None:
+            self.transitions.forget(site_id)
+        if self.executor is not None:
+            self.executor.latency_ms.pop(site_id, None)
+
+    async def prune_sites(self, shards: Optional[Iterable[int]] = None, shard_count: int = 1) -> None:
+        # For processes that do not see /remove: forgets every site that is
+        # no longer active (or no longer in this worker's shards)
+        async with self.session_factory() as session:
+            active = set(await SiteRepository(session).list_active_ids(shards, shard_count))
+        known = set()
+        if self.transitions is not None:
+            known.update(self.transitions.is_up, self.transitions.failures)
+        if self.executor is not None:
+            known.update(self.executor.latency_ms)
+        for site_id in known - active:
+            self.forget_site(site_id)
+
+    async def store_result(self, site_id: int, result: CheckResult) -> None:
+        if self.writer is not None:
+            await self.writer.submit(site_id, result)
+            return
 
         from sqlalchemy import update
         from sqlalchemy.ext.asyncio import AsyncSession
         from .db import Site as SiteModel
         from sqlalchemy import select
 
+        started = time.perf_counter()
         async with self.session_factory() as db:  # type: AsyncSession
             record_repo = CheckRecordRepository(db)
             await record_repo.add_record(
-                site_id=site.id,
+                site_id=site_id,
                 status_code=result.status_code,
                 response_ms=result.response_ms,
                 is_up=result.is_up,
                 content_hash=result.content_hash,
                 error=result.error,
+                ttfb_ms=result.ttfb_ms,
             )
             # update site
             await db.execute(
                 update(SiteModel)
-                .where(SiteModel.id == site.id)
+                .where(SiteModel.id == site_id)
                 .values(
                     last_status_code=result.status_code,
                     last_response_ms=result.response_ms,
                     last_content_hash=result.content_hash,
                     last_checked_at=datetime.now(timezone.utc),
+                    etag=result.etag,
+                    last_modified=result.last_modified,
                 )
             )
             await db.commit()
-
-        return result
+        if self.metrics is not None:
+            self.metrics.db_commit.observe(time.perf_counter() - started, "direct")
+            self.metrics.db_batch.inc()
+        if self.on_stored is not None:
+            self.on_stored([site_id])
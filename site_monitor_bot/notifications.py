@@ -1,55 +1,463 @@
 from __future__ import annotations
 
+import asyncio
+from datetime import datetime, timedelta, timezone
+
 from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
 from loguru import logger
 
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from .db import Site, User
+from .db import PendingAlert, Site, User
+from .monitor import DOWN, RECOVERY, CheckResult
+from .reports import MAX_MESSAGE_LENGTH, format_weekly_report, iter_user_sites, weekly_stats
+
+
+class TokenBucket:
+    # `rate` acquisitions per second on average, bursts up to `capacity`
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated: float | None = None
+        self.lock = asyncio.Lock()
+
+    def reserve(self) -> float:
+        # Takes a token and returns 0, or returns the seconds until one is available
+        now = asyncio.get_running_loop().time()
+        if self.updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def full_in(self) -> float:
+        # Seconds until the bucket is back at capacity
+        if self.updated is None:
+            return 0.0
+        elapsed = asyncio.get_running_loop().time() - self.updated
+        return max(0.0, (self.capacity - self.tokens) / self.rate - elapsed)
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while (delay := self.reserve()) > 0:
+                await asyncio.sleep(delay)
+
+
+class NotificationQueue:
+    # Alerts are queued per chat: while a chat waits for its turn, further
+    # alerts for it pile up and go out together as one message. A bounded
+    # pool of workers sends under a global and a per-chat token bucket; a
+    # chat whose bucket is empty is re-queued when it refills instead of
+    # holding a worker. RetryAfter pauses all sending for the time Telegram
+    # asks for; other errors are retried with exponential backoff. A chat's
+    # bucket is dropped once the chat is idle and the bucket has refilled.
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = 25,
+        per_chat_rate: float = 1.0,
+        workers: int = 8,
+        max_attempts: int = 5,
+        backoff_s: float = 1.0,
+        global_bucket: TokenBucket | None = None,
+    ):
+        self.bot = bot
+        self.global_bucket = global_bucket or TokenBucket(global_rate, 1)
+        self.per_chat_rate = per_chat_rate
+        self.chat_buckets: dict[int, TokenBucket] = {}
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_s = backoff_s
+        self.pending: dict[int, list[str]] = {}
+        self.attempts: dict[int, int] = {}
+        # Chats that are queued, waiting on a timer or being sent
+        self.claimed: set[int] = set()
+        self.ready: asyncio.Queue[int] = asyncio.Queue()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.paused_until = 0.0
+        self._tasks: list[asyncio.Task] = []
+        self._timers: set[asyncio.TimerHandle] = set()
+        self.alerts = 0
+        self.sent = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, chat_id: int, text: str) -> None:
+        self.alerts += 1
+        self.pending.setdefault(chat_id, []).append(text)
+        if chat_id not in self.claimed:
+            self.claimed.add(chat_id)
+            self.idle.clear()
+            self.ready.put_nowait(chat_id)
+
+    async def close(self, timeout: float = 10.0) -> None:
+        # Give queued alerts a chance to go out, then stop the workers
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping alerts for {len(self.pending)} chats on shutdown")
+        for timer in self._timers:
+            timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def pace(self, chat_id: int) -> None:
+        # For messages sent outside the queue (weekly reports): waits for the
+        # chat's bucket and any flood-control pause, so both kinds of message
+        # share the per-chat limit
+        await self._bucket(chat_id).acquire()
+        pause = self.paused_until - asyncio.get_running_loop().time()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, asyncio.get_running_loop().time() + seconds)
+        logger.warning(f"Flood control, pausing notifications for {seconds}s")
+
+    def release(self, chat_id: int) -> None:
+        # After sending outside the queue; the queue itself forgets buckets
+        # of the chats it claims
+        if chat_id not in self.claimed:
+            self._forget_bucket_later(chat_id)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, 1)
+        return bucket
+
+    def _requeue_later(self, chat_id: int, delay: float) -> None:
+        def requeue():
+            self._timers.discard(timer)
+            self.ready.put_nowait(chat_id)
+        timer = asyncio.get_running_loop().call_later(delay, requeue)
+        self._timers.add(timer)
+
+    def _forget_bucket_later(self, chat_id: int) -> None:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            return
+        def forget():
+            self._timers.discard(timer)
+            # Claimed again: the next _done schedules a new timer
+            if chat_id in self.claimed or self.chat_buckets.get(chat_id) is not bucket:
+                return
+            if bucket.full_in() > 0:
+                self._forget_bucket_later(chat_id)
+            else:
+                del self.chat_buckets[chat_id]
+        timer = asyncio.get_running_loop().call_later(bucket.full_in(), forget)
+        self._timers.add(timer)
+
+    def _take_message(self, chat_id: int) -> list[str]:
+        # As many pending alerts as fit into one message, oldest first
+        texts = self.pending[chat_id]
+        taken, length = [texts[0]], len(texts[0])
+        for text in texts[1:]:
+            length += len(text) + 1
+            if length > MAX_MESSAGE_LENGTH:
+                break
+            taken.append(text)
+        del texts[:len(taken)]
+        return taken
+
+    def _done(self, chat_id: int) -> None:
+        if self.pending.get(chat_id):
+            self.ready.put_nowait(chat_id)
+            return
+        self.pending.pop(chat_id, None)
+        self.claimed.discard(chat_id)
+        self._forget_bucket_later(chat_id)
+        if not self.claimed:
+            self.idle.set()
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id = await self.ready.get()
+            delay = self._bucket(chat_id).reserve()
+            if delay > 0:
+                self._requeue_later(chat_id, delay)
+                continue
+            pause = self.paused_until - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.global_bucket.acquire()
+
+            texts = self._take_message(chat_id)
+            try:
+                await self.bot.send_message(chat_id, "\n".join(texts))
+            except TelegramRetryAfter as e:
+                self.retries += 1
+                self.pending[chat_id][:0] = texts
+                self.pause(e.retry_after)
+                self._requeue_later(chat_id, e.retry_after)
+                continue
+            except TelegramForbiddenError:
+                # Bot blocked or removed from the chat: retrying will not help
+                self.dropped += len(texts)
+                self.attempts.pop(chat_id, None)
+                self._done(chat_id)
+                continue
+            except Exception as e:
+                attempt = self.attempts.get(chat_id, 0) + 1
+                if attempt < self.max_attempts:
+                    self.retries += 1
+                    self.attempts[chat_id] = attempt
+                    self.pending[chat_id][:0] = texts
+                    self._requeue_later(chat_id, self.backoff_s * 2 ** (attempt - 1))
+                    continue
+                logger.error(f"Dropping {len(texts)} alerts for {chat_id} after {attempt} attempts: {e}")
+                self.dropped += len(texts)
+            else:
+                self.sent += 1
+            self.attempts.pop(chat_id, None)
+            self._done(chat_id)
+
+
+def alert_text(url: str, event: str, result) -> str:
+    if event == DOWN:
+        return f"⚠️ Сайт недоступен: {url}"
+    extra = []
+    if result.status_code is not None:
+        extra.append(f"code={result.status_code}")
+    if result.response_ms is not None:
+        extra.append(f"{result.response_ms}ms")
+    return f"✅ Сайт восстановлен: {url} ({' | '.join(extra)})"
 
 
 class Notifier:
-    def __init__(self, bot: Bot, session_factory):
+    # Telegram allows about 30 messages/s per bot and 1/s per chat; stay below it.
+    # Alerts and weekly reports share the global and the per-chat limits.
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory,
+        messages_per_second: float = 25,
+        max_concurrent_sends: int = 10,
+        report_batch_size: int = 500,
+        per_chat_per_second: float = 1.0,
+        alert_workers: int = 8,
+        relay_batch_size: int = 500,
+    ):
         self.bot = bot
         self.session_factory = session_factory
+        # No bursts: Telegram counts over a sliding second
+        self.rate = TokenBucket(messages_per_second, 1)
+        self.send_semaphore = asyncio.Semaphore(max_concurrent_sends)
+        self.report_batch_size = report_batch_size
+        self.queue = NotificationQueue(bot, per_chat_rate=per_chat_per_second, workers=alert_workers, global_bucket=self.rate)
+        # telegram_user_id -> chat_id for alerts
+        self.chat_ids: dict[int, int] = {}
+        self._waiting: dict[int, list[str]] = {}
+        self._lookups: set[asyncio.Task] = set()
+        self.relay_batch_size = relay_batch_size
+        self._relay: asyncio.Task | None = None
+
+    def start(self, relay_interval_s: float | None = None) -> None:
+        # With an interval, also sends the alerts worker processes left in
+        # pending_alerts
+        self.queue.start()
+        if relay_interval_s and self._relay is None:
+            self._relay = asyncio.create_task(self._relay_loop(relay_interval_s))
+
+    async def close(self) -> None:
+        if self._relay is not None:
+            self._relay.cancel()
+            await asyncio.gather(self._relay, return_exceptions=True)
+            self._relay = None
+        await asyncio.gather(*self._lookups, return_exceptions=True)
+        await self.queue.close()
+
+    async def _relay_loop(self, interval_s: float) -> None:
+        while True:
+            try:
+                while await self.relay_pending() == self.relay_batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Relaying worker alerts failed: {e}")
+            await asyncio.sleep(interval_s)
+
+    async def relay_pending(self) -> int:
+        # Oldest first; rows are deleted before their alerts are queued, so
+        # an alert is sent at most once. Only the rows read are deleted: a
+        # row committed meanwhile by a slower worker may have a lower id.
+        async with self.session_factory() as session:  # type: AsyncSession
+            rows = (await session.execute(
+                select(PendingAlert.id, PendingAlert.user_id, PendingAlert.text, User.chat_id)
+                .outerjoin(User, User.telegram_user_id == PendingAlert.user_id)
+                .order_by(PendingAlert.id)
+                .limit(self.relay_batch_size)
+            )).all()
+            if not rows:
+                return 0
+            await session.execute(delete(PendingAlert).where(PendingAlert.id.in_([row.id for row in rows])))
+            await session.commit()
+        for row in rows:
+            if row.chat_id is None:
+                logger.warning(f"Dropping worker alert {row.id}, user {row.user_id} is unknown")
+                continue
+            self.queue.enqueue(row.chat_id, row.text)
+        return len(rows)
+
+    def set_chat(self, user_id: int, chat_id: int) -> None:
+        # Called by the bot handlers whenever a user's chat is stored; a user
+        # not cached yet is looked up on their next alert
+        if user_id in self.chat_ids:
+            self.chat_ids[user_id] = chat_id
 
     async def notify_downtime(self, site_id: int):
         async with self.session_factory() as session:  # type: AsyncSession
-            site, user = await self._load_site_user(session, site_id)
-        if not site or not user:
-            return
-        text = f"⚠️ Сайт недоступен: {site.url}"
-        await self.bot.send_message(user.chat_id, text)
+            site = await session.get(Site, site_id)
+        if site is not None:
+            await self.on_transition(site, DOWN, None)
 
     async def notify_recovery(self, site_id: int, status_code: int | None, response_ms: int | None):
         async with self.session_factory() as session:  # type: AsyncSession
-            site, user = await self._load_site_user(session, site_id)
-        if not site or not user:
+            site = await session.get(Site, site_id)
+        if site is not None:
+            result = CheckResult(status_code, response_ms, True, None, None)
+            await self.on_transition(site, RECOVERY, result)
+
+    async def on_transition(self, site: Site, event: str, result) -> None:
+        # Awaited on the check path: the text comes from the site and the
+        # result, the chat id from a per-user cache. A user not seen yet is
+        # looked up in the background; alerts for them wait in order until
+        # that returns.
+        text = alert_text(site.url, event, result)
+        chat_id = self.chat_ids.get(site.user_id)
+        if chat_id is not None:
+            self.queue.enqueue(chat_id, text)
             return
-        extra = []
-        if status_code is not None:
-            extra.append(f"code={status_code}")
-        if response_ms is not None:
-            extra.append(f"{response_ms}ms")
-        text = f"✅ Сайт восстановлен: {site.url} ({' | '.join(extra)})"
-        await self.bot.send_message(user.chat_id, text)
-
-    async def send_weekly_report(self):
-        # Simple version: per user count of up/down last week could be implemented here
-        # For MVP send a stub message to all users
-        async with self.session_factory() as session:  # type: AsyncSession
-            result = await session.execute(select(User))
-            users = result.scalars().all()
-        for user in users:
+        waiting = self._waiting.get(site.user_id)
+        if waiting is not None:
+            waiting.append(text)
+            return
+        self._waiting[site.user_id] = [text]
+        task = asyncio.create_task(self._resolve_chat(site.user_id))
+        self._lookups.add(task)
+        task.add_done_callback(self._lookups.discard)
+
+    async def _resolve_chat(self, user_id: int) -> None:
+        try:
+            async with self.session_factory() as session:  # type: AsyncSession
+                user = await session.get(User, user_id)
+        except Exception as e:
+            texts = self._waiting.pop(user_id)
+            logger.error(f"Dropping {len(texts)} alerts, failed to look up chat of user {user_id}: {e}")
+            return
+        texts = self._waiting.pop(user_id)
+        if user is None:
+            return
+        self.chat_ids[user_id] = user.chat_id
+        for text in texts:
+            self.queue.enqueue(user.chat_id, text)
+
+    async def send_weekly_report(self, now: datetime | None = None) -> int:
+        # Users are read in batches; each batch costs one sites query and
+        # three aggregate queries, and its reports go out concurrently
+        until = now or datetime.now(timezone.utc)
+        # From midnight a week ago, so every closed day of the report is
+        # read from the daily rollups and only today from raw records
+        since = (until - timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+        sent = 0
+        async for batch in iter_user_sites(self.session_factory, self.report_batch_size):
+            site_ids = [site.id for _, sites in batch for site in sites]
+            async with self.session_factory() as session:  # type: AsyncSession
+                stats = await weekly_stats(session, site_ids, since, until)
+            results = await asyncio.gather(*(
+                self._send_all(user.chat_id, format_weekly_report(sites, stats, since, until))
+                for user, sites in batch
+                if sites
+            ))
+            sent += sum(results)
+        logger.info(f"Weekly report sent to {sent} chats")
+        return sent
+
+    async def _send_all(self, chat_id: int, texts: list[str]) -> bool:
+        # Parts of one report go out in order, paced like the chat's alerts
+        try:
+            for text in texts:
+                if not await self._send(chat_id, text):
+                    return False
+            return True
+        finally:
+            self.queue.release(chat_id)
+
+    async def _send(self, chat_id: int, text: str, attempts: int = 3) -> bool:
+        # A RetryAfter pauses alerts and every other report as well
+        for _ in range(attempts):
+            await self.queue.pace(chat_id)
+            async with self.send_semaphore:
+                await self.rate.acquire()
+                try:
+                    await self.bot.send_message(chat_id, text)
+                    return True
+                except TelegramRetryAfter as e:
+                    self.queue.pause(e.retry_after)
+                except Exception as e:
+                    logger.warning(f"Failed to send message to {chat_id}: {e}")
+                    return False
+        return False
+
+
+class AlertOutbox:
+    # Stands in for Notifier in worker processes: alerts are buffered in
+    # memory and written to pending_alerts in one insert every `flush_s`,
+    # off the check path; the bot process relays them to Telegram.
+    def __init__(self, session_factory, flush_s: float = 1.0):
+        self.session_factory = session_factory
+        self.flush_s = flush_s
+        self.buffer: list[dict] = []
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def on_transition(self, site: Site, event: str, result) -> None:
+        self.buffer.append({
+            "user_id": site.user_id,
+            "text": alert_text(site.url, event, result),
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_s)
             try:
-                await self.bot.send_message(user.chat_id, "Еженедельный отчет: статистика доступности доступна в /history")
+                await self.flush()
             except Exception as e:
-                logger.warning(f"Failed to send weekly report to {user.chat_id}: {e}")
-
-    async def _load_site_user(self, session: AsyncSession, site_id: int):
-        site = await session.get(Site, site_id)
-        if not site:
-            return None, None
-        user = await session.get(User, site.user_id)
-        return site, user
+                logger.error(f"Failed to write {len(self.buffer)} alerts: {e}")
+
+    async def flush(self) -> None:
+        if not self.buffer:
+            return
+        alerts, self.buffer = self.buffer, []
+        try:
+            async with self.session_factory() as session:  # type: AsyncSession
+                await session.execute(insert(PendingAlert), alerts)
+                await session.commit()
+        except Exception:
+            # Retried with the next flush
+            self.buffer[:0] = alerts
+            raise
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Iterable, Optional
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import CheckRecord, CheckRollup, Site, User
+from .rollups import DAY, last_rolled_day
+from .utils import as_utc
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+
+@dataclass
+class SiteWeekStats:
+    checks: int = 0
+    up_checks: int = 0
+    avg_ms: Optional[float] = None
+    p95_ms: Optional[int] = None
+    incidents: int = 0
+    longest_outage: Optional[timedelta] = None
+
+    @property
+    def uptime(self) -> Optional[float]:
+        return self.up_checks / self.checks if self.checks else None
+
+
+@dataclass
+class _Span:
+    # One site's checks over part of the report range: a day from the
+    # rollups or a stretch of raw records. Outage fields as in CheckRollup.
+    checks: int = 0
+    up_checks: int = 0
+    latency_ms: int = 0
+    latency_count: int = 0
+    p95_ms: Optional[int] = None
+    incidents: int = 0
+    longest_outage: Optional[timedelta] = None
+    starts_down: bool = False
+    first_up_at: Optional[datetime] = None
+    down_since: Optional[datetime] = None
+    last_checked_at: Optional[datetime] = None
+
+
+async def weekly_stats(session: AsyncSession, site_ids: Iterable[int], since: datetime, until: datetime) -> dict[int, SiteWeekStats]:
+    # Whole days that compaction has rolled up are read from the daily
+    # rollups (their raw records may be pruned already); the rest of the
+    # range, normally just the current day, from check_records. Then the
+    # spans of each site are joined in time order.
+    site_ids = list(site_ids)
+    stats = {site_id: SiteWeekStats() for site_id in site_ids}
+    if not site_ids:
+        return stats
+    since, until = as_utc(since), as_utc(until)
+    spans: dict[int, list[_Span]] = {site_id: [] for site_id in site_ids}
+    rolled_from = _day(since)
+    if rolled_from < since:
+        rolled_from += timedelta(days=1)
+    rolled_until = await last_rolled_day(session)
+    rolled_to = min(rolled_until, _day(until)) if rolled_until is not None else rolled_from
+    if rolled_from < rolled_to:
+        if since < rolled_from:
+            await _raw_spans(session, spans, since, rolled_from)
+        await _rollup_spans(session, spans, rolled_from, rolled_to)
+        if rolled_to < until:
+            await _raw_spans(session, spans, rolled_to, until)
+    else:
+        await _raw_spans(session, spans, since, until)
+
+    for site_id, item in stats.items():
+        latency_ms = latency_count = 0
+        opened = last_checked = None
+        for span in spans[site_id]:
+            item.checks += span.checks
+            item.up_checks += span.up_checks
+            latency_ms += span.latency_ms
+            latency_count += span.latency_count
+            # Over several days this is the worst daily p95
+            if span.p95_ms is not None and (item.p95_ms is None or span.p95_ms > item.p95_ms):
+                item.p95_ms = span.p95_ms
+            item.incidents += span.incidents
+            item.longest_outage = _longer(item.longest_outage, span.longest_outage)
+            if opened is not None:
+                if span.starts_down:
+                    # The outage open at the end of the previous span goes on
+                    item.incidents -= 1
+                if span.first_up_at is not None:
+                    item.longest_outage = _longer(item.longest_outage, span.first_up_at - opened)
+                    opened = None
+            if opened is None:
+                opened = span.down_since
+            last_checked = span.last_checked_at
+        # An outage still open at the end of the range lasts until the
+        # site's last check
+        if opened is not None:
+            item.longest_outage = _longer(item.longest_outage, last_checked - opened)
+        if latency_count:
+            item.avg_ms = latency_ms / latency_count
+    return stats
+
+
+def _day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _longer(longest: Optional[timedelta], duration: Optional[timedelta]) -> Optional[timedelta]:
+    if duration is None or (longest is not None and longest >= duration):
+        return longest
+    return duration
+
+
+async def _rollup_spans(session: AsyncSession, spans: dict[int, list[_Span]], since: datetime, until: datetime) -> None:
+    rows = await session.execute(
+        select(CheckRollup)
+        .where(
+            CheckRollup.site_id.in_(list(spans)),
+            CheckRollup.period == DAY,
+            CheckRollup.bucket_start >= since,
+            CheckRollup.bucket_start < until,
+        )
+        .order_by(CheckRollup.site_id, CheckRollup.bucket_start)
+    )
+    for rollup in rows.scalars():
+        # Up checks always carry a response time
+        span = _Span(
+            checks=rollup.checks,
+            up_checks=rollup.up_checks,
+            latency_ms=rollup.total_ms,
+            latency_count=rollup.up_checks,
+            p95_ms=rollup.p95_ms,
+        )
+        if rollup.last_checked_at is None:
+            # Rolled up before outages were kept: counts only, and an
+            # outage open before the day ends when the day starts
+            day = as_utc(rollup.bucket_start)
+            span.first_up_at = day if rollup.up_checks else None
+            span.last_checked_at = day
+        else:
+            span.incidents = rollup.incidents
+            if rollup.longest_outage_s is not None:
+                span.longest_outage = timedelta(seconds=rollup.longest_outage_s)
+            span.starts_down = rollup.starts_down
+            span.first_up_at = _utc_or_none(rollup.first_up_at)
+            span.down_since = _utc_or_none(rollup.down_since)
+            span.last_checked_at = as_utc(rollup.last_checked_at)
+        spans[rollup.site_id].append(span)
+
+
+async def _raw_spans(session: AsyncSession, spans: dict[int, list[_Span]], since: datetime, until: datetime) -> None:
+    # Three queries over the (site_id, checked_at) index for the
+    # whole batch of sites, however many sites and records it covers
+    in_range = and_(CheckRecord.site_id.in_(list(spans)), CheckRecord.checked_at >= since, CheckRecord.checked_at < until)
+    up_ms = case((CheckRecord.is_up == True, CheckRecord.response_ms))
+    totals = await session.execute(
+        select(
+            CheckRecord.site_id,
+            func.count(),
+            func.sum(case((CheckRecord.is_up == True, 1), else_=0)),
+            func.coalesce(func.sum(up_ms), 0),
+            func.count(up_ms),
+            func.min(case((CheckRecord.is_up == True, CheckRecord.checked_at))),
+            func.max(CheckRecord.checked_at),
+        )
+        .where(in_range)
+        .group_by(CheckRecord.site_id)
+    )
+    found: dict[int, _Span] = {}
+    for site_id, checks, up_checks, latency_ms, latency_count, first_up_at, last_at in totals:
+        found[site_id] = _Span(
+            checks=checks,
+            up_checks=up_checks,
+            latency_ms=latency_ms,
+            latency_count=latency_count,
+            first_up_at=_utc_or_none(first_up_at),
+            last_checked_at=as_utc(last_at),
+        )
+
+    # Nearest-rank p95: the smallest latency with cume_dist >= 0.95
+    ranked = (
+        select(
+            CheckRecord.site_id,
+            CheckRecord.response_ms,
+            func.cume_dist().over(partition_by=CheckRecord.site_id, order_by=CheckRecord.response_ms).label("rank"),
+        )
+        .where(in_range, CheckRecord.is_up == True, CheckRecord.response_ms.is_not(None))
+        .subquery()
+    )
+    p95 = await session.execute(
+        select(ranked.c.site_id, func.min(ranked.c.response_ms)).where(ranked.c.rank >= 0.95).group_by(ranked.c.site_id)
+    )
+    for site_id, p95_ms in p95:
+        found[site_id].p95_ms = p95_ms
+
+    # Outages: only the checks where a site goes down or comes back come
+    # out of the database
+    for site_id, checked_at, is_up, prev_up in await session.execute(_transitions_query(in_range)):
+        span = found[site_id]
+        checked_at = as_utc(checked_at)
+        if not is_up:
+            span.incidents += 1
+            span.down_since = checked_at
+            if prev_up is None:
+                span.starts_down = True
+        else:
+            span.longest_outage = _longer(span.longest_outage, checked_at - span.down_since)
+            span.down_since = None
+    for site_id, span in found.items():
+        spans[site_id].append(span)
+
+
+def _utc_or_none(value: Optional[datetime]) -> Optional[datetime]:
+    return as_utc(value) if value is not None else None
+
+
+def _transitions_query(in_range):
+    # Down checks after an up one (or first in range) and up checks after a down one
+    ordered = (
+        select(
+            CheckRecord.site_id,
+            CheckRecord.checked_at,
+            CheckRecord.is_up,
+            func.lag(CheckRecord.is_up).over(partition_by=CheckRecord.site_id, order_by=CheckRecord.checked_at).label("prev_up"),
+        )
+        .where(in_range)
+        .subquery()
+    )
+    went_down = and_(ordered.c.is_up == False, or_(ordered.c.prev_up.is_(None), ordered.c.prev_up == True))
+    came_back = and_(ordered.c.is_up == True, ordered.c.prev_up == False)
+    return (
+        select(ordered.c.site_id, ordered.c.checked_at, ordered.c.is_up, ordered.c.prev_up)
+        .where(or_(went_down, came_back))
+        .order_by(ordered.c.site_id, ordered.c.checked_at)
+    )
+
+
+async def iter_user_sites(session_factory, batch_size: int = 500) -> AsyncIterator[list[tuple[User, list[Site]]]]:
+    # Keyset pagination over users; one sites query per batch
+    last_id = None
+    while True:
+        async with session_factory() as session:  # type: AsyncSession
+            stmt = select(User).order_by(User.telegram_user_id).limit(batch_size)
+            if last_id is not None:
+                stmt = stmt.where(User.telegram_user_id > last_id)
+            users = list((await session.execute(stmt)).scalars().all())
+            if not users:
+                return
+            sites = await session.execute(
+                select(Site).where(Site.user_id.in_([u.telegram_user_id for u in users])).order_by(Site.id)
+            )
+        by_user: dict[int, list[Site]] = {}
+        for site in sites.scalars():
+            by_user.setdefault(site.user_id, []).append(site)
+        yield [(user, by_user.get(user.telegram_user_id, [])) for user in users]
+        last_id = users[-1].telegram_user_id
+
+
+def format_duration(value: timedelta) -> str:
+    minutes = int(value.total_seconds() // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин"
+
+
+def format_site_stats(site: Site, item: SiteWeekStats) -> str:
+    if not item.checks:
+        return f"[{site.id}] {site.url}\n  нет проверок"
+    parts = [f"аптайм {item.uptime * 100:.2f}%"]
+    if item.avg_ms is not None:
+        parts.append(f"ср. {item.avg_ms:.0f}ms")
+    if item.p95_ms is not None:
+        parts.append(f"p95 {item.p95_ms}ms")
+    parts.append(f"инцидентов: {item.incidents}")
+    if item.longest_outage is not None:
+        parts.append(f"макс. простой: {format_duration(item.longest_outage)}")
+    return f"[{site.id}] {site.url}\n  " + " | ".join(parts)
+
+
+def format_weekly_report(sites: list[Site], stats: dict[int, SiteWeekStats], since: datetime, until: datetime) -> list[str]:
+    # One or more messages, split between sites to stay under the length limit
+    header = f"📊 Еженедельный отчет {since:%d.%m}–{until:%d.%m}"
+    messages = [header]
+    for site in sites:
+        block = format_site_stats(site, stats[site.id])
+        if len(messages[-1]) + len(block) + 2 > MAX_MESSAGE_LENGTH:
+            messages.append(block)
+        else:
+            messages[-1] += "\n\n" + block
+    return messages
@@ -1,9 +1,15 @@
 from __future__ import annotations
 
+from datetime import datetime
 from typing import Iterable, Optional
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, update, or_, bindparam
 from sqlalchemy.ext.asyncio import AsyncSession
-from .db import User, Site, CheckRecord
+from .db import User, Site, CheckRecord, CheckRollup
+
+
+def in_shards(shards: Iterable[int], shard_count: int):
+    # Sites are sharded by id modulo the shard count
+    return (Site.id % shard_count).in_(list(shards))
 
 
 class UserRepository:
@@ -60,10 +66,47 @@ class SiteRepository:
         result = await self.session.execute(stmt)
         return result.rowcount or 0
 
-    async def list_all_active(self) -> list[Site]:
-        result = await self.session.execute(select(Site).where(Site.is_active == True))
+    async def list_all_active(self, shards: Optional[Iterable[int]] = None, shard_count: int = 1) -> list[Site]:
+        stmt = select(Site).where(Site.is_active == True)
+        if shards is not None:
+            stmt = stmt.where(in_shards(shards, shard_count))
+        result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def list_active_ids(self, shards: Optional[Iterable[int]] = None, shard_count: int = 1) -> list[int]:
+        stmt = select(Site.id).where(Site.is_active == True)
+        if shards is not None:
+            stmt = stmt.where(in_shards(shards, shard_count))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def list_due(
+        self, now: datetime, limit: int, shards: Optional[Iterable[int]] = None, shard_count: int = 1
+    ) -> list[Site]:
+        # Never-checked sites (NULL next_check_at) first; explicit, as
+        # PostgreSQL puts NULLs last in ascending order
+        stmt = (
+            select(Site)
+            .where(Site.is_active == True, or_(Site.next_check_at.is_(None), Site.next_check_at <= now))
+            .order_by(Site.next_check_at.asc().nullsfirst())
+            .limit(limit)
+        )
+        if shards is not None:
+            stmt = stmt.where(in_shards(shards, shard_count))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def set_next_checks(self, next_checks: Iterable[tuple[int, datetime]]) -> None:
+        params = [{"site_id": site_id, "next_check_at": when} for site_id, when in next_checks]
+        if not params:
+            return
+        stmt = (
+            update(Site.__table__)
+            .where(Site.__table__.c.id == bindparam("site_id"))
+            .values(next_check_at=bindparam("next_check_at"))
+        )
+        await self.session.execute(stmt, params)
+
 
 class CheckRecordRepository:
     def __init__(self, session: AsyncSession):
@@ -77,6 +120,7 @@ class CheckRecordRepository:
         is_up: bool,
         content_hash: Optional[str],
         error: Optional[str],
+        ttfb_ms: Optional[int] = None,
     ) -> CheckRecord:
         record = CheckRecord(
             site_id=site_id,
@@ -85,16 +129,48 @@ class CheckRecordRepository:
             is_up=is_up,
             content_hash=content_hash,
             error=error,
+            ttfb_ms=ttfb_ms,
         )
         self.session.add(record)
         await self.session.flush()
         return record
 
     async def list_recent(self, site_id: int, limit: int = 10) -> list[CheckRecord]:
-        result = await self.session.execute(
+        return await self.list_page(site_id, limit)
+
+    async def list_page(
+        self, site_id: int, limit: int = 10, before: Optional[tuple[datetime, int]] = None
+    ) -> list[CheckRecord]:
+        # Newest first. Keyset pagination: pass (checked_at, id) of the last
+        # record of a page to get the next one; every page is an index range
+        # scan on (site_id, checked_at DESC, id DESC), however deep it is.
+        stmt = (
             select(CheckRecord)
             .where(CheckRecord.site_id == site_id)
-            .order_by(CheckRecord.checked_at.desc())
+            .order_by(CheckRecord.checked_at.desc(), CheckRecord.id.desc())
             .limit(limit)
         )
+        if before is not None:
+            checked_at, record_id = before
+            stmt = stmt.where(
+                CheckRecord.checked_at <= checked_at,
+                or_(CheckRecord.checked_at < checked_at, CheckRecord.id < record_id),
+            )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+
+class CheckRollupRepository:
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_rollups(self, site_id: int, period: str, since: datetime, until: Optional[datetime] = None) -> list[CheckRollup]:
+        stmt = select(CheckRollup).where(
+            CheckRollup.site_id == site_id,
+            CheckRollup.period == period,
+            CheckRollup.bucket_start >= since,
+        )
+        if until is not None:
+            stmt = stmt.where(CheckRollup.bucket_start < until)
+        result = await self.session.execute(stmt.order_by(CheckRollup.bucket_start))
         return list(result.scalars().all())
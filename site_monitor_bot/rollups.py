@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import math
+from datetime import datetime, timedelta, timezone
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import CheckRecord, CheckRollup
+from .utils import as_utc
+
+HOUR = "hour"
+DAY = "day"
+
+
+def percentile(values: list[int], fraction: float) -> int | None:
+    # Nearest-rank percentile of already sorted values
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class _Bucket:
+    # Fed one bucket's checks in time order. Besides the totals it keeps
+    # where outages start and end, so reports can join consecutive buckets
+    # into outages without reading the raw records again.
+    __slots__ = (
+        "checks", "up_checks", "error_count", "latencies",
+        "incidents", "longest_outage", "starts_down", "first_up_at", "down_since", "last_checked_at",
+    )
+
+    def __init__(self):
+        self.checks = 0
+        self.up_checks = 0
+        self.error_count = 0
+        self.latencies: list[int] = []
+        self.incidents = 0
+        self.longest_outage: timedelta | None = None
+        self.starts_down = False
+        self.first_up_at: datetime | None = None
+        # Start of the outage still open at the last check added
+        self.down_since: datetime | None = None
+        self.last_checked_at: datetime | None = None
+
+    def add(self, checked_at: datetime, is_up: bool, response_ms: int | None, error: str | None) -> None:
+        if self.checks == 0:
+            self.starts_down = not is_up
+        self.checks += 1
+        self.last_checked_at = checked_at
+        if error is not None:
+            self.error_count += 1
+        if is_up:
+            self.up_checks += 1
+            if response_ms is not None:
+                self.latencies.append(response_ms)
+            if self.first_up_at is None:
+                self.first_up_at = checked_at
+            if self.down_since is not None:
+                outage = checked_at - self.down_since
+                if self.longest_outage is None or outage > self.longest_outage:
+                    self.longest_outage = outage
+                self.down_since = None
+        elif self.down_since is None:
+            self.incidents += 1
+            self.down_since = checked_at
+
+    def row(self, site_id: int, period: str, bucket_start: datetime) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "site_id": site_id,
+            "period": period,
+            "bucket_start": bucket_start,
+            "checks": self.checks,
+            "up_checks": self.up_checks,
+            "error_count": self.error_count,
+            "total_ms": sum(latencies),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "max_ms": latencies[-1] if latencies else None,
+            "incidents": self.incidents,
+            "longest_outage_s": self.longest_outage.total_seconds() if self.longest_outage is not None else None,
+            "starts_down": self.starts_down,
+            "first_up_at": self.first_up_at,
+            "down_since": self.down_since,
+            "last_checked_at": self.last_checked_at,
+        }
+
+
+def _hour(value: datetime) -> datetime:
+    return as_utc(value).replace(minute=0, second=0, microsecond=0)
+
+
+def _day(value: datetime) -> datetime:
+    return _hour(value).replace(hour=0)
+
+
+async def compact(session_factory, now: datetime | None = None, retention_days: int = 30, prune_batch: int = 10000) -> dict[str, int]:
+    # Rolls closed hours of check_records up into hourly and daily rows,
+    # then prunes raw rows older than the retention window. The day of the
+    # newest hourly rollup is recomputed on every run (its daily row grows
+    # until the day ends), so raw rows from that day on are never pruned.
+    now = as_utc(now or datetime.now(timezone.utc))
+    cutoff = _hour(now)
+    async with session_factory() as session:  # type: AsyncSession
+        start = await last_rolled_day(session)
+        if start is None:
+            first = await session.scalar(select(func.min(CheckRecord.checked_at)).where(CheckRecord.checked_at < cutoff))
+            start = _day(first) if first is not None else None
+
+    stats = {"days": 0, "rollups": 0, "pruned": 0}
+    day = start
+    while day is not None and day < cutoff:
+        stats["rollups"] += await _compact_day(session_factory, day, min(day + timedelta(days=1), cutoff))
+        stats["days"] += 1
+        day += timedelta(days=1)
+
+    async with session_factory() as session:  # type: AsyncSession
+        keep_from = await last_rolled_day(session)
+    if keep_from is not None:
+        stats["pruned"] = await prune(session_factory, min(now - timedelta(days=retention_days), keep_from), prune_batch)
+    logger.info(f"Compacted {stats['days']} day(s) into {stats['rollups']} rollups, pruned {stats['pruned']} raw records")
+    return stats
+
+
+async def last_rolled_day(session: AsyncSession) -> datetime | None:
+    # Days before this one are fully rolled up; raw rows from it on are kept
+    last = await session.scalar(select(func.max(CheckRollup.bucket_start)).where(CheckRollup.period == HOUR))
+    return _day(last) if last is not None else None
+
+
+async def _compact_day(session_factory, day: datetime, end: datetime) -> int:
+    hours: dict[tuple[int, datetime], _Bucket] = {}
+    days: dict[int, _Bucket] = {}
+    async with session_factory() as session:  # type: AsyncSession
+        rows = await session.stream(
+            select(CheckRecord.site_id, CheckRecord.checked_at, CheckRecord.is_up, CheckRecord.response_ms, CheckRecord.error)
+            .where(CheckRecord.checked_at >= day, CheckRecord.checked_at < end)
+            .order_by(CheckRecord.checked_at)
+            .execution_options(yield_per=10000)
+        )
+        async for partition in rows.partitions():
+            for site_id, checked_at, is_up, response_ms, error in partition:
+                key = (site_id, _hour(checked_at))
+                bucket = hours.get(key)
+                if bucket is None:
+                    bucket = hours[key] = _Bucket()
+                bucket.add(checked_at, is_up, response_ms, error)
+                bucket = days.get(site_id)
+                if bucket is None:
+                    bucket = days[site_id] = _Bucket()
+                bucket.add(checked_at, is_up, response_ms, error)
+
+        rollups = [bucket.row(site_id, HOUR, hour) for (site_id, hour), bucket in hours.items()]
+        rollups += [bucket.row(site_id, DAY, day) for site_id, bucket in days.items()]
+        # Replace whatever an earlier run wrote for this range
+        await session.execute(
+            delete(CheckRollup).where(CheckRollup.period == HOUR, CheckRollup.bucket_start >= day, CheckRollup.bucket_start < end)
+        )
+        await session.execute(delete(CheckRollup).where(CheckRollup.period == DAY, CheckRollup.bucket_start == day))
+        if rollups:
+            await session.execute(insert(CheckRollup), rollups)
+        await session.commit()
+    return len(rollups)
+
+
+async def prune(session_factory, before: datetime, batch_size: int = 10000) -> int:
+    # Deletes in batches so the write lock is released between them
+    pruned = 0
+    while True:
+        async with session_factory() as session:  # type: AsyncSession
+            ids = select(CheckRecord.id).where(CheckRecord.checked_at < before).limit(batch_size).scalar_subquery()
+            result = await session.execute(
+                delete(CheckRecord).where(CheckRecord.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        pruned += result.rowcount
+        if result.rowcount < batch_size:
+            return pruned
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
-from typing import Callable
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
 
-import aiohttp
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, EVENT_JOB_SUBMITTED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
@@ -13,19 +14,38 @@ from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from .repository import SiteRepository
+from .metrics import MonitorMetrics
 from .monitor import MonitorService
+from .utils import as_utc
+from .sharding import ShardCoordinator
+from . import rollups
 
 
 class MonitorScheduler:
-    def __init__(self, session_factory, monitor_service: MonitorService, weekly_cron: dict[str, str | int]):
+    def __init__(
+        self,
+        session_factory,
+        monitor_service: Optional[MonitorService],
+        weekly_cron: dict[str, str | int],
+        schedule_sites: bool = True,
+        retention_days: int = 30,
+        metrics: Optional[MonitorMetrics] = None,
+    ):
         self.session_factory = session_factory
         self.monitor_service = monitor_service
         self.scheduler = AsyncIOScheduler(timezone="UTC")
         self.weekly_cron = weekly_cron
+        # False when DispatchScheduler or worker processes run the site checks
+        self.schedule_sites = schedule_sites
+        self.retention_days = retention_days
+        self.metrics = metrics
 
     async def start(self):
         self.scheduler.start()
-        await self.schedule_all_active_sites()
+        if self.metrics is not None:
+            self.scheduler.add_listener(self._on_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+        if self.schedule_sites:
+            await self.schedule_all_active_sites()
         # Weekly report job stub; actual notifications hooked in main
         self.scheduler.add_job(
             self._weekly_report_job,
@@ -33,6 +53,13 @@ class MonitorScheduler:
             id="weekly_report",
             replace_existing=True,
         )
+        # Roll up the hour that just closed and prune old raw records
+        self.scheduler.add_job(
+            self._compaction_job,
+            CronTrigger(minute=5, timezone="UTC"),
+            id="check_compaction",
+            replace_existing=True,
+        )
 
     async def schedule_all_active_sites(self):
         async with self.session_factory() as session:  # type: AsyncSession
@@ -52,16 +79,138 @@ class MonitorScheduler:
         logger.info(f"Scheduled site {site_id} every {interval_seconds}s")
 
     async def _check_site_job(self, site_id: int):
-        async with aiohttp.ClientSession() as http_session:
-            # Fetch latest interval and ensure site still exists
-            from .repository import SiteRepository
-            async with self.session_factory() as session:  # type: AsyncSession
-                site = await SiteRepository(session).get_site(site_id)
-            if not site or not site.is_active:
-                logger.info(f"Site {site_id} not active, skipping")
-                return
-            await self.monitor_service.perform_check_and_store(site, http_session)
+        # Fetch latest interval and ensure site still exists
+        async with self.session_factory() as session:  # type: AsyncSession
+            site = await SiteRepository(session).get_site(site_id)
+        if not site or not site.is_active:
+            logger.info(f"Site {site_id} not active, skipping")
+            self.monitor_service.forget_site(site_id)
+            if self.metrics is not None:
+                self.metrics.skipped.inc("inactive")
+            return
+        # Uses the service's pooled HTTP client, so connections are reused
+        await self.monitor_service.perform_check_and_store(site)
+
+    def _on_job_event(self, event):
+        if event.code == EVENT_JOB_MISSED:
+            self.metrics.skipped.inc("missed")
+        elif event.code == EVENT_JOB_MAX_INSTANCES:
+            # The previous run of the job was still going
+            self.metrics.skipped.inc("max_instances")
+        elif event.job_id.startswith("site_check_"):
+            lag = (datetime.now(timezone.utc) - event.scheduled_run_times[-1]).total_seconds()
+            self.metrics.lag.observe(max(lag, 0.0))
+
+    async def _compaction_job(self):
+        try:
+            await rollups.compact(self.session_factory, retention_days=self.retention_days)
+        except Exception as e:
+            logger.error(f"Compaction failed: {e}")
 
     async def _weekly_report_job(self):
         # notification wiring added in main
         logger.info("Weekly report job tick")
+
+
+class DispatchScheduler:
+    # Alternative to per-site APScheduler jobs: one loop claims due sites in
+    # batches by sites.next_check_at, writes back their next due time and
+    # hands them to MonitorService with a random start delay (jitter). With a
+    # ShardCoordinator it only claims sites in the shards this process owns.
+    def __init__(
+        self,
+        session_factory,
+        monitor_service: MonitorService,
+        batch_size: int = 500,
+        poll_interval_s: float = 1.0,
+        jitter_s: float = 5.0,
+        max_in_flight: int = 1000,
+        shards: Optional[ShardCoordinator] = None,
+        metrics: Optional[MonitorMetrics] = None,
+    ):
+        self.session_factory = session_factory
+        self.monitor_service = monitor_service
+        self.shards = shards
+        self.metrics = metrics
+        self.batch_size = batch_size
+        self.poll_interval_s = poll_interval_s
+        self.jitter_s = jitter_s
+        self.max_in_flight = max_in_flight
+        self.in_flight: set[asyncio.Task] = set()
+        self.checking: set[int] = set()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for task in list(self.in_flight):
+            task.cancel()
+        await asyncio.gather(*self.in_flight, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_due()
+            except Exception as e:
+                logger.error(f"Dispatch failed: {e}")
+                claimed = 0
+            # A full batch means more sites are probably due right now
+            if claimed < self.batch_size:
+                await asyncio.sleep(self.poll_interval_s)
+
+    async def dispatch_due(self, now: datetime | None = None) -> int:
+        capacity = min(self.batch_size, self.max_in_flight - len(self.in_flight))
+        if capacity <= 0:
+            if self.metrics is not None:
+                self.metrics.skipped.inc("dispatch_full")
+            return 0
+        now = now or datetime.now(timezone.utc)
+        sites = await self.claim_due(now, capacity)
+        for site in sites:
+            if site.id in self.checking:
+                # The check from an earlier claim outlasted the interval; skip
+                # this one, as APScheduler's single job instance did
+                if self.metrics is not None:
+                    self.metrics.skipped.inc("in_flight")
+                continue
+            if self.metrics is not None and site.next_check_at is not None:
+                self.metrics.lag.observe(max((now - as_utc(site.next_check_at)).total_seconds(), 0.0))
+            self.checking.add(site.id)
+            task = asyncio.create_task(self._check(site))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+            task.add_done_callback(lambda _, site_id=site.id: self.checking.discard(site_id))
+        return len(sites)
+
+    async def claim_due(self, now: datetime, limit: int) -> list:
+        owned = None
+        if self.shards is not None:
+            owned = self.shards.current()
+            if not owned:
+                return []
+        async with self.session_factory() as session:  # type: AsyncSession
+            repo = SiteRepository(session)
+            sites = await repo.list_due(now, limit, owned, self.shards.shard_count if owned else 1)
+            await repo.set_next_checks(
+                (site.id, now + timedelta(seconds=site.interval_seconds)) for site in sites
+            )
+            await session.commit()
+        return sites
+
+    async def _check(self, site):
+        delay = random.uniform(0, min(self.jitter_s, site.interval_seconds))
+        if delay:
+            await asyncio.sleep(delay)
+        try:
+            await self.monitor_service.perform_check_and_store(site)
+        except Exception as e:
+            logger.error(f"Check of site {site.id} failed: {e}")
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from sqlalchemy import and_, delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import ShardLease, Worker
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class ShardCoordinator:
+    # Splits sites (by id % shard_count) between worker processes through
+    # the database. Every `lease_s / 3` a worker records a heartbeat, renews
+    # its shard leases and evens out its share against the other live
+    # workers: shards above the share are released, and free or expired
+    # ones are claimed up to it. A worker that dies stops renewing, so its
+    # shards expire and are taken over by the rest.
+    def __init__(
+        self,
+        session_factory,
+        shard_count: int = 16,
+        worker_id: Optional[str] = None,
+        lease_s: float = 30.0,
+        on_gain: Optional[Callable[[set[int]], Awaitable[None]]] = None,
+    ):
+        self.session_factory = session_factory
+        self.shard_count = shard_count
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_s = lease_s
+        # Called with newly claimed shards, e.g. to load their sites' state
+        self.on_gain = on_gain
+        self.owned: set[int] = set()
+        self.valid_until = 0.0
+        self._task: asyncio.Task | None = None
+
+    def current(self) -> set[int]:
+        # Shards this worker may check right now; none once its leases come
+        # close to running out without being renewed
+        if asyncio.get_running_loop().time() >= self.valid_until:
+            return set()
+        return self.owned
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self._ensure_shards()
+            await self.rebalance()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.owned = set()
+        # Hand the shards over right away instead of letting the leases expire
+        try:
+            async with self.session_factory() as session:  # type: AsyncSession
+                await session.execute(
+                    update(ShardLease).where(ShardLease.owner == self.worker_id).values(owner=None, expires_at=None)
+                )
+                await session.execute(delete(Worker).where(Worker.worker_id == self.worker_id))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Worker {self.worker_id} could not release its shards, they expire in {self.lease_s}s: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            try:
+                await self.rebalance()
+            except Exception as e:
+                logger.error(f"Shard rebalance failed for worker {self.worker_id}: {e}")
+
+    async def rebalance(self, now: datetime | None = None) -> set[int]:
+        now = now or datetime.now(timezone.utc)
+        started = asyncio.get_running_loop().time()
+        expires = now + timedelta(seconds=self.lease_s)
+        mine = ShardLease.owner == self.worker_id
+        free = and_(ShardLease.shard < self.shard_count, or_(ShardLease.owner.is_(None), ShardLease.expires_at < now))
+        async with self.session_factory() as session:  # type: AsyncSession
+            await self._heartbeat(session, now)
+            live = await session.scalar(
+                select(func.count()).select_from(Worker).where(Worker.seen_at >= now - timedelta(seconds=self.lease_s))
+            )
+            share = math.ceil(self.shard_count / max(live, 1))
+
+            await session.execute(update(ShardLease).where(mine).values(expires_at=expires))
+            owned = set((await session.execute(select(ShardLease.shard).where(mine))).scalars())
+            if len(owned) > share:
+                extra = sorted(owned)[share:]
+                await session.execute(
+                    update(ShardLease).where(mine, ShardLease.shard.in_(extra)).values(owner=None, expires_at=None)
+                )
+            elif len(owned) < share:
+                candidates = select(ShardLease.shard).where(free).order_by(ShardLease.shard).limit(share - len(owned))
+                # The free condition is checked again by the update itself, so
+                # two workers never both take a shard
+                await session.execute(
+                    update(ShardLease)
+                    .where(ShardLease.shard.in_(candidates.scalar_subquery()), free)
+                    .values(owner=self.worker_id, expires_at=expires)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+            owned_now = set((await session.execute(select(ShardLease.shard).where(mine))).scalars())
+
+        gained = owned_now - self.owned
+        if owned_now != self.owned:
+            logger.info(f"Worker {self.worker_id} owns shards {sorted(owned_now)} ({live} live workers)")
+        self.owned = owned_now
+        # Other workers may take over once the lease expires; stop a third
+        # of it earlier to leave room for a slow round trip or clock skew
+        self.valid_until = started + self.lease_s * 2 / 3
+        if gained and self.on_gain is not None:
+            await self.on_gain(gained)
+        return owned_now
+
+    async def _heartbeat(self, session: AsyncSession, now: datetime) -> None:
+        updated = await session.execute(update(Worker).where(Worker.worker_id == self.worker_id).values(seen_at=now))
+        if not updated.rowcount:
+            session.add(Worker(worker_id=self.worker_id, seen_at=now))
+        # Forget workers that have been gone for a while
+        await session.execute(delete(Worker).where(Worker.seen_at < now - timedelta(seconds=self.lease_s * 10)))
+        await session.flush()
+
+    async def _ensure_shards(self) -> None:
+        try:
+            async with self.session_factory() as session:  # type: AsyncSession
+                existing = set((await session.execute(select(ShardLease.shard))).scalars())
+                missing = [{"shard": shard} for shard in range(self.shard_count) if shard not in existing]
+                if missing:
+                    await session.execute(insert(ShardLease), missing)
+                    await session.commit()
+        except IntegrityError:
+            pass  # another worker created them at the same time
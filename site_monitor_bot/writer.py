@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Callable, Iterable, Optional
+
+from loguru import logger
+from sqlalchemy import update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import Site, insert_check_records
+
+if TYPE_CHECKING:
+    from .metrics import MonitorMetrics
+    from .monitor import CheckResult
+
+
+SITE_UPDATE = (
+    update(Site.__table__)
+    .where(Site.__table__.c.id == bindparam("site_id"))
+    .values(
+        last_status_code=bindparam("status_code"),
+        last_response_ms=bindparam("response_ms"),
+        last_content_hash=bindparam("content_hash"),
+        last_checked_at=bindparam("checked_at"),
+        etag=bindparam("etag"),
+        last_modified=bindparam("last_modified"),
+    )
+)
+
+
+@dataclass
+class PendingCheck:
+    site_id: int
+    result: CheckResult
+    checked_at: datetime
+
+
+class CheckResultWriter:
+    # Write-behind queue: one transaction per batch (multi-row insert + bulk
+    # sites update), flushed at `batch_size` records or `flush_interval_ms`
+    # after the first one. `submit` blocks once `max_pending` are queued.
+
+    def __init__(
+        self,
+        session_factory,
+        batch_size: int = 200,
+        flush_interval_ms: int = 500,
+        max_pending: int = 5000,
+        on_flush: Optional[Callable[[Iterable[int]], None]] = None,
+        metrics: Optional[MonitorMetrics] = None,
+    ):
+        self.session_factory = session_factory
+        self.metrics = metrics
+        # Called with the site ids of every committed batch
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.queue: asyncio.Queue[PendingCheck] = asyncio.Queue(maxsize=max_pending)
+        self._task: asyncio.Task | None = None
+        self.flushed_records = 0
+        self.flushes = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, site_id: int, result: CheckResult, checked_at: datetime | None = None) -> None:
+        await self.queue.put(PendingCheck(site_id, result, checked_at or datetime.now(timezone.utc)))
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        # Wait for queued results to be written, then stop the loop
+        await self.queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.flush(batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} check results: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def flush(self, batch: list[PendingCheck]) -> None:
+        records = [
+            {
+                "site_id": item.site_id,
+                "checked_at": item.checked_at,
+                "status_code": item.result.status_code,
+                "response_ms": item.result.response_ms,
+                "is_up": item.result.is_up,
+                "content_hash": item.result.content_hash,
+                "error": item.result.error,
+                "ttfb_ms": item.result.ttfb_ms,
+            }
+            for item in batch
+        ]
+        # Only the latest result per site ends up on the sites row
+        latest = {item.site_id: item for item in batch}
+        site_updates = [
+            {
+                "site_id": item.site_id,
+                "status_code": item.result.status_code,
+                "response_ms": item.result.response_ms,
+                "content_hash": item.result.content_hash,
+                "checked_at": item.checked_at,
+                "etag": item.result.etag,
+                "last_modified": item.result.last_modified,
+            }
+            for item in latest.values()
+        ]
+        started = time.perf_counter()
+        async with self.session_factory() as db:  # type: AsyncSession
+            await insert_check_records(db, records)
+            # Core executemany: a site deleted meanwhile just matches no row
+            await db.execute(SITE_UPDATE, site_updates)
+            await db.commit()
+        if self.metrics is not None:
+            self.metrics.db_commit.observe(time.perf_counter() - started, "batch")
+            self.metrics.db_batch.inc(amount=len(records))
+        if self.on_flush is not None:
+            self.on_flush(latest.keys())
+        self.flushed_records += len(batch)
+        self.flushes += 1
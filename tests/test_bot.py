@@ -0,0 +1,155 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+from aiogram import Dispatcher
+
+from site_monitor_bot.bot import register_handlers
+from site_monitor_bot.cache import ViewCache, TTLCache
+from site_monitor_bot.db import create_engine_and_session, init_db
+from site_monitor_bot.monitor import MonitorService, CheckResult
+from site_monitor_bot.notifications import Notifier
+
+
+class FakeMessage:
+    def __init__(self, text, user_id=1):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id)
+        self.chat = SimpleNamespace(id=100 + user_id)
+        self.replies = []
+
+    async def reply(self, text):
+        self.replies.append(text)
+
+    answer = reply
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+async def command(handlers, text):
+    message = FakeMessage(text)
+    name = "on_" + text.split()[0].lstrip("/")
+    await handlers[name](message)
+    return message.replies[-1]
+
+
+def test_ttl_cache_expires_and_evicts():
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl_s=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.put("c", 3)
+    assert cache.get("a") == (False, None)
+    assert cache.get("b") == (True, 2)
+    now[0] = 11
+    assert cache.get("b") == (False, None)
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_view_cache_indexes_shrink_with_the_cache():
+    cache = ViewCache(maxsize=2, ttl_s=60)
+
+    async def history(site_id):
+        return await cache.site_history(1, site_id, 10, lambda: asyncio.sleep(0, (SimpleNamespace(id=site_id), [])))
+
+    for site_id in range(10):
+        await history(site_id)
+    await cache.user_sites(1, lambda: asyncio.sleep(0, [SimpleNamespace(id=8)]))
+    assert set(cache.history_keys) == {8, 9}
+    assert cache.owners == {8: 1, 9: 1}
+    assert cache.versions == {} and cache.loads == {}
+
+    cache.forget_site(9, 1)
+    cache.invalidate_sites([8])
+    assert (cache.history_keys, cache.owners, cache.versions) == ({}, {}, {})
+
+    # A load that an invalidation raced is still not stored
+    async def raced():
+        cache.invalidate_user(1)
+        return [SimpleNamespace(id=8)]
+    await cache.user_sites(1, raced)
+    assert cache.sites.get(1) == (False, None)
+    assert cache.owners == {} and cache.versions == {}
+
+
+@pytest.mark.asyncio
+async def test_list_and_history_are_cached_and_invalidated(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    cache = ViewCache(ttl_s=60)
+    dp = Dispatcher()
+    register_handlers(dp, session_factory, cache)
+    handlers = {h.callback.__name__: h.callback for h in dp.message.handlers}
+
+    await command(handlers, "/add https://example.com 60")
+    assert "interval=60s" in await command(handlers, "/list")
+    assert "interval=60s" in await command(handlers, "/list")
+    assert cache.sites.stats()["hits"] == 1
+
+    await command(handlers, "/setinterval 1 120")
+    assert "interval=120s" in await command(handlers, "/list")
+
+    assert await command(handlers, "/history 1") == "Нет записей"
+    assert await command(handlers, "/history 1") == "Нет записей"
+    assert cache.history.stats()["hits"] == 1
+
+    service = MonitorService(session_factory, on_stored=cache.invalidate_sites)
+    await service.store_result(1, CheckResult(200, 42, True, None, None))
+    assert "code=200" in await command(handlers, "/history 1")
+    assert "status=200" in await command(handlers, "/list")
+
+    await command(handlers, "/remove 1")
+    assert "нет сайтов" in await command(handlers, "/list")
+    assert await command(handlers, "/history 1") == "Сайт не найден"
+
+
+@pytest.mark.asyncio
+async def test_history_pages_with_a_cursor(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    dp = Dispatcher()
+    register_handlers(dp, session_factory, ViewCache(ttl_s=60))
+    handlers = {h.callback.__name__: h.callback for h in dp.message.handlers}
+    await command(handlers, "/add https://example.com 60")
+    service = MonitorService(session_factory)
+    for ms in range(5):
+        await service.store_result(1, CheckResult(200, ms, True, None, None))
+
+    first = (await command(handlers, "/history 1 3")).splitlines()
+    assert [line.split("| ")[-1] for line in first[:3]] == ["4ms", "3ms", "2ms"]
+    assert first[3].startswith("Дальше: /history 1 3 ")
+    second = (await command(handlers, first[3].split(": ", 1)[1])).splitlines()
+    assert [line.split("| ")[-1] for line in second] == ["1ms", "0ms"]
+    assert await command(handlers, "/history 1 3 bogus") == "Неверный курсор"
+
+
+@pytest.mark.asyncio
+async def test_start_updates_the_cached_alert_chat(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    bot = FakeBot()
+    notifier = Notifier(bot, session_factory, messages_per_second=1000)
+    notifier.start()
+    dp = Dispatcher()
+    register_handlers(dp, session_factory, on_chat_stored=notifier.set_chat)
+    handlers = {h.callback.__name__: h.callback for h in dp.message.handlers}
+    await command(handlers, "/add https://example.com 60")
+
+    await notifier.notify_downtime(1)
+    await asyncio.gather(*notifier._lookups)
+    moved = FakeMessage("/start")
+    moved.chat.id = 555
+    await handlers["on_start"](moved, bot)
+    await notifier.notify_recovery(1, 200, 40)
+    await notifier.close()
+    assert bot.sent == [
+        (101, "⚠️ Сайт недоступен: https://example.com"),
+        (555, "✅ Сайт восстановлен: https://example.com (code=200 | 40ms)"),
+    ]
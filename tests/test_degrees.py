@@ -0,0 +1,294 @@
+import io
+import json
+import os
+import random
+import sys
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+DEGREES_DIR = Path(__file__).resolve().parent.parent / "degrees"
+sys.path.insert(0, str(DEGREES_DIR))
+
+import batch  # noqa: E402
+import degrees  # noqa: E402
+import distances  # noqa: E402
+import server  # noqa: E402
+import snapshot as graph_snapshot  # noqa: E402
+from util import Node, QueueFrontier, SearchStats, StackFrontier  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def small():
+    degrees.load_data(DEGREES_DIR / "small")
+    return degrees
+
+
+@pytest.fixture
+def small_copy(tmp_path):
+    # The small dataset in a directory tests may write snapshots and caches to
+    for name in ("people.csv", "movies.csv", "stars.csv"):
+        (tmp_path / name).write_bytes((DEGREES_DIR / "small" / name).read_bytes())
+    return tmp_path
+
+
+def assert_valid_path(dg, source, path):
+    current = source
+    for movie_id, person_id in path:
+        assert current in dg.movies[movie_id]["stars"]
+        assert person_id in dg.movies[movie_id]["stars"]
+        current = person_id
+
+
+def test_bidirectional_matches_bfs(small):
+    for source in small.people:
+        for target in small.people:
+            expected = small.shortest_path(source, target)
+            path = small.shortest_path(source, target, mode="bidirectional")
+            if expected is None:
+                assert path is None
+                continue
+            assert len(path) == len(expected)
+            assert_valid_path(small, source, path)
+            if path:
+                assert path[-1][1] == target
+
+
+def test_unknown_mode(small):
+    with pytest.raises(ValueError):
+        small.shortest_path("102", "129", mode="dfs")
+
+
+def test_frontier_order_and_membership():
+    queue, stack = QueueFrontier(), StackFrontier()
+    for frontier in (queue, stack):
+        for state in ("a", "b", "a"):
+            frontier.add(Node(state=state, parent=None, action=None))
+    assert [queue.remove().state for _ in range(2)] == ["a", "b"]
+    assert queue.contains_state("a")
+    queue.remove()
+    assert queue.empty() and not queue.contains_state("a")
+    assert [stack.remove().state for _ in range(3)] == ["a", "b", "a"]
+    with pytest.raises(Exception):
+        stack.remove()
+
+
+def test_compact_graph_matches_dicts(small):
+    expected = {
+        (source, target): small.shortest_path(source, target)
+        for source in small.people
+        for target in small.people
+    }
+    neighbors = small.neighbors_for_person("102")
+    small.load_data(DEGREES_DIR / "small", compact=True)
+    try:
+        assert small.neighbors_for_person("102") == neighbors
+        assert small.person_id_for_name("kevin bacon") == "102"
+        assert small.person_info("102")["name"] == "Kevin Bacon"
+        for mode in small.SEARCH_MODES:
+            for (source, target), path in expected.items():
+                found = small.shortest_path(source, target, mode=mode)
+                if path is None:
+                    assert found is None
+                else:
+                    assert len(found) == len(path)
+                    assert_valid_path(small, source, found)
+        assert small.shortest_path("102", "no-such-id") is None
+    finally:
+        small.load_data(DEGREES_DIR / "small")
+
+
+def test_snapshot_roundtrip_and_staleness(small, small_copy):
+    expected = small.shortest_path("102", "163")
+
+    small.load_data(small_copy, snapshot=True)
+    try:
+        assert graph_snapshot.is_fresh(small_copy)
+        assert small.graph.snapshot is not None
+        assert small.person_info("102") == {"name": "Kevin Bacon", "birth": "1958"}
+        assert len(small.shortest_path("102", "163")) == len(expected)
+    finally:
+        small.load_data(DEGREES_DIR / "small")
+
+    with open(small_copy / "people.csv", "a", encoding="utf-8") as f:
+        f.write('999,"New Person",2000\n')
+    assert not graph_snapshot.is_fresh(small_copy)
+    graph = graph_snapshot.load_or_build(small_copy)
+    assert graph.person_ids_for_name("new person") == ["999"]
+
+
+def test_snapshot_stores_mtimes_after_touch(small_copy, monkeypatch):
+    graph_snapshot.build(small_copy)
+    key = distances.fingerprint(small_copy)
+    mapped = graph_snapshot.load(graph_snapshot.snapshot_path(small_copy))
+    stat = (small_copy / "stars.csv").stat()
+    os.utime(small_copy / "stars.csv", ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    hashed = []
+    file_hash = graph_snapshot._file_hash
+    monkeypatch.setattr(graph_snapshot, "_file_hash", lambda path: hashed.append(path) or file_hash(path))
+
+    assert graph_snapshot.is_fresh(small_copy)
+    assert graph_snapshot.is_fresh(small_copy)
+    assert len(hashed) == 1
+    assert graph_snapshot.load(graph_snapshot.snapshot_path(small_copy)).person_ids
+    # The snapshot was replaced, not written over under the mapped graph,
+    # and cached distance tables still match it
+    assert list(mapped.person_ids) == list(graph_snapshot.load(graph_snapshot.snapshot_path(small_copy)).person_ids)
+    assert distances.fingerprint(small_copy) == key
+    graph_snapshot.build(small_copy)
+    assert distances.fingerprint(small_copy) == key
+
+
+def test_batch_paths_streams_jsonl(small, small_copy):
+    lines = ["Kevin Bacon\tTom Hanks", "102,129", "Tom Hanks\tKevin Bacon", "Nobody\t102", ""]
+    try:
+        for workers in (1, 2):
+            out = io.StringIO()
+            batch.run_paths(small_copy, lines, out, workers=workers)
+            records = [json.loads(line) for line in out.getvalue().splitlines()]
+            by_pair = {(r["source"], r["target"]): r for r in records}
+            assert len(records) == 4
+            assert by_pair[("Nobody", "102")]["error"] == "source not found"
+            assert by_pair[("Kevin Bacon", "Tom Hanks")]["path"] == [["112384", "158"]]
+            assert by_pair[("102", "129")]["degrees"] == 1
+            assert by_pair[("Tom Hanks", "Kevin Bacon")]["degrees"] == 1
+    finally:
+        small.load_data(DEGREES_DIR / "small")
+
+
+def test_distance_table_matches_shortest_path(small, small_copy):
+    expected = {target: small.shortest_path("102", target) for target in small.people}
+    small.load_data(small_copy, snapshot=True)
+    try:
+        graph = small.graph
+        table = distances.table_for(small_copy, graph, "102", cache=True)
+        assert (small_copy / "distances" / "102.dist").exists()
+        cached = distances.table_for(small_copy, graph, "102", cache=True)
+        assert list(cached.distance) == list(table.distance)
+        for target, path in expected.items():
+            found = graph.path_ids(cached.path(graph.person_index(target)))
+            if path is None:
+                assert found is None
+            else:
+                assert len(found) == len(path) == cached.degrees(graph.person_index(target))
+                assert_valid_path(small, "102", found)
+        assert distances.load(small_copy / "distances" / "102.dist", "other", len(graph.person_ids)) is None
+    finally:
+        small.load_data(DEGREES_DIR / "small")
+
+
+def test_iter_neighbors_skips_self_and_seen(small):
+    everyone = small.neighbors_for_person("102")
+    lazy = set(small.iter_neighbors("102"))
+    assert lazy == {(movie_id, person_id) for movie_id, person_id in everyone if person_id != "102"}
+
+    stats = SearchStats()
+    seen = {"158"}
+    lazy = list(small.iter_neighbors("102", seen, stats))
+    assert all(person_id not in seen for _, person_id in lazy)
+    assert stats.scanned == len(everyone)
+
+
+def test_early_goal_paths_are_shortest(small, tmp_path):
+    for source in small.people:
+        for target in small.people:
+            expected = small.shortest_path(source, target)
+            path = small.shortest_path(source, target, mode="early")
+            if expected is None:
+                assert path is None
+            else:
+                assert len(path) == len(expected)
+                assert_valid_path(small, source, path)
+
+    # A random graph with longer paths, loaded compact to leave `small` intact
+    rng = random.Random(7)
+    (tmp_path / "people.csv").write_text(
+        "id,name,birth\n" + "".join(f"{i},Person {i},\n" for i in range(300)), encoding="utf-8")
+    (tmp_path / "movies.csv").write_text(
+        "id,title,year\n" + "".join(f"{i},Movie {i},2000\n" for i in range(200)), encoding="utf-8")
+    stars = {(rng.randrange(300), m) for m in range(200) for _ in range(3)}
+    (tmp_path / "stars.csv").write_text(
+        "person_id,movie_id\n" + "".join(f"{p},{m}\n" for p, m in sorted(stars)), encoding="utf-8")
+    small.load_data(tmp_path, compact=True)
+    try:
+        for _ in range(200):
+            source, target = str(rng.randrange(300)), str(rng.randrange(300))
+            expected = small.shortest_path(source, target, mode="bidirectional")
+            path = small.shortest_path(source, target, mode="early")
+            assert (path is None) == (expected is None)
+            if path is not None:
+                assert len(path) == len(small.shortest_path(source, target)) == len(expected)
+    finally:
+        small.load_data(DEGREES_DIR / "small")
+
+
+def test_query_server_caches_paths(small, small_copy):
+    httpd = server.make_server(small_copy, port=0, cache_size=2)
+    # Fuzzy postings are ready before the first /resolve
+    assert small.name_index.trigrams is not None
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{httpd.server_address[1]}"
+
+    def get(path):
+        try:
+            with urllib.request.urlopen(base + path) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    try:
+        status, body = get("/path?source=Kevin+Bacon&target=Tom+Hanks")
+        assert status == 200 and body["degrees"] == 1
+        assert body["path"][0]["title"] == "Apollo 13"
+        get("/path?source=102&target=158")
+        assert get("/stats")[1]["cache"] == {"size": 1, "maxsize": 2, "hits": 1, "misses": 1, "hit_rate": 0.5}
+        assert get("/resolve?name=tom+cruise")[1]["candidates"][0]["person_id"] == "129"
+        assert get("/path?source=Nobody&target=102")[0] == 404
+        assert get("/path?source=102")[0] == 400
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        small.load_data(DEGREES_DIR / "small")
+
+
+def test_lru_cache_evicts_least_recent():
+    cache = server.LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == (True, 1)
+    cache.put("c", 3)
+    assert cache.get("b") == (False, None)
+    assert cache.stats()["hits"] == 1
+
+
+def test_name_index_search_and_policies(small, tmp_path, monkeypatch):
+    index = small.name_index
+    assert index.exact("KEVIN BACON") == ["102"]
+    assert set(index.prefix("tom ")) == {"129", "158"}
+    assert index.fuzzy("Kevn Bacon", limit=1)[0][1] == "102"
+    assert index.fuzzy("Kevin Bakon", limit=1)[0][1] == "102"
+    assert index.fuzzy("Tom Hnks", limit=1)[0][1] == "158"
+    best = index.search("kevin bac")[0]
+    assert best["person_id"] == "102" and best["match"] == "prefix" and best["movies"] == 2
+
+    (tmp_path / "people.csv").write_text(
+        'id,name,birth\n1,"Emma Watson",1990\n2,"Emma Watson",1960\n', encoding="utf-8")
+    (tmp_path / "movies.csv").write_text("id,title,year\n10,A,2001\n11,B,2002\n", encoding="utf-8")
+    (tmp_path / "stars.csv").write_text("person_id,movie_id\n1,10\n1,11\n2,11\n", encoding="utf-8")
+    monkeypatch.setattr("builtins.input", lambda prompt: pytest.fail("prompted"))
+    small.load_data(tmp_path, compact=True)
+    try:
+        assert small.person_id_for_name("Emma Watson", policy="none") is None
+        assert small.person_id_for_name("Emma Watson", policy="most_movies") == "1"
+        with pytest.raises(ValueError):
+            small.person_id_for_name("Emma Watson", policy="error")
+        with pytest.raises(ValueError):
+            small.person_id_for_name("Emma Watson", policy="guess")
+        # Exact lookups never build the fuzzy postings
+        assert small.name_index.trigrams is None
+    finally:
+        small.load_data(DEGREES_DIR / "small")
@@ -0,0 +1,437 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import aiohttp
+import pytest
+from aiohttp import web
+from sqlalchemy import event, text, update
+from aiohttp.test_utils import TestServer
+
+from site_monitor_bot.db import DatabaseProfile, Site, create_engine_and_session, init_db
+from site_monitor_bot.db import hash_content
+from site_monitor_bot.monitor import MonitorService, HttpPoolConfig, CheckResult, CheckConfig, http_check
+from site_monitor_bot.monitor import TransitionDetector, DOWN, RECOVERY
+from site_monitor_bot.writer import CheckResultWriter
+from site_monitor_bot.scheduler import DispatchScheduler
+from site_monitor_bot.executor import CheckExecutor
+from site_monitor_bot.metrics import MetricsServer, MonitorMetrics
+from site_monitor_bot.notifications import Notifier
+from site_monitor_bot.main import start_metrics
+from site_monitor_bot import monitor as monitor_module
+from site_monitor_bot.repository import UserRepository, SiteRepository, CheckRecordRepository
+
+
+async def make_db(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    return engine, session_factory
+
+
+async def add_site(session_factory, url, user_id=1):
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=user_id, chat_id=100 + user_id)
+        site = await SiteRepository(session).add_site(user_id=user_id, url=url, interval_seconds=60)
+        await session.commit()
+    return site
+
+
+@pytest.fixture
+async def local_server():
+    async def ok(request):
+        return web.Response(text="hello")
+
+    app = web.Application()
+    app.router.add_get("/", ok)
+    server = TestServer(app)
+    await server.start_server()
+    yield server
+    await server.close()
+
+
+@pytest.mark.asyncio
+async def test_monitor_reuses_pooled_session(tmp_path, local_server):
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, str(local_server.make_url("/")))
+    service = MonitorService(session_factory, http_pool=HttpPoolConfig(limit=5, limit_per_host=2))
+
+    first = await service.perform_check_and_store(site)
+    http_session = service.http_session
+    second = await service.perform_check_and_store(site)
+    assert first.is_up and second.is_up
+    assert service.http_session is http_session
+    assert http_session.connector.limit_per_host == 2
+
+    await service.close()
+    assert http_session.closed
+    async with session_factory() as session:
+        records = await CheckRecordRepository(session).list_recent(site.id, limit=5)
+    assert len(records) == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_and_flushes_on_close(tmp_path):
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, "https://example.com")
+    writer = CheckResultWriter(session_factory, batch_size=3, flush_interval_ms=10000)
+    writer.start()
+    for code in (200, 500, 200, 503):
+        result = CheckResult(status_code=code, response_ms=5, is_up=code == 200, content_hash=None, error=None)
+        await writer.submit(site.id, result)
+    await writer.close()
+
+    assert writer.flushed_records == 4
+    assert writer.flushes == 2
+    async with session_factory() as session:
+        records = await CheckRecordRepository(session).list_recent(site.id, limit=10)
+        stored = await SiteRepository(session).get_site(site.id)
+    assert sorted(r.status_code for r in records) == [200, 200, 500, 503]
+    assert stored.last_status_code == 503
+
+
+class RecordingService:
+    def __init__(self):
+        self.checked = []
+
+    async def perform_check_and_store(self, site):
+        self.checked.append(site.id)
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_claims_due_sites_once_per_interval(tmp_path):
+    _, session_factory = await make_db(tmp_path)
+    sites = [await add_site(session_factory, f"https://site{i}.example") for i in range(3)]
+    async with session_factory() as session:
+        await session.execute(update(Site).where(Site.id == sites[2].id).values(is_active=False))
+        await session.commit()
+    service = RecordingService()
+    dispatcher = DispatchScheduler(session_factory, service, batch_size=10, jitter_s=0)
+
+    now = datetime.now(timezone.utc)
+    assert await dispatcher.dispatch_due(now) == 2
+    assert await dispatcher.dispatch_due(now + timedelta(seconds=30)) == 0
+    assert await dispatcher.dispatch_due(now + timedelta(seconds=60)) == 2
+    await asyncio.gather(*dispatcher.in_flight)
+    assert sorted(service.checked) == [sites[0].id, sites[0].id, sites[1].id, sites[1].id]
+    await dispatcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_skips_sites_still_being_checked(tmp_path):
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, "https://slow.example")
+    release = asyncio.Event()
+
+    class SlowService(RecordingService):
+        async def perform_check_and_store(self, site):
+            self.checked.append(site.id)
+            await release.wait()
+
+    service = SlowService()
+    dispatcher = DispatchScheduler(session_factory, service, batch_size=10, jitter_s=0)
+    now = datetime.now(timezone.utc)
+    await dispatcher.dispatch_due(now)
+    await asyncio.sleep(0)
+    await dispatcher.dispatch_due(now + timedelta(seconds=60))
+    assert len(dispatcher.in_flight) == 1
+    release.set()
+    await asyncio.gather(*dispatcher.in_flight)
+    await dispatcher.dispatch_due(now + timedelta(seconds=120))
+    await asyncio.gather(*dispatcher.in_flight)
+    assert service.checked == [site.id, site.id]
+    await dispatcher.stop()
+
+
+def test_due_sites_put_never_checked_first_on_postgres():
+    from sqlalchemy.dialects import postgresql
+
+    captured = []
+
+    class Capture:
+        async def execute(self, stmt):
+            captured.append(stmt)
+            raise RuntimeError
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(SiteRepository(Capture()).list_due(datetime.now(timezone.utc), 10))
+    assert "ORDER BY sites.next_check_at ASC NULLS FIRST" in str(captured[0].compile(dialect=postgresql.dialect()))
+
+
+@pytest.mark.asyncio
+async def test_streaming_check_hashes_up_to_cap(local_server):
+    url = str(local_server.make_url("/"))
+    async with aiohttp.ClientSession() as http:
+        full = await http_check(url, http, config=CheckConfig(stream=True))
+        capped = await http_check(url, http, config=CheckConfig(max_body_bytes=3, chunk_size=2))
+        head = await http_check(url, http, config=CheckConfig(method="HEAD"))
+    assert full.content_hash == hash_content(b"hello") and full.bytes_read == 5
+    assert capped.content_hash == hash_content(b"hel") and capped.bytes_read == 3
+    assert head.is_up and head.content_hash is None
+    assert full.ttfb_ms is not None and full.ttfb_ms <= full.response_ms
+
+
+@pytest.mark.asyncio
+async def test_init_db_adds_missing_nullable_columns(tmp_path):
+    engine, session_factory = await make_db(tmp_path)
+    async with engine.begin() as conn:
+        await conn.execute(text("ALTER TABLE check_records DROP COLUMN ttfb_ms"))
+    await init_db(engine)
+    site = await add_site(session_factory, "https://example.com")
+    service = MonitorService(session_factory)
+    await service.store_result(site.id, CheckResult(200, 10, True, None, None, ttfb_ms=4))
+    async with session_factory() as session:
+        records = await CheckRecordRepository(session).list_recent(site.id)
+    assert records[0].ttfb_ms == 4
+
+
+@pytest.mark.asyncio
+async def test_init_db_replaces_obsolete_indexes(tmp_path):
+    engine, _ = await make_db(tmp_path)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_check_records_site_checked_desc"))
+        await conn.execute(text("CREATE INDEX ix_check_records_site_id ON check_records (site_id)"))
+        await conn.execute(text("CREATE INDEX ix_check_records_site_checked ON check_records (site_id, checked_at)"))
+    await init_db(engine)
+    async with engine.connect() as conn:
+        names = {row[1] for row in await conn.execute(text("PRAGMA index_list(check_records)"))}
+    assert names == {"ix_check_records_site_checked_desc", "ix_check_records_checked_at"}
+
+
+@pytest.mark.asyncio
+async def test_conditional_check_reuses_hash_on_304(tmp_path):
+    body = b"static page"
+    served = []
+
+    async def page(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            served.append(0)
+            return web.Response(status=304)
+        served.append(len(body))
+        return web.Response(body=body, headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/", page)
+    server = TestServer(app)
+    await server.start_server()
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, str(server.make_url("/")))
+    service = MonitorService(session_factory)
+    try:
+        first = await service.perform_check_and_store(site)
+        async with session_factory() as session:
+            site = await SiteRepository(session).get_site(site.id)
+        second = await service.perform_check_and_store(site)
+    finally:
+        await service.close()
+        await server.close()
+
+    assert site.etag == '"v1"'
+    assert second.status_code == 304 and second.is_up and second.not_modified
+    assert second.content_hash == first.content_hash == hash_content(body)
+    assert served == [len(body), 0]
+    async with session_factory() as session:
+        stored = await SiteRepository(session).get_site(site.id)
+    assert stored.etag == '"v1"' and stored.last_content_hash == first.content_hash
+
+
+@pytest.mark.asyncio
+async def test_conditional_check_after_failure_keeps_change_detection(tmp_path):
+    body = b"static page"
+    modes, served = ["ok", "hang", "ok", "ok"], []
+
+    async def page(request):
+        if modes.pop(0) == "hang":
+            await asyncio.sleep(1)
+        if request.headers.get("If-None-Match") == '"v1"':
+            served.append(0)
+            return web.Response(status=304)
+        served.append(len(body))
+        return web.Response(body=body, headers={"ETag": '"v1"'})
+
+    app = web.Application()
+    app.router.add_get("/", page)
+    server = TestServer(app)
+    await server.start_server()
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, str(server.make_url("/")))
+    service = MonitorService(session_factory, check=CheckConfig(timeout_s=0.2))
+    results = []
+    try:
+        for _ in range(4):
+            async with session_factory() as session:
+                site = await SiteRepository(session).get_site(site.id)
+            results.append(await service.perform_check_and_store(site))
+    finally:
+        await service.close()
+        await server.close()
+
+    # The failure drops the validators with the hash, so the next check is a full GET
+    assert results[1].status_code is None and results[1].etag is None
+    assert served[-2:] == [len(body), 0]
+    assert [r.content_hash for r in results] == [hash_content(body), None, hash_content(body), hash_content(body)]
+    async with session_factory() as session:
+        stored = await SiteRepository(session).get_site(site.id)
+    assert stored.etag == '"v1"' and stored.last_content_hash == hash_content(body)
+
+
+def result(up):
+    return CheckResult(status_code=200 if up else 503, response_ms=5, is_up=up, content_hash=None, error=None)
+
+
+def test_transition_detector_waits_for_consecutive_failures():
+    detector = TransitionDetector(failure_threshold=2)
+    events = [detector.observe(1, result(up)) for up in (True, False, True, False, False, False, True, True)]
+    assert events == [None, None, None, None, DOWN, None, RECOVERY, None]
+
+
+@pytest.mark.asyncio
+async def test_transitions_warm_from_sites_and_skip_extra_reads(tmp_path, monkeypatch):
+    engine, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, "https://example.com")
+    notifier = Notifier(bot=None, session_factory=session_factory)
+    service = MonitorService(
+        session_factory, transitions=TransitionDetector(failure_threshold=1), on_transition=notifier.on_transition
+    )
+    await service.store_result(site.id, result(False))
+    await service.warm_transitions()
+    assert service.transitions.is_up == {site.id: False}
+
+    outcomes = [True, False, True]
+
+    async def fake_check(url, session, timeout_s=15, config=None, etag=None, last_modified=None):
+        return result(outcomes.pop(0))
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    monkeypatch.setattr(monitor_module, "http_check", fake_check)
+    for _ in range(3):
+        await service.perform_check_and_store(site)
+    await asyncio.gather(*notifier._lookups)
+    await service.close()
+
+    # Only the first alert looks up the user's chat, and not on the check path
+    assert [text[0] for text in notifier.queue.pending[101]] == ["✅", "⚠", "✅"]
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+    assert len(selects) == 1 and "FROM users" in selects[0]
+
+    async with session_factory() as session:
+        await SiteRepository(session).remove_site(site.id)
+        await session.commit()
+    await service.prune_sites()
+    assert service.transitions.is_up == {} and service.transitions.failures == {}
+
+
+@pytest.mark.asyncio
+async def test_executor_grants_most_overdue_first_and_caps_failing_hosts():
+    executor = CheckExecutor(max_concurrent=1, per_host=2, failing_after=2, failing_timeout_s=1)
+    now = datetime.now(timezone.utc)
+    order = []
+
+    async def check(site_id, url, due):
+        async with executor.slot(site_id, url, due):
+            order.append(site_id)
+            await asyncio.sleep(0)
+
+    holder = executor.slot(0, "http://a.test/", now)
+    await holder.__aenter__()
+    tasks = [
+        asyncio.create_task(check(1, "http://a.test/", now)),
+        asyncio.create_task(check(2, "http://b.test/", now - timedelta(minutes=5))),
+        asyncio.create_task(check(3, "http://c.test/", now - timedelta(minutes=1))),
+    ]
+    await asyncio.sleep(0)
+    await holder.__aexit__(None, None, None)
+    await asyncio.gather(*tasks)
+    assert order == [2, 3, 1]
+
+    for _ in range(2):
+        executor.record(1, "http://a.test/x", CheckResult(None, 3000, False, None, "timeout"))
+    assert executor.host_limit("http://a.test") == 1
+    assert executor.timeout_for(1, "http://a.test") == 1
+    executor.record(1, "http://a.test/", result(True))
+    assert executor.host_limit("http://a.test") == 2
+    # 5ms usual latency: the adaptive timeout bottoms out at min_timeout_s
+    assert executor.timeout_for(1, "http://a.test") == executor.min_timeout_s
+
+
+@pytest.mark.asyncio
+async def test_slow_host_does_not_hold_up_other_hosts(tmp_path, local_server):
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.Response(text="slow")
+
+    app = web.Application()
+    app.router.add_get("/", slow)
+    slow_server = TestServer(app)
+    await slow_server.start_server()
+    _, session_factory = await make_db(tmp_path)
+    slow_sites = [await add_site(session_factory, str(slow_server.make_url(f"/?n={i}"))) for i in range(4)]
+    fast_sites = [await add_site(session_factory, str(local_server.make_url(f"/?n={i}"))) for i in range(4)]
+    service = MonitorService(session_factory, executor=CheckExecutor(max_concurrent=4, per_host=2))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def timed(site):
+        await service.perform_check_and_store(site)
+        return loop.time() - start
+
+    slow_checks = [asyncio.create_task(timed(site)) for site in slow_sites]
+    fast = await asyncio.gather(*(timed(site) for site in fast_sites))
+    # With a shared cap of 4 the slow host would take every slot for a second
+    assert max(fast) < 0.5
+    assert not any(task.done() for task in slow_checks)
+    assert max(await asyncio.gather(*slow_checks)) >= 2
+    await service.close()
+    await slow_server.close()
+
+
+@pytest.mark.asyncio
+async def test_metrics_record_checks_and_serve_prometheus_text(tmp_path, local_server):
+    _, session_factory = await make_db(tmp_path)
+    site = await add_site(session_factory, str(local_server.make_url("/")))
+    down = await add_site(session_factory, str(local_server.make_url("/missing")))
+    metrics = MonitorMetrics(http_trace=True)
+    writer = CheckResultWriter(session_factory, batch_size=3, flush_interval_ms=10, metrics=metrics)
+    writer.start()
+    service = MonitorService(session_factory, writer=writer, metrics=metrics)
+    for checked in (site, site, down):
+        await service.perform_check_and_store(checked)
+    await service.close()
+
+    assert metrics.checks.values == {("up",): 2, ("down",): 1}
+    assert set(metrics.http_phase.values) == {("connect",), ("ttfb",)}
+    assert metrics.db_batch.values[()] == 3
+    server = MetricsServer(metrics.registry, port=0)
+    await server.start()
+    port = server._runner.addresses[0][1]
+    async with aiohttp.ClientSession() as http:
+        async with http.get(f"http://127.0.0.1:{port}/metrics") as resp:
+            text = await resp.text()
+    await server.stop()
+    assert 'monitor_checks_total{outcome="up"} 2' in text
+    assert 'monitor_http_phase_seconds_count{phase="ttfb"} 3' in text
+    assert 'monitor_check_queue_wait_seconds_bucket{le="+Inf"} 3' in text
+    assert 'monitor_db_commit_seconds_count{path="batch"} 1' in text
+
+    # A second process on the same port runs on without metrics
+    server = await start_metrics(SimpleNamespace(metrics_host="127.0.0.1", metrics_port=0), metrics)
+    port = server._runner.addresses[0][1]
+    assert await start_metrics(SimpleNamespace(metrics_host="127.0.0.1", metrics_port=port), metrics) is None
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_profile_sets_pragmas_on_every_connection(tmp_path):
+    pragmas = ("journal_mode", "synchronous", "cache_size", "busy_timeout")
+    engine, _ = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/tuned.db")
+    async with engine.connect() as conn:
+        tuned = [(await conn.execute(text(f"PRAGMA {name}"))).scalar() for name in pragmas]
+    engine, _ = create_engine_and_session(
+        f"sqlite+aiosqlite:///{tmp_path}/plain.db",
+        DatabaseProfile(journal_mode=None, synchronous=None, mmap_size=None, cache_size_kib=None, busy_timeout_ms=None),
+    )
+    async with engine.connect() as conn:
+        plain = [(await conn.execute(text(f"PRAGMA {name}"))).scalar() for name in pragmas]
+    # synchronous: 1 = NORMAL, 2 = FULL
+    assert tuned == ["wal", 1, -65536, 5000]
+    assert plain[:2] == ["delete", 2]
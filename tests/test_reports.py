@@ -0,0 +1,237 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from aiogram.exceptions import TelegramRetryAfter
+from sqlalchemy import func, insert, select
+
+from site_monitor_bot import rollups
+from site_monitor_bot.db import CheckRecord, PendingAlert, Site, create_engine_and_session, init_db
+from site_monitor_bot.monitor import DOWN, RECOVERY, CheckResult
+from site_monitor_bot.notifications import AlertOutbox, Notifier, NotificationQueue
+from site_monitor_bot.repository import UserRepository, SiteRepository
+from site_monitor_bot.reports import weekly_stats
+
+NOW = datetime(2026, 3, 9, tzinfo=timezone.utc)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+async def seed(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    async with session_factory() as session:
+        for user_id in (1, 2, 3):
+            await UserRepository(session).upsert_user(telegram_user_id=user_id, chat_id=100 + user_id)
+        flaky = await SiteRepository(session).add_site(user_id=1, url="https://flaky.example", interval_seconds=600)
+        steady = await SiteRepository(session).add_site(user_id=2, url="https://steady.example", interval_seconds=600)
+        await session.commit()
+
+    # 20 checks 10 minutes apart; flaky is down at checks 3-5 (30 min) and 10 (10 min)
+    start = NOW - timedelta(days=1)
+    records = []
+    for i in range(20):
+        for site, up in ((flaky, i not in (3, 4, 5, 10)), (steady, True)):
+            records.append({
+                "site_id": site.id,
+                "checked_at": start + timedelta(minutes=10 * i),
+                "status_code": 200 if up else 503,
+                "response_ms": 100 + i,
+                "is_up": up,
+            })
+    # Outside the week
+    records.append({"site_id": flaky.id, "checked_at": NOW - timedelta(days=8), "response_ms": 1, "is_up": False})
+    async with session_factory() as session:
+        await session.execute(insert(CheckRecord), records)
+        await session.commit()
+    return session_factory, flaky, steady
+
+
+@pytest.mark.asyncio
+async def test_weekly_stats_aggregates_per_site(tmp_path):
+    session_factory, flaky, steady = await seed(tmp_path)
+    async with session_factory() as session:
+        stats = await weekly_stats(session, [flaky.id, steady.id], NOW - timedelta(days=7), NOW)
+
+    assert (stats[flaky.id].checks, stats[flaky.id].up_checks) == (20, 16)
+    assert stats[flaky.id].incidents == 2
+    assert stats[flaky.id].longest_outage == timedelta(minutes=30)
+    assert stats[steady.id].uptime == 1.0
+    assert stats[steady.id].incidents == 0 and stats[steady.id].longest_outage is None
+    assert stats[steady.id].avg_ms == pytest.approx(109.5)
+    assert stats[steady.id].p95_ms == 118
+
+
+@pytest.mark.asyncio
+async def test_weekly_stats_read_pruned_days_from_rollups(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=1, chat_id=101)
+        flaky = await SiteRepository(session).add_site(user_id=1, url="https://flaky.example", interval_seconds=1800)
+        long = await SiteRepository(session).add_site(user_id=1, url="https://long.example", interval_seconds=1800)
+        await session.commit()
+
+    # Checks every 30 minutes from three days before NOW until noon. flaky
+    # is down across a midnight, for half an hour, and at the end; long is
+    # down for a whole day and both its ends
+    start, now = NOW - timedelta(days=3), NOW + timedelta(hours=12)
+    down = {
+        flaky.id: [(timedelta(hours=23), timedelta(days=1, hours=1, minutes=30)),
+                   (timedelta(days=2, hours=10), timedelta(days=2, hours=10, minutes=30)),
+                   (timedelta(days=3, hours=11), timedelta(days=4))],
+        long.id: [(timedelta(days=1, hours=20), timedelta(days=3, hours=2))],
+    }
+    records = []
+    at = start
+    while at < now:
+        for site_id, outages in down.items():
+            up = not any(begin <= at - start < end for begin, end in outages)
+            records.append({"site_id": site_id, "checked_at": at, "status_code": 200 if up else None, "response_ms": 100, "is_up": up})
+        at += timedelta(minutes=30)
+    async with session_factory() as session:
+        await session.execute(insert(CheckRecord), records)
+        await session.commit()
+
+    since = NOW - timedelta(days=7)
+    async with session_factory() as session:
+        raw = await weekly_stats(session, [flaky.id, long.id], since, now)
+        # A window that does not start at midnight reads its first hours raw
+        partial_raw = await weekly_stats(session, [flaky.id], NOW - timedelta(days=1, hours=11), now)
+    await rollups.compact(session_factory, now=now, retention_days=2)
+    async with session_factory() as session:
+        rolled = await weekly_stats(session, [flaky.id, long.id], since, now)
+        partial = await weekly_stats(session, [flaky.id], NOW - timedelta(days=1, hours=11), now)
+        remaining = await session.scalar(select(func.count()).select_from(CheckRecord))
+
+    assert remaining < len(records)
+    assert rolled == raw and partial == partial_raw
+    assert (rolled[flaky.id].incidents, rolled[flaky.id].longest_outage) == (3, timedelta(hours=2, minutes=30))
+    assert (rolled[long.id].incidents, rolled[long.id].longest_outage) == (1, timedelta(hours=30))
+    assert rolled[flaky.id].checks == 168 and rolled[flaky.id].avg_ms == 100 and rolled[flaky.id].p95_ms == 100
+    assert partial[flaky.id].checks == 22 + 48 + 24
+
+
+@pytest.mark.asyncio
+async def test_weekly_report_sends_one_message_per_user_with_sites(tmp_path):
+    session_factory, flaky, steady = await seed(tmp_path)
+    bot = FakeBot()
+    notifier = Notifier(bot, session_factory, messages_per_second=1000, report_batch_size=2)
+
+    assert await notifier.send_weekly_report(now=NOW) == 2
+    sent = dict(bot.sent)
+    assert sorted(sent) == [101, 102]
+    assert "аптайм 80.00%" in sent[101] and "инцидентов: 2" in sent[101] and "30 мин" in sent[101]
+    assert "аптайм 100.00%" in sent[102]
+
+
+class FloodBot(FakeBot):
+    # Rejects the first send with RetryAfter, like Telegram's flood control
+    def __init__(self):
+        super().__init__()
+        self.flooded = False
+
+    async def send_message(self, chat_id, text):
+        if not self.flooded:
+            self.flooded = True
+            raise TelegramRetryAfter(method=None, message="Too Many Requests", retry_after=0)
+        await super().send_message(chat_id, text)
+
+
+@pytest.mark.asyncio
+async def test_notification_queue_coalesces_and_retries():
+    bot = FloodBot()
+    queue = NotificationQueue(bot, global_rate=1000, per_chat_rate=1000, workers=2)
+    for i in range(3):
+        queue.enqueue(101, f"down {i}")
+    queue.enqueue(102, "down x")
+    queue.start()
+    await queue.close()
+
+    assert sorted(bot.sent) == [(101, "down 0\ndown 1\ndown 2"), (102, "down x")]
+    assert (queue.alerts, queue.sent, queue.retries, queue.dropped) == (4, 2, 1, 0)
+
+
+class TimedFloodBot(FloodBot):
+    def __init__(self):
+        super().__init__()
+        self.times = []
+
+    async def send_message(self, chat_id, text):
+        self.times.append(asyncio.get_running_loop().time())
+        await super().send_message(chat_id, text)
+
+
+@pytest.mark.asyncio
+async def test_report_parts_are_paced_per_chat_and_flood_control_pauses_alerts(tmp_path):
+    session_factory, flaky, steady = await seed(tmp_path)
+    bot = TimedFloodBot()
+    notifier = Notifier(bot, session_factory, messages_per_second=1000, per_chat_per_second=10)
+    notifier.start()
+    assert await notifier._send_all(101, ["part 1", "part 2", "part 3"])
+    # The rejected first send paused the alert queue too
+    assert notifier.queue.paused_until > 0
+    assert bot.sent == [(101, "part 1"), (101, "part 2"), (101, "part 3")]
+    gaps = [b - a for a, b in zip(bot.times, bot.times[1:])]
+    assert min(gaps) >= 0.09
+
+    # The chat's bucket is shared with its alerts and forgotten once idle
+    notifier.queue.enqueue(101, "down")
+    await notifier.queue.idle.wait()
+    assert bot.times[-1] - bot.times[-2] >= 0.09
+    await asyncio.sleep(0.2)
+    assert notifier.queue.chat_buckets == {}
+    await notifier.close()
+
+
+@pytest.mark.asyncio
+async def test_notification_queue_drops_idle_chat_buckets():
+    bot = FakeBot()
+    queue = NotificationQueue(bot, global_rate=1000, per_chat_rate=4, workers=2)
+    queue.start()
+    for chat_id in range(1000, 1050):
+        queue.enqueue(chat_id, "down")
+    await queue.idle.wait()
+    # Still limiting: a chat that just got a message keeps its empty bucket
+    assert len(queue.chat_buckets) == 50
+    await asyncio.sleep(0.3)
+    assert queue.chat_buckets == {}
+
+    queue.enqueue(1000, "down again")
+    await queue.close()
+    assert len(bot.sent) == 51
+
+
+@pytest.mark.asyncio
+async def test_worker_alerts_are_sent_by_the_bot_process(tmp_path):
+    session_factory, flaky, steady = await seed(tmp_path)
+    outbox = AlertOutbox(session_factory)
+    down = CheckResult(status_code=None, response_ms=5, is_up=False, content_hash=None, error="timeout")
+    up = CheckResult(status_code=200, response_ms=40, is_up=True, content_hash=None, error=None)
+    await outbox.on_transition(flaky, DOWN, down)
+    await outbox.on_transition(steady, DOWN, down)
+    await outbox.on_transition(flaky, RECOVERY, up)
+    # A user deleted since the site was checked
+    await outbox.on_transition(Site(user_id=999, url="https://gone.example"), DOWN, down)
+    await outbox.close()
+
+    bot = FakeBot()
+    notifier = Notifier(bot, session_factory, messages_per_second=1000, relay_batch_size=2)
+    assert await notifier.relay_pending() == 2
+    assert await notifier.relay_pending() == 2
+    assert await notifier.relay_pending() == 0
+    async with session_factory() as session:
+        assert await session.scalar(select(func.count()).select_from(PendingAlert)) == 0
+    notifier.start()
+    await notifier.close()
+
+    assert sorted(bot.sent) == [
+        (101, "⚠️ Сайт недоступен: https://flaky.example\n✅ Сайт восстановлен: https://flaky.example (code=200 | 40ms)"),
+        (102, "⚠️ Сайт недоступен: https://steady.example"),
+    ]
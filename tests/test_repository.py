@@ -1,7 +1,10 @@
 import pytest
 import asyncio
+from datetime import datetime, timedelta, timezone
 
-from site_monitor_bot.db import create_engine_and_session, init_db
+from sqlalchemy import insert, text
+
+from site_monitor_bot.db import CheckRecord, create_engine_and_session, init_db
 from site_monitor_bot.repository import UserRepository, SiteRepository, CheckRecordRepository
 
 
@@ -29,3 +32,62 @@ async def test_repositories_crud(tmp_path):
     async with session_factory() as session:
         records = await CheckRecordRepository(session).list_recent(site_id=1, limit=5)
         assert len(records) >= 1
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_history_once_in_order(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=1, chat_id=100)
+        site = await SiteRepository(session).add_site(user_id=1, url="https://example.com", interval_seconds=60)
+        await session.flush()
+        # Pairs of records share a timestamp, so pages must break ties by id
+        await session.execute(insert(CheckRecord), [
+            {"site_id": site.id, "checked_at": start + timedelta(minutes=i // 2), "is_up": True} for i in range(25)
+        ])
+        await session.commit()
+
+    seen, before = [], None
+    async with session_factory() as session:
+        repo = CheckRecordRepository(session)
+        while page := await repo.list_page(site.id, limit=4, before=before):
+            seen += [(r.checked_at, r.id) for r in page]
+            before = (page[-1].checked_at, page[-1].id)
+        plan = " ".join(row[-1] for row in await session.execute(
+            text("EXPLAIN QUERY PLAN SELECT * FROM check_records WHERE site_id = 1 ORDER BY checked_at DESC, id DESC LIMIT 4")
+        ))
+    assert len(seen) == 25
+    assert seen == sorted(seen, reverse=True)
+    assert "ix_check_records_site_checked_desc" in plan and "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_keyset_pages_cover_rows_written_before_the_upgrade(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=1, chat_id=100)
+        site = await SiteRepository(session).add_site(user_id=1, url="https://example.com", interval_seconds=60)
+        await session.commit()
+    # A pre-upgrade database: the old index and CURRENT_TIMESTAMP-format rows, two per second
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_check_records_site_checked_desc"))
+        await conn.execute(text("CREATE INDEX ix_check_records_site_checked ON check_records (site_id, checked_at)"))
+        for i in range(7):
+            await conn.execute(text(
+                f"INSERT INTO check_records (site_id, checked_at, is_up) VALUES ({site.id}, '2026-01-01 00:00:0{i // 2}', 1)"
+            ))
+    await init_db(engine)
+    async with session_factory() as session:
+        await CheckRecordRepository(session).add_record(site.id, 200, 10, True, None, None)
+        await session.commit()
+
+    seen, before = [], None
+    async with session_factory() as session:
+        repo = CheckRecordRepository(session)
+        while (page := await repo.list_page(site.id, limit=2, before=before)) and len(seen) < 20:
+            seen += [r.id for r in page]
+            before = (page[-1].checked_at, page[-1].id)
+    assert seen == [8, 7, 6, 5, 4, 3, 2, 1]
@@ -0,0 +1,58 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select
+
+from site_monitor_bot.db import CheckRecord, CheckRollup, create_engine_and_session, init_db
+from site_monitor_bot.repository import UserRepository, SiteRepository, CheckRollupRepository
+from site_monitor_bot import rollups
+from site_monitor_bot.utils import as_utc
+
+
+@pytest.mark.asyncio
+async def test_compact_rolls_up_and_prunes(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=1, chat_id=100)
+        site = await SiteRepository(session).add_site(user_id=1, url="https://example.com", interval_seconds=60)
+        await session.commit()
+
+    # Three days, four checks per hour at 10..40ms; the last check of each hour is down
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    records = []
+    for hour in range(72):
+        for i in range(4):
+            up = i < 3
+            records.append({
+                "site_id": site.id,
+                "checked_at": start + timedelta(hours=hour, minutes=15 * i),
+                "status_code": 200 if up else None,
+                "response_ms": 10 * (i + 1),
+                "is_up": up,
+                "error": None if up else "timeout",
+            })
+    async with session_factory() as session:
+        await session.execute(insert(CheckRecord), records)
+        await session.commit()
+
+    now = start + timedelta(days=2, hours=12, minutes=30)
+    stats = await rollups.compact(session_factory, now=now, retention_days=1)
+    again = await rollups.compact(session_factory, now=now, retention_days=1)
+    assert stats["days"] == 3 and again["days"] == 1
+
+    async with session_factory() as session:
+        repo = CheckRollupRepository(session)
+        hourly = await repo.list_rollups(site.id, rollups.HOUR, start)
+        daily = await repo.list_rollups(site.id, rollups.DAY, start)
+        remaining = await session.scalar(select(func.min(CheckRecord.checked_at)))
+        rollup_count = await session.scalar(select(func.count()).select_from(CheckRollup))
+
+    assert len(hourly) == 60  # closed hours before `now`
+    assert (hourly[0].checks, hourly[0].up_checks, hourly[0].error_count) == (4, 3, 1)
+    assert (hourly[0].p50_ms, hourly[0].p95_ms, hourly[0].max_ms) == (20, 30, 30)
+    assert [d.checks for d in daily] == [96, 96, 48]
+    assert rollup_count == 63
+    # Raw rows older than the retention window are gone
+    assert as_utc(remaining) == now - timedelta(days=1)
+
@@ -0,0 +1,51 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from site_monitor_bot.db import Site, create_engine_and_session, init_db
+from site_monitor_bot.repository import UserRepository
+from site_monitor_bot.scheduler import DispatchScheduler
+from site_monitor_bot.sharding import ShardCoordinator
+
+
+@pytest.mark.asyncio
+async def test_workers_split_shards_and_take_over_from_a_dead_one(tmp_path):
+    engine, session_factory = create_engine_and_session(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    await init_db(engine)
+    gained = []
+
+    async def on_gain(shards):
+        gained.append(shards)
+
+    a = ShardCoordinator(session_factory, shard_count=8, worker_id="a", lease_s=30)
+    b = ShardCoordinator(session_factory, shard_count=8, worker_id="b", lease_s=30, on_gain=on_gain)
+    now = datetime.now(timezone.utc)
+    await a.start()
+    assert a.owned == set(range(8))
+
+    # b joins: nothing is free until a gives up its surplus
+    assert await b.rebalance(now) == set()
+    assert await a.rebalance(now) == {0, 1, 2, 3}
+    assert await b.rebalance(now) == {4, 5, 6, 7}
+    assert gained == [{4, 5, 6, 7}]
+
+    # a stops renewing: once its heartbeat and leases expire b takes everything
+    later = now + timedelta(seconds=31)
+    assert await b.rebalance(later) == set(range(8))
+    assert gained[-1] == {0, 1, 2, 3}
+
+    # Only sites in owned shards are claimed
+    async with session_factory() as session:
+        await UserRepository(session).upsert_user(telegram_user_id=1, chat_id=100)
+        await session.flush()
+        await session.execute(insert(Site), [{"user_id": 1, "url": f"https://s{i}.example", "interval_seconds": 60} for i in range(20)])
+        await session.commit()
+    b.owned = {1, 2}
+    dispatcher = DispatchScheduler(session_factory, monitor_service=None, shards=b)
+    sites = await dispatcher.claim_due(datetime.now(timezone.utc), 100)
+    assert sorted(site.id % 8 for site in sites) == [1, 1, 1, 2, 2, 2]
+
+    b.valid_until = 0.0
+    assert await dispatcher.claim_due(datetime.now(timezone.utc), 100) == []
+    await a.stop()